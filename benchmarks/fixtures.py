@@ -0,0 +1,121 @@
+"""
+Synthetic, offline fixtures for the benchmarks
+"""
+import contextlib
+import os
+import subprocess
+
+VERSION = "1.2.3"
+
+MULTILINE_SEARCH = "name = bench-package\n\tversion = {current_version}"
+MULTILINE_REPLACE = "name = bench-package\n\tversion = {new_version}"
+
+
+@contextlib.contextmanager
+def chdir(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(previous)
+
+
+def write_large_file(path, size, version=VERSION, multiline=False):
+    """
+    Writes about `size` bytes of filler lines with the version near the end
+
+    With `multiline` the version is preceded by a `name =` line, to be found
+    with `MULTILINE_SEARCH`. Other packages' versions are sprinkled in so
+    that single line searches have near misses.
+    """
+    filler = "".join(f"dependency-{i} = 0.{i % 10}.{i % 7}\n" for i in range(1000)).encode()
+    with open(path, "wb") as f:
+        written = 0
+        while written < size:
+            f.write(filler)
+            written += len(filler)
+        if multiline:
+            f.write(b"name = other-package\nversion = " + version.encode() + b"\n")
+            f.write(b"name = bench-package\nversion = " + version.encode() + b"\n")
+        else:
+            f.write(b"__version__ = '" + version.encode() + b"'\n")
+    return path
+
+
+def write_config(path, files, version=VERSION, search=None, replace=None, extra=""):
+    """
+    Writes a `.bumpv.cfg` with one `[bumpv:file:...]` section per file
+    """
+    lines = [
+        "[bumpv]",
+        f"current_version = {version}",
+        extra,
+        "",
+    ]
+    for name in files:
+        lines.append(f"[bumpv:file:{name}]")
+        if search:
+            lines.append("search = " + search.replace("\n", "\n\t"))
+        if replace:
+            lines.append("replace = " + replace.replace("\n", "\n\t"))
+        lines.append("")
+    with open(path, "w") as f:
+        f.write("\n".join(lines))
+    return path
+
+
+def make_many_files(root, count, version=VERSION):
+    names = []
+    for i in range(count):
+        name = f"pkg{i:04d}.txt"
+        with open(os.path.join(root, name), "w") as f:
+            f.write(f"name = pkg{i}\nversion = {version}\n")
+        names.append(name)
+    return names
+
+
+def git(root, *args, stdin=None):
+    return subprocess.run(
+        ["git", *args], cwd=root, input=stdin, stdout=subprocess.PIPE, stderr=subprocess.PIPE, check=True,
+    ).stdout
+
+
+def make_git_repo(root, commits=200, tag_every=2, files=None):
+    """
+    Creates a repository with a linear history and a `v*` tag every `tag_every` commits
+
+    The history is written with `git fast-import` so that thousands of
+    commits and tags take well under a second. The working tree is checked
+    out at the last commit, which is `tag_every - 1` commits past a tag.
+    """
+    os.makedirs(root, exist_ok=True)
+    git(root, "init", "-q", ".")
+    git(root, "config", "user.email", "bench@bumpv")
+    git(root, "config", "user.name", "bumpv benchmarks")
+
+    stream = []
+    for i in range(1, commits + 1):
+        content = f"version {i}\n".encode()
+        stream.append(b"commit refs/heads/master\n")
+        stream.append(f"mark :{i}\n".encode())
+        stream.append(f"committer bench <bench@bumpv> {1500000000 + i} +0000\n".encode())
+        message = f"commit {i}\n".encode()
+        stream.append(f"data {len(message)}\n".encode() + message)
+        if i > 1:
+            stream.append(f"from :{i - 1}\n".encode())
+        stream.append(f"M 100644 inline VERSION\ndata {len(content)}\n".encode() + content + b"\n")
+        if i % tag_every == 0:
+            stream.append(f"reset refs/tags/v{i // 1000}.{i % 1000}.0\nfrom :{i}\n\n".encode())
+
+    git(root, "fast-import", "--quiet", stdin=b"".join(stream))
+    git(root, "pack-refs", "--all")
+    git(root, "checkout", "-q", "-f", "master")
+
+    for name, content in (files or {}).items():
+        with open(os.path.join(root, name), "w") as f:
+            f.write(content)
+    if files:
+        git(root, "add", *files)
+        git(root, "commit", "-q", "-m", "add files")
+    return root
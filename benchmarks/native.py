@@ -0,0 +1,251 @@
+"""
+Checks the native git reader against git on fixture repositories
+
+Every scenario builds a small repository and compares what
+`bumpv.client.vcs.native` reports with `git describe`, `git status` and
+`git tag`. The reader may always give up with `UnsupportedRepositoryError`
+(bumpv then runs git), but an answer that differs from git's is a failure.
+Scenarios where files are converted on checkout must give up. Results are
+printed as JSON, the exit status is non-zero if any check failed.
+
+    python -m benchmarks.native
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import fixtures
+
+
+SCENARIOS = {}
+
+
+def scenario(name, fallback=False):
+    def register(func):
+        SCENARIOS[name] = (func, fallback)
+        return func
+    return register
+
+
+def _commit(root, message, files):
+    for name, content in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+    fixtures.git(root, "add", *files)
+    fixtures.git(root, "commit", "-q", "-m", message)
+
+
+def _history(root, commits=6, tag_every=2, annotated=False):
+    """
+    Creates a repository with a linear history of `commits`, tagged every `tag_every` commits
+    """
+    fixtures.git(root, "init", "-q", ".")
+    fixtures.git(root, "config", "user.email", "native@bumpv")
+    fixtures.git(root, "config", "user.name", "bumpv native checks")
+    for i in range(1, commits + 1):
+        # similar contents, so that repacking stores them as deltas
+        content = b"".join(b"line %d of a file in commit %d\n" % (n, i if n == 50 else 0) for n in range(100))
+        _commit(root, f"commit {i}", {"VERSION": f"{i}\n".encode(), "src/data.txt": content})
+        if i % tag_every == 0:
+            if annotated:
+                fixtures.git(root, "tag", "-a", "-m", f"release {i}", f"v0.{i}.0")
+            else:
+                fixtures.git(root, "tag", f"v0.{i}.0")
+    fixtures.git(root, "tag", "other-tag")
+    return root
+
+
+def _settle(root):
+    """
+    Makes all tracked files older than the index, so their stat data can be trusted
+    """
+    past = time.time() - 60
+    for name in fixtures.git(root, "ls-files", "-z").decode().split("\0"):
+        if name:
+            os.utime(os.path.join(root, name), (past, past))
+    fixtures.git(root, "update-index", "--refresh")
+
+
+@scenario("loose")
+def loose(root):
+    _history(root, commits=5)
+    _settle(root)
+
+
+@scenario("packed-ofs-deltas")
+def packed_ofs_deltas(root):
+    _history(root, annotated=True)
+    fixtures.git(root, "gc", "-q", "--aggressive")
+    _settle(root)
+
+
+@scenario("packed-ref-deltas")
+def packed_ref_deltas(root):
+    _history(root, annotated=True)
+    fixtures.git(root, "-c", "repack.useDeltaBaseOffset=false", "repack", "-q", "-a", "-d", "-f")
+    fixtures.git(root, "pack-refs", "--all")
+    _settle(root)
+
+
+@scenario("no-tag")
+def no_tag(root):
+    _history(root, commits=1, tag_every=2)
+    _settle(root)
+
+
+@scenario("index-v3")
+def index_v3(root):
+    _history(root)
+    fixtures.git(root, "update-index", "--index-version", "3")
+    _settle(root)
+
+
+@scenario("dirty-size")
+def dirty_size(root):
+    _history(root)
+    _settle(root)
+    with open(os.path.join(root, "VERSION"), "a") as f:
+        f.write("changed\n")
+
+
+@scenario("dirty-staged")
+def dirty_staged(root):
+    _history(root)
+    with open(os.path.join(root, "VERSION"), "w") as f:
+        f.write("staged\n")
+    fixtures.git(root, "add", "VERSION")
+    _settle(root)
+
+
+@scenario("dirty-deleted")
+def dirty_deleted(root):
+    _history(root)
+    _settle(root)
+    os.unlink(os.path.join(root, "src", "data.txt"))
+
+
+@scenario("touched")
+def touched(root):
+    _history(root)
+    _settle(root)
+    os.utime(os.path.join(root, "VERSION"))
+
+
+@scenario("autocrlf", fallback=True)
+def autocrlf(root):
+    _history(root)
+    fixtures.git(root, "config", "core.autocrlf", "true")
+    os.unlink(os.path.join(root, "VERSION"))
+    fixtures.git(root, "checkout", "-q", "--", "VERSION")
+    _settle(root)
+    # still clean to git, but no longer the size of the checked out file
+    with open(os.path.join(root, "VERSION"), "rb") as f:
+        content = f.read()
+    with open(os.path.join(root, "VERSION"), "wb") as f:
+        f.write(content.replace(b"\r\n", b"\n"))
+
+
+@scenario("clean-filter", fallback=True)
+def clean_filter(root):
+    _history(root)
+    fixtures.git(root, "config", "filter.upper.clean", "cat")
+    fixtures.git(root, "config", "filter.upper.smudge", "cat")
+    _commit(root, "add attributes", {".gitattributes": b"*.txt filter=upper\n"})
+    _settle(root)
+
+
+@scenario("eol-attribute", fallback=True)
+def eol_attribute(root):
+    _history(root)
+    _commit(root, "add attributes", {"src/.gitattributes": b"*.txt text eol=crlf\n"})
+    os.unlink(os.path.join(root, "src", "data.txt"))
+    fixtures.git(root, "checkout", "-q", "--", "src/data.txt")
+    _settle(root)
+
+
+def _native(func, *args):
+    from bumpv.client.vcs import native
+    try:
+        return func(*args)
+    except native.NATIVE_ERRORS as err:
+        return native.UnsupportedRepositoryError(str(err))
+
+
+def check(name, root):
+    """
+    Returns the comparison of the native reader with git on the repository at `root`
+    """
+    from bumpv.client.vcs import native
+    from bumpv.client.vcs.vcs import _parse_describe
+
+    func, fallback = SCENARIOS[name]
+    func(root)
+    git_dir = os.path.join(root, ".git")
+
+    # the reader runs first, git refreshes the stat data of the index
+    answers = {
+        "describe": _native(native.describe, git_dir, root),
+        "clean": _native(native.is_clean, git_dir, root),
+        "tags": _native(native.list_tags, git_dir, "v"),
+    }
+    try:
+        describe = _parse_describe(fixtures.git(
+            root, "describe", "--dirty", "--tags", "--long", "--abbrev=40", "--match=v*",
+        ))
+    except subprocess.CalledProcessError:
+        # no tag to describe
+        describe = {}
+    expected = {
+        "describe": describe,
+        "clean": not fixtures.git(root, "status", "--porcelain", "--untracked-files=no"),
+        "tags": sorted(fixtures.git(root, "tag", "--list", "v*").decode().split()),
+    }
+
+    result = {"failures": []}
+    for check_name, answer in answers.items():
+        if isinstance(answer, native.UnsupportedRepositoryError):
+            result[check_name] = "fallback"
+        elif fallback and check_name != "tags":
+            result[check_name] = "answered"
+            result["failures"].append(f"{check_name}: expected a fallback to git, got {answer!r}")
+        elif check_name == "clean" and not answer:
+            # False only promises that the tree isn't known to be clean
+            result[check_name] = "unknown"
+        elif answer == expected[check_name]:
+            result[check_name] = "match"
+        else:
+            result[check_name] = "mismatch"
+            result["failures"].append(f"{check_name}: native {answer!r}, git {expected[check_name]!r}")
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-k", dest="select", default="", help="only run scenarios whose name contains this")
+    args = parser.parse_args(argv)
+
+    # the user's git config must not change the fixtures
+    os.environ["GIT_CONFIG_GLOBAL"] = os.devnull
+    os.environ["GIT_CONFIG_NOSYSTEM"] = "1"
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bumpv-native-") as tmp:
+        for name in SCENARIOS:
+            if args.select in name:
+                root = os.path.join(tmp, name)
+                os.makedirs(root)
+                results[name] = check(name, root)
+
+    json.dump({"results": results}, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if any(result["failures"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
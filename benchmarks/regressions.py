@@ -0,0 +1,93 @@
+"""
+Checks bumps of fixture projects for behaviour that broke before
+
+Every scenario builds a small project and bumps it in-process, outside of
+a repository. Results are printed as JSON, the exit status is non-zero if
+any check failed.
+
+    python -m benchmarks.regressions
+"""
+import argparse
+import json
+import os
+import sys
+import tempfile
+
+from . import fixtures
+
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(func):
+        SCENARIOS[name] = func
+        return func
+    return register
+
+
+def _write(root, files):
+    for name, content in files.items():
+        path = os.path.join(root, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            f.write(content)
+
+
+def _read(root, name):
+    with open(os.path.join(root, name)) as f:
+        return f.read()
+
+
+def _bump(root, part, **kwargs):
+    from bumpv.client import BumpClient
+    with fixtures.chdir(root):
+        return BumpClient(**kwargs).bump(part)
+
+
+@scenario("nested-patterns")
+def nested_patterns(root):
+    """
+    A search of one file section inside the search of another is found where the longer one matched
+    """
+    _write(root, {
+        ".bumpv.cfg": (
+            "[bumpv]\ncurrent_version = 1.2.3\n\n"
+            "[bumpv:file:pkgs/*/package.json]\n"
+            'search = "version": "{current_version}"\n'
+            'replace = "version": "{new_version}"\n\n'
+            "[bumpv:file:pkgs/**/*.json]\n"
+        ),
+        "pkgs/a/package.json": '{"version": "1.2.3"}\n',
+    })
+    _bump(root, "patch")
+    content = _read(root, "pkgs/a/package.json")
+    if content != '{"version": "1.2.4"}\n':
+        return [f"pkgs/a/package.json: {content!r}"]
+    return []
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("-k", dest="select", default="", help="only run scenarios whose name contains this")
+    args = parser.parse_args(argv)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bumpv-regressions-") as tmp:
+        for name, func in SCENARIOS.items():
+            if args.select in name:
+                root = os.path.join(tmp, name)
+                os.makedirs(root)
+                try:
+                    failures = func(root)
+                except Exception as err:
+                    failures = [f"{type(err).__name__}: {err}"]
+                results[name] = {"failures": failures}
+
+    json.dump({"results": results}, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if any(result["failures"] for result in results.values()) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
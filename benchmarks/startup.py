@@ -0,0 +1,133 @@
+"""
+Measures the cold start time of the bumpv CLI per subcommand
+
+Every sample runs the CLI in a fresh interpreter against a throwaway git
+repository, so the numbers include interpreter startup, imports and the
+work of the subcommand itself. Results are printed as JSON.
+
+    python -m benchmarks.startup --runs 20 > startup.json
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CLI = "import sys; from bumpv import bumpv; sys.exit(bumpv())"
+
+SUBCOMMANDS = {
+    "help": ["--help"],
+    "current": ["current"],
+    "bump-dry-run": ["bump", "patch", "--dry-run"],
+}
+
+CONFIG = """\
+[bumpv]
+current_version = 1.2.3
+commit = True
+tag = True
+
+[bumpv:file:setup.py]
+"""
+
+
+def make_project(path):
+    with open(os.path.join(path, ".bumpv.cfg"), "w") as f:
+        f.write(CONFIG)
+    with open(os.path.join(path, "setup.py"), "w") as f:
+        f.write("setup(version='1.2.3')\n")
+
+    def git(*args):
+        subprocess.check_output(["git", *args], cwd=path, stderr=subprocess.STDOUT)
+
+    git("init", "-q", ".")
+    git("config", "user.email", "bench@bumpv")
+    git("config", "user.name", "bumpv benchmarks")
+    git("add", ".")
+    git("commit", "-q", "-m", "init")
+
+
+def summarize(samples):
+    return {
+        "runs": len(samples),
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+        "max": max(samples),
+    }
+
+
+def time_command(args, cwd, env, runs):
+    command = [sys.executable, "-c", CLI, *args]
+    samples = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, check=True)
+        samples.append(time.perf_counter() - start)
+    return summarize(samples)
+
+
+def import_time(args, cwd, env):
+    """
+    Returns the cumulative import time of every module in microseconds
+    """
+    command = [sys.executable, "-X", "importtime", "-c", CLI, *args]
+    result = subprocess.run(command, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, check=True)
+    total = 0
+    modules = 0
+    for line in result.stderr.decode().splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        self_time = line.split("|")[0].split(":")[1].strip()
+        if self_time.isdigit():
+            total += int(self_time)
+            modules += 1
+    return {"modules": modules, "total_us": total}
+
+
+def run(runs=10, subcommands=None):
+    env = dict(os.environ, PYTHONPATH=REPO_ROOT)
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bumpv-bench-") as project:
+        make_project(project)
+        # the bare interpreter, as a reference for the numbers below
+        samples = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "-c", "pass"], check=True)
+            samples.append(time.perf_counter() - start)
+        results["python"] = summarize(samples)
+
+        for name in subcommands or SUBCOMMANDS:
+            args = SUBCOMMANDS[name]
+            results[name] = time_command(args, project, env, runs)
+            results[name]["imports"] = import_time(args, project, env)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--runs", type=int, default=10, help="samples per subcommand")
+    parser.add_argument("subcommands", nargs="*", metavar="SUBCOMMAND",
+                        help=f"subcommands to measure, any of {', '.join(SUBCOMMANDS)} (default: all)")
+    args = parser.parse_args(argv)
+    for name in args.subcommands:
+        if name not in SUBCOMMANDS:
+            parser.error(f"unknown subcommand: {name}")
+
+    report = {
+        "benchmark": "startup",
+        "python": sys.version.split()[0],
+        "results": run(args.runs, args.subcommands),
+    }
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+
+if __name__ == "__main__":
+    main()
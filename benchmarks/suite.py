@@ -0,0 +1,319 @@
+"""
+Benchmarks for the hot paths of bumpv, reported as JSON
+
+Covers version parsing and serialization, searching and rewriting target
+files (large files, many files, multi-line search patterns), loading the
+configuration and the cost of VCS operations against a throwaway git
+repository with many tags. All fixtures are generated locally.
+
+    python -m benchmarks.suite > before.json
+    python -m benchmarks.suite --compare before.json > after.json
+"""
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from . import fixtures
+
+
+BENCHMARKS = {}
+
+SCALES = {
+    # name: (large file bytes, many files, version strings, commits)
+    "quick": (1 * 2 ** 20, 50, 2000, 200),
+    "default": (32 * 2 ** 20, 300, 50000, 2000),
+}
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat=5, number=1, setup=None):
+    """
+    Returns timing statistics for `func` in seconds per call
+
+    `setup`, if given, runs untimed before every repetition.
+    """
+    samples = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        samples.append((time.perf_counter() - start) / number)
+    return {
+        "repeat": repeat,
+        "number": number,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.mean(samples),
+    }
+
+
+PARSE = r"(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)(\-(?P<release>[a-z]+))?"
+SERIALIZE = ["{major}.{minor}.{patch}-{release}", "{major}.{minor}.{patch}"]
+
+
+def version_strings(count):
+    return [f"{i % 17}.{i % 101}.{i}" + ("-rc" if i % 5 == 0 else "") for i in range(count)]
+
+
+@benchmark("version.parse")
+def bench_parse(context):
+    from bumpv.client.versioning.version import _parse
+    strings = version_strings(context["versions"])
+
+    def run():
+        for string in strings:
+            _parse(string, PARSE)
+    return dict(measure(run), items=len(strings))
+
+
+@benchmark("version.parse_many")
+def bench_parse_many(context):
+    from bumpv.client.versioning import VersionSet
+    strings = version_strings(context["versions"])
+    return dict(measure(lambda: VersionSet.from_strings(strings, PARSE)), items=len(strings))
+
+
+@benchmark("version.serialize")
+def bench_serialize(context):
+    from bumpv.client.versioning import Version
+    strings = version_strings(context["versions"])
+
+    def run():
+        # fresh instances, so memoized results don't hide the formatting cost
+        for version in Version.parse_many(strings, PARSE, serialize_formats=SERIALIZE):
+            version.serialize(SERIALIZE)
+            version.get_tag()
+    return dict(measure(run), items=len(strings))
+
+
+@benchmark("version.sort")
+def bench_sort(context):
+    from bumpv.client.versioning import Version, sort_key
+    versions = list(Version.parse_many(version_strings(context["versions"]), PARSE))
+    return dict(measure(lambda: sorted(versions, key=sort_key)), items=len(versions))
+
+
+def _updater(config_path):
+    from bumpv.client.config import Configuration
+    from bumpv.client.files import FileUpdater
+    from bumpv.client.versioning import Version
+
+    config = Configuration(config_path)
+    current = Version.from_config(config)
+    return FileUpdater(config, current, current.bump("patch"))
+
+
+@benchmark("files.large.validate")
+def bench_large_validate(context):
+    with fixtures.chdir(context["large"]):
+        updater = _updater(".bumpv.cfg")
+        return dict(measure(updater._validate), bytes=context["large_size"])
+
+
+@benchmark("files.large.dry_run")
+def bench_large_dry_run(context):
+    with fixtures.chdir(context["large"]):
+        updater = _updater(".bumpv.cfg")
+        return dict(measure(lambda: updater.replace(dry_run=True)), bytes=context["large_size"])
+
+
+@benchmark("files.large.rewrite")
+def bench_large_rewrite(context):
+    pristine = os.path.join(context["root"], "large.txt.orig")
+    target = os.path.join(context["large"], "large.txt")
+    if not os.path.exists(pristine):
+        shutil.copyfile(target, pristine)
+
+    with fixtures.chdir(context["large"]):
+        updater = _updater(".bumpv.cfg")
+        return dict(
+            measure(updater.replace, repeat=3, setup=lambda: shutil.copyfile(pristine, target)),
+            bytes=context["large_size"],
+        )
+
+
+@benchmark("files.multiline.dry_run")
+def bench_multiline(context):
+    with fixtures.chdir(context["multiline"]):
+        updater = _updater(".bumpv.cfg")
+        return dict(measure(lambda: updater.replace(dry_run=True)), bytes=context["large_size"])
+
+
+@benchmark("files.many.dry_run")
+def bench_many(context):
+    with fixtures.chdir(context["many"]):
+        updater = _updater(".bumpv.cfg")
+        return dict(measure(lambda: updater.replace(dry_run=True)), files=len(updater.paths))
+
+
+@benchmark("config.load")
+def bench_config(context):
+    from bumpv.client.config import Configuration
+    with fixtures.chdir(context["many"]):
+        return dict(measure(lambda: Configuration(".bumpv.cfg"), number=10), sections=context["many_files"])
+
+
+def _vcs_benchmark(context, func, **kwargs):
+    from bumpv.client.vcs import Git
+
+    spawned = []
+    original = subprocess.check_output
+
+    def counting_check_output(*args, **kw):
+        spawned.append(args[0])
+        return original(*args, **kw)
+
+    with fixtures.chdir(context["repo"]):
+        subprocess.check_output = counting_check_output
+        try:
+            result = measure(lambda: func(Git), **kwargs)
+        finally:
+            subprocess.check_output = original
+    result["subprocesses_per_call"] = len(spawned) / (result["repeat"] * result["number"])
+    return result
+
+
+@benchmark("vcs.discover")
+def bench_vcs_discover(context):
+    return _vcs_benchmark(context, lambda git: git.discover())
+
+
+@benchmark("vcs.assert_nondirty")
+def bench_vcs_status(context):
+    return _vcs_benchmark(context, lambda git: git.discover().assert_nondirty())
+
+
+@benchmark("vcs.latest_tag_info")
+def bench_vcs_describe(context):
+    return dict(
+        _vcs_benchmark(context, lambda git: git.discover().latest_tag_info()),
+        tags=context["commits"] // 2,
+    )
+
+
+@benchmark("vcs.latest_tag_info.native")
+def bench_vcs_describe_native(context):
+    def run(git):
+        session = git.discover()
+        session.native = True
+        return session.latest_tag_info()
+    return dict(_vcs_benchmark(context, run), tags=context["commits"] // 2)
+
+
+def make_context(root, scale):
+    large_size, many_files, versions, commits = SCALES[scale]
+    context = {
+        "root": root,
+        "scale": scale,
+        "large_size": large_size,
+        "many_files": many_files,
+        "versions": versions,
+        "commits": commits,
+    }
+
+    context["large"] = os.path.join(root, "large")
+    os.makedirs(context["large"])
+    fixtures.write_large_file(os.path.join(context["large"], "large.txt"), large_size)
+    fixtures.write_config(
+        os.path.join(context["large"], ".bumpv.cfg"), ["large.txt"],
+        search="__version__ = '{current_version}'", replace="__version__ = '{new_version}'",
+    )
+
+    context["multiline"] = os.path.join(root, "multiline")
+    os.makedirs(context["multiline"])
+    fixtures.write_large_file(os.path.join(context["multiline"], "large.txt"), large_size, multiline=True)
+    fixtures.write_config(
+        os.path.join(context["multiline"], ".bumpv.cfg"), ["large.txt"],
+        search=fixtures.MULTILINE_SEARCH, replace=fixtures.MULTILINE_REPLACE,
+    )
+
+    context["many"] = os.path.join(root, "many")
+    os.makedirs(context["many"])
+    names = fixtures.make_many_files(context["many"], many_files)
+    fixtures.write_config(
+        os.path.join(context["many"], ".bumpv.cfg"), names,
+        search="version = {current_version}", replace="version = {new_version}",
+    )
+
+    context["repo"] = fixtures.make_git_repo(os.path.join(root, "repo"), commits=commits)
+    return context
+
+
+def compare(baseline, results, threshold):
+    """
+    Returns the relative change of the median per benchmark and the regressions
+    """
+    changes = {}
+    regressions = []
+    for name, result in results.items():
+        before = baseline.get("results", {}).get(name)
+        if not before or "median" not in before or "median" not in result:
+            continue
+        change = result["median"] / before["median"] - 1
+        changes[name] = round(change, 4)
+        if change > threshold:
+            regressions.append(name)
+    return {"threshold": threshold, "changes": changes, "regressions": regressions}
+
+
+def run(names, scale):
+    from bumpv.client.logging import get_logger
+    get_logger(0)
+
+    results = {}
+    with tempfile.TemporaryDirectory(prefix="bumpv-bench-") as root:
+        context = make_context(root, scale)
+        for name in names:
+            results[name] = BENCHMARKS[name](context)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--scale", choices=sorted(SCALES), default="default", help="size of the fixtures")
+    parser.add_argument("--compare", metavar="JSON", help="earlier results to compare the medians against")
+    parser.add_argument("--threshold", type=float, default=0.1,
+                        help="relative slowdown reported as a regression (default: 0.1)")
+    parser.add_argument("-k", dest="select", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--list", action="store_true", help="list benchmark names and exit")
+    args = parser.parse_args(argv)
+
+    if args.list:
+        print("\n".join(BENCHMARKS))
+        return 0
+
+    from bumpv import __VERSION__
+
+    names = [name for name in BENCHMARKS if args.select in name]
+    report = {
+        "benchmark": "suite",
+        "bumpv": __VERSION__,
+        "python": sys.version.split()[0],
+        "scale": args.scale,
+        "results": run(names, args.scale),
+    }
+    if args.compare:
+        with open(args.compare) as f:
+            report["comparison"] = compare(json.load(f), report["results"], args.threshold)
+
+    json.dump(report, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+    return 1 if report.get("comparison", {}).get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,7 +1,7 @@
 import sys
 
 from .cli import bumpv
-from .client import BumpClient, exceptions
+from .client import BumpClient, MonorepoClient, exceptions
 from .client.config import Configuration
 from .client.versioning import Version
 
@@ -1,40 +1,132 @@
 # -*- coding: utf-8 -*-
 
 """Console script for deploy_py."""
+import os
 import sys
 
 import click
 
-from ..client import BumpClient, Configuration
+from ..client import BumpClient, Configuration, MonorepoClient, Profiler, Version
 from ..client import exceptions
 
 
+class PartChoice(click.Choice):
+    """
+    The parts defined by the config in the working directory, or by the project configs below `--root`
+
+    The configs are only read once a part is given or listed, and again
+    only if `--root` changes. Outside of a project only the built-in parts
+    are known.
+    """
+    def __init__(self):
+        super().__init__(())
+        self._root = None
+        self._loaded = False
+
+    def _load(self):
+        ctx = click.get_current_context(silent=True)
+        params = ctx.params if ctx is not None else {}
+        root = params.get("root") or ("." if params.get("project") else None)
+        if not self._loaded or root != self._root:
+            self.choices = _part_names(root)
+            self._root = root
+            self._loaded = True
+
+    def convert(self, value, param, ctx):
+        self._load()
+        return super().convert(value, param, ctx)
+
+    def get_metavar(self, *args, **kwargs):
+        self._load()
+        return super().get_metavar(*args, **kwargs)
+
+    def get_missing_message(self, *args, **kwargs):
+        self._load()
+        return super().get_missing_message(*args, **kwargs)
+
+
+def _part_names(root):
+    """
+    Returns the names of the parts of the config in the working directory, or of all configs below `root`
+    """
+    from ..client.versioning.parts import DEFAULT_PART_TABLE
+
+    try:
+        if root is None:
+            return Configuration().part_table().names
+        from ..client.monorepo import discover_projects
+        names = {}
+        for path in discover_projects(root).values():
+            names.update(dict.fromkeys(Configuration(path).part_table().names))
+        return tuple(names) or DEFAULT_PART_TABLE.names
+    except Exception:
+        # no config, or a broken one that the command reports, not the parsing of its options
+        return DEFAULT_PART_TABLE.names
+
+
 @click.group()
-def bumpv(args=None):
+@click.option('--log-format', type=click.Choice(["text", "json"]), default="text", envvar="BUMPV_LOG_FORMAT", help="Write log messages as text or as JSON lines. Default is 'text'")
+@click.option('--log-queue', is_flag=True, envvar="BUMPV_LOG_QUEUE", help="Write log messages from a background thread")
+def bumpv(log_format, log_queue):
+    if log_format != "text" or log_queue:
+        from ..client.logging import configure_logging
+        configure_logging(json_lines=log_format == "json", queued=log_queue)
     return 0
 
 
 @bumpv.command()
-@click.argument('part', type=click.Choice(["major", "minor", "patch"]))
+# checked by the daemon or the client, so a forwarded bump doesn't read any config here
+@click.argument('part')
 @click.option("-v", '--verbose', count=True, default=0, required=False, help="Use to increase verbosity of logging. Ex: -vv")
 @click.option("-d", '--allow-dirty', is_flag=True, help="Allow bumping the version while the working tree is dirty")
 @click.option("-o", '--output', default="yaml", type=click.Choice(["yaml", "json"]), help="Choose output format. Default is 'yaml'")
 @click.option('--dry-run', is_flag=True, help="see what would happen without touching any files. Best used with -vv")
-def bump(part, verbose, allow_dirty, output, dry_run):
+@click.option("-j", '--jobs', type=click.IntRange(min=1), default=None, help="Number of files to search and rewrite in parallel. Defaults to the 'workers' config option")
+@click.option('--root', type=click.Path(exists=True, file_okay=False), default=None, help="Bump every project with a .bumpv.cfg below this directory")
+@click.option("-p", '--project', multiple=True, help="Only bump this project, by its directory relative to --root. Can be given multiple times")
+@click.option('--profile', type=click.File("w"), default=None, help="Write timings and counters of the bump as JSON to this file")
+@click.option('--no-daemon', is_flag=True, help="Bump in this process even if a bumpv daemon is running")
+def bump(part, verbose, allow_dirty, output, dry_run, jobs, root, project, profile, no_daemon):
+    if not (no_daemon or verbose or jobs or root or project or profile):
+        response = _forward({"command": "bump", "part": part, "dry_run": dry_run, "allow_dirty": allow_dirty})
+        if response is not None:
+            _print_result(response["result"], output)
+            return
+
+    profiler = Profiler() if profile is not None else None
+    try:
+        _bump(part, verbose, allow_dirty, output, dry_run, jobs, root, project, profiler)
+    finally:
+        if profiler is not None:
+            profile.write(profiler.json() + "\n")
+
+
+def _bump(part, verbose, allow_dirty, output, dry_run, jobs, root, project, profiler):
     try:
-        client = BumpClient(verbosity=verbose, allow_dirty=allow_dirty)
+        if root is not None or project:
+            client = MonorepoClient(
+                root or ".", project, verbosity=verbose, allow_dirty=allow_dirty, workers=jobs, profiler=profiler,
+            )
+        else:
+            client = BumpClient(verbosity=verbose, allow_dirty=allow_dirty, workers=jobs, profiler=profiler)
     except exceptions.WorkingDirectoryIsDirtyException:
         sys.exit(1)
+    except exceptions.NoProjectsFound as err:
+        click.echo(f"error loading projects: {err}")
+        sys.exit(1)
 
     try:
         client.bump(part, dry_run)
-    except exceptions.InvalidTargetFile as err:
+    except (exceptions.InvalidTargetFile, exceptions.PendingTransactionError, exceptions.DuplicateTagError,
+            exceptions.InvalidPartValueError, exceptions.UnknownVersionPartError) as err:
         click.echo(f"error attempting to bump the version: {err}")
         sys.exit(1)
     except exceptions.VCSCommandError as err:
         click.echo(f"error attempting to run VCS command:\n\n\t{' '.join(err.command)}\n")
         click.echo("Error message from VCS:\n")
         click.echo(err.message)
+        if client.rollback():
+            click.echo("\nRestored all files to their state before the bump.")
         sys.exit(1)
 
     output_func = getattr(client, output)
@@ -42,8 +134,57 @@ def bump(part, verbose, allow_dirty, output, dry_run):
     print(output_func())
 
 
+def _forward(request):
+    """
+    Hands `request` to a running daemon, returns None if there is none
+    """
+    from ..daemon import DaemonError, forward
+
+    request["cwd"] = os.getcwd()
+    try:
+        response = forward(request)
+    except DaemonError as err:
+        # the daemon may have handled the request, so it must not run again here
+        click.echo(f"error talking to the bumpv daemon: {err}", err=True)
+        if request["command"] == "bump":
+            click.echo("The bump may have been applied in part, see 'bumpv rollback'.", err=True)
+        sys.exit(1)
+    if response is None or response["ok"]:
+        return response
+
+    if response["error"] == "VCSCommandError":
+        click.echo(f"error attempting to run VCS command:\n\n\t{' '.join(response['command'])}\n")
+        click.echo("Error message from VCS:\n")
+        click.echo(response["message"])
+        if response.get("rolled_back"):
+            click.echo("\nRestored all files to their state before the bump.")
+    elif response["error"] == "WorkingDirectoryIsDirtyException":
+        click.echo(f"{response['message']}\n\nUse --allow-dirty to override this if you know what you're doing.", err=True)
+    elif request["command"] == "bump":
+        click.echo(f"error attempting to bump the version: {response['message']}")
+    else:
+        click.echo(f"error loading config: {response['message']}")
+    sys.exit(1)
+
+
+def _print_result(result, output):
+    if output == "json":
+        import json
+        print(json.dumps(result))
+    else:
+        import yaml
+        print(yaml.dump(result))
+
+
 @bumpv.command()
-def current():
+@click.option('--no-daemon', is_flag=True, help="Read the config in this process even if a bumpv daemon is running")
+def current(no_daemon):
+    if not no_daemon:
+        response = _forward({"command": "current"})
+        if response is not None:
+            click.echo(response["result"])
+            return
+
     try:
         config = Configuration()
     except exceptions.InvalidConfigPath as err:
@@ -53,6 +194,155 @@ def current():
     click.echo(config.current_version)
 
 
+@bumpv.command()
+@click.option('--from', 'low', default=None, help="Only list tags of this version or above")
+@click.option('--to', 'high', default=None, help="Only list tags of this version or below")
+@click.option('--latest-per', type=click.Choice(["major", "minor"]), default=None, help="Only list the latest tag of every major or minor line")
+@click.option('--next', 'next_part', type=PartChoice(), default=None, help="Print the next untagged version after bumping this part of the latest tag")
+@click.option("-o", '--output', default="text", type=click.Choice(["text", "yaml", "json"]), help="Choose output format. Default is one tag per line")
+def tags(low, high, latest_per, next_part, output):
+    """List the tags of the repository that parse as versions, in version order."""
+    try:
+        client = BumpClient(allow_dirty=True)
+        history = client.tag_history()
+        parse = client.config.parse
+        low = Version.from_version_string(low, parse) if low is not None else None
+        high = Version.from_version_string(high, parse) if high is not None else None
+    except (exceptions.InvalidConfigPath, exceptions.VersionStringParseError) as err:
+        click.echo(f"error loading tags: {err}")
+        sys.exit(1)
+    except exceptions.VCSCommandError as err:
+        click.echo(f"error attempting to run VCS command:\n\n\t{' '.join(err.command)}\n")
+        click.echo(err.message)
+        sys.exit(1)
+
+    if next_part is not None:
+        latest = history.between(low, high)
+        try:
+            version = history.next_version(next_part, latest[-1][1] if latest else None)
+        except exceptions.InvalidPartValueError as err:
+            click.echo(f"error finding the next version: {err}")
+            sys.exit(1)
+        click.echo(version.serialize(client.config.serialize) if version is not None else "")
+        return
+
+    if latest_per is not None:
+        found = history.latest_per_line(latest_per, low, high)
+    else:
+        found = history.between(low, high)
+
+    if output == "text":
+        for tag, _ in found:
+            click.echo(tag)
+    else:
+        _print_result([
+            {"tag": tag, "version": version.serialize(client.config.serialize)} for tag, version in found
+        ], output)
+
+
+@bumpv.command()
+@click.option('--input', 'input_file', type=click.File("r"), default=None, help="Plan the packages of 'package version' lines in this file, '-' for stdin")
+@click.option('--root', type=click.Path(exists=True, file_okay=False), default=None, is_eager=True, help="Plan every project with a .bumpv.cfg below this directory")
+@click.option("-p", '--project', multiple=True, is_eager=True, help="Only plan this project, by its directory relative to --root. Can be given multiple times")
+@click.option("-P", '--part', 'parts', multiple=True, type=PartChoice(), help="Plan bumps of this part. Can be given multiple times, defaults to major, minor and patch")
+@click.option("-j", '--jobs', type=click.IntRange(min=1), default=None, help="Number of processes to plan in. Defaults to the number of CPUs")
+def plan(input_file, root, project, parts, jobs):
+    """Print the next version and tag of every package for every part as JSON lines."""
+    from ..client.versioning import plan_json_lines
+
+    try:
+        packages, parse, version_kwargs = _plan_packages(input_file, root, project)
+        lines = plan_json_lines(packages, parts or ("major", "minor", "patch"), jobs, parse=parse, **version_kwargs)
+        write = sys.stdout.write
+        for line in lines:
+            write(line + "\n")
+    except (exceptions.InvalidConfigPath, exceptions.NoProjectsFound, exceptions.VersionStringParseError,
+            exceptions.InvalidPartValueError, exceptions.UnknownVersionPartError) as err:
+        click.echo(f"error planning versions: {err}", err=True)
+        sys.exit(1)
+
+
+def _plan_packages(input_file, root, project):
+    """
+    Returns the `(package, version)` pairs to plan, the parse pattern and version options
+    """
+    from ..client.monorepo import discover_projects
+    from ..client.versioning.plan import DEFAULT_PARSE
+
+    if input_file is not None:
+        # versions are read with the options of the config here, if there is one
+        try:
+            config = Configuration()
+        except exceptions.InvalidConfigPath:
+            return _read_packages(input_file), DEFAULT_PARSE, {}
+        return _read_packages(input_file), config.parse, {
+            "serialize_formats": config.serialize, "tag_name": config.tag_name, "part_table": config.part_table(),
+        }
+
+    # the versions of configs bring their own parts, there is nothing to parse
+    if root is None and not project:
+        return [(".", Version.from_config(Configuration()))], None, {}
+
+    configs = discover_projects(root or ".")
+    missing = [name for name in project if name not in configs]
+    if missing:
+        raise exceptions.NoProjectsFound(f"no .bumpv.cfg found for: {', '.join(missing)}")
+    names = [name for name in configs if not project or name in project]
+    return ((name, Version.from_config(Configuration(configs[name]))) for name in names), None, {}
+
+
+def _read_packages(lines):
+    for line in lines:
+        fields = line.split()
+        if fields:
+            # a line with a version only names its own package
+            yield fields[0], fields[-1]
+
+
+@bumpv.command()
+@click.option("-v", '--verbose', count=True, default=0, required=False, help="Use to increase verbosity of logging. Ex: -vv")
+@click.option('--root', type=click.Path(exists=True, file_okay=False), default=None, help="Roll back a bump of all projects below this directory")
+def rollback(verbose, root):
+    """Restore the files of a bump that did not finish."""
+    try:
+        if root is not None:
+            client = MonorepoClient(root, verbosity=verbose, allow_dirty=True)
+        else:
+            client = BumpClient(verbosity=verbose, allow_dirty=True)
+    except (exceptions.InvalidConfigPath, exceptions.NoProjectsFound) as err:
+        click.echo(f"error loading config: {err}")
+        sys.exit(1)
+
+    if not client.rollback():
+        click.echo("nothing to roll back")
+        sys.exit(1)
+    if root is None:
+        click.echo(client.config.current_version)
+
+
+@bumpv.command()
+@click.option("-v", '--verbose', count=True, default=0, required=False, help="Use to increase verbosity of logging. Ex: -vv")
+@click.option('--socket', 'socket_path', default=None, help="Listen on this unix socket. Defaults to $BUMPV_SOCKET")
+def serve(verbose, socket_path):
+    """Keep configs and VCS state warm and answer bumps over a unix socket."""
+    from ..client.logging import get_logger
+    from ..daemon import DaemonError, Server
+
+    import signal
+
+    get_logger(verbose)
+    # exit through serve_forever's cleanup, which removes the socket
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    server = Server(socket_path, verbosity=verbose)
+    try:
+        server.serve_forever()
+    except DaemonError as err:
+        click.echo(f"error starting the daemon: {err}")
+        sys.exit(1)
+    except KeyboardInterrupt:
+        pass
+
+
 @bumpv.command()
 @click.argument("path", default=".bumpv.cfg", required=False)
 @click.argument("initial_version", default="0.1.0", required=False)
@@ -1,5 +1,8 @@
 from .client import BumpClient
 from .config import Configuration
+from .monorepo import MonorepoClient
+from .profiling import Profiler
+from .versioning import TagHistory, Version
 from .vcs import (
     WorkingDirectoryIsDirtyException,
 )
@@ -1,56 +1,277 @@
-import json
-
-import yaml
-
 from .config import Configuration
-from .files import FileUpdater
+from .files import FileUpdater, Transaction, journal_path_for
 from .logging import (
     get_logger,
     get_logger_list,
 )
+from .profiling import NULL_PROFILER
 from .vcs import get_vcs
 from .versioning import Version
 
 
 class BumpClient:
-    def __init__(self, config: Configuration = None, verbosity=0, allow_dirty=False):
+    def __init__(self, config: Configuration = None, verbosity=0, allow_dirty=False, workers=None, vcs=None,
+                 profiler=None):
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
         if config is None:
-            config = Configuration()
+            with self.profiler.span("config.load"):
+                config = Configuration()
 
         self.logger = get_logger(verbosity)
         self.logger_list = get_logger_list()
         self.config = config
-        self.vcs = get_vcs(allow_dirty)
+        if vcs is None:
+            with self.profiler.span("vcs.discover"):
+                vcs = get_vcs(allow_dirty, native=config.native_git, profiler=self.profiler)
+        self.vcs = vcs
+        self.allow_dirty = allow_dirty
+        self.async_vcs = None
         self.current_version = Version.from_config(config)
         self.new_version = None
+        self.workers = workers
+        self.transaction = None
+        self.updater = None
+        self.changes = []
 
-    def bump(self, part, dry_run=False):
+    def prepare(self, part, dry_run=False):
+        """
+        Computes the new version and searches and stages all target files
+
+        This doesn't log anything, so it can run for several clients at once.
+        The result is passed on to `stage`.
+        """
         self.new_version = self.current_version.bump(part)
-        updater = FileUpdater(self.config, self.current_version, self.new_version)
-        updater.replace(dry_run)
+        with self.profiler.span("files.expand"):
+            self.config.expand_files(self.vcs, self.workers)
+        self.updater = FileUpdater(
+            self.config, self.current_version, self.new_version, workers=self.workers, profiler=self.profiler,
+            vcs=self.vcs,
+        )
+        with self.profiler.span("files.prepare"):
+            return self.updater.prepare(dry_run)
+
+    def stage(self, part, dry_run=False, transaction: Transaction = None, changes=None):
+        """
+        Stages all file changes and the new config into `transaction`
+
+        Nothing is written to the target files, see `bump`. Returns the paths
+        that have to be added to the VCS once the transaction is committed.
+        """
+        if changes is None:
+            changes = self.prepare(part, dry_run)
+        with self.profiler.span("files.apply"):
+            self.changes = self.updater.apply(changes, dry_run, transaction)
+
+        if dry_run:
+            return []
 
         self.config.set_value("bumpv", "current_version", self.new_version.serialize())
+        transaction.stage_config(self.config)
+        paths = [self.config.file_path]
+        if self.config.commit:
+            paths.extend(self.config.resolve(path) for path in self.config.files())
+        return paths
+
+    def commit_message(self):
+        return self.config.message.format(
+            current_version=self.current_version.serialize(),
+            new_version=self.new_version.serialize(),
+        )
+
+    def bump(self, part, dry_run=False):
+        with self.profiler.span("bump", part=part, dry_run=dry_run):
+            return self._bump(part, dry_run)
+
+    def _bump(self, part, dry_run=False):
+        journal_path = journal_path_for(self.config)
+        Transaction.assert_none_pending(journal_path)
+
+        self.transaction = Transaction(journal_path)
+        try:
+            paths = self.stage(part, dry_run, self.transaction)
+        except BaseException:
+            self.transaction.discard()
+            raise
+
         if not dry_run:
-            self.config.write()
-            self.vcs.add_path(self.config.file_path)
+            try:
+                with self.profiler.span("transaction.commit"):
+                    self.transaction.commit()
+            except BaseException:
+                self.rollback()
+                raise
 
-        if self.config.commit:
-            for path in self.config.files():
-                self.vcs.add_path(path)
-            message = self.config.message.format(
-                current_version=self.current_version.serialize(),
-                new_version=self.new_version.serialize(),
+            self.updater.refresh_index(self.changes)
+            if self.vcs is not None:
+                with self.profiler.span("vcs.add"):
+                    self.vcs.add_path(*paths)
+
+        if self.config.commit and self.vcs is not None:
+            message = self.commit_message()
+            self.logger.debug(f"COMMITTING w/ message: {message}")
+            with self.profiler.span("vcs.commit"):
+                self.vcs.commit(message, dry_run)
+
+        # once committed, undoing the bump is up to the VCS
+        self.transaction.finalize()
+
+        if self.config.tag and not dry_run and self.vcs is not None:
+            self.logger.debug(f"GIT TAG: {self.new_version.get_tag()}")
+            with self.profiler.span("vcs.tag"):
+                self.vcs.tag(self.new_version.get_tag())
+
+        return self.new_version
+
+    @classmethod
+    async def create_async(cls, config_path=".bumpv.cfg", verbosity=0, allow_dirty=False, workers=None,
+                           profiler=None):
+        """
+        Creates a client, discovering the VCS while the config is parsed in a thread
+
+        The dirty check is left to `bump_async`, which overlaps it with
+        searching the target files.
+        """
+        import asyncio
+        from .vcs.aio import discover_async
+
+        profiler = profiler if profiler is not None else NULL_PROFILER
+        loop = asyncio.get_running_loop()
+        with profiler.span("config.load"):
+            config, session = await asyncio.gather(
+                loop.run_in_executor(None, Configuration, config_path),
+                discover_async(profiler=profiler),
             )
+
+        if session is not None:
+            session.sync.native = config.native_git
+        # without a repository, the client's own discovery finds none either
+        client = cls(config, verbosity, allow_dirty, workers, vcs=session.sync if session else None,
+                     profiler=profiler)
+        client.async_vcs = session
+        return client
+
+    async def bump_async(self, part, dry_run=False):
+        """
+        Like `bump`, with VCS commands run as asyncio subprocesses
+
+        The dirty check and the lookup of the new tag run while the target
+        files are searched and staged in a thread. Nothing is written until
+        all of them succeeded.
+        """
+        with self.profiler.span("bump", part=part, dry_run=dry_run):
+            return await self._bump_async(part, dry_run)
+
+    async def _tag_exists(self, tag):
+        from .vcs.exceptions import DuplicateTagError
+
+        if tag in await self.async_vcs.tags(tag):
+            raise DuplicateTagError(f"tag {tag} already exists")
+
+    async def _bump_async(self, part, dry_run=False):
+        import asyncio
+        from .vcs.aio import AsyncVCS
+
+        if self.async_vcs is None and self.vcs is not None:
+            self.async_vcs = AsyncVCS(self.vcs)
+        vcs = self.async_vcs
+        loop = asyncio.get_running_loop()
+
+        journal_path = journal_path_for(self.config)
+        Transaction.assert_none_pending(journal_path)
+
+        checks = []
+        if vcs is not None:
+            checks.append(vcs.check_dirty(self.allow_dirty))
+            if self.config.tag:
+                checks.append(self._tag_exists(self.current_version.bump(part).get_tag()))
+        results = await asyncio.gather(
+            loop.run_in_executor(None, self.prepare, part, dry_run), *checks, return_exceptions=True,
+        )
+        changes = results[0]
+        errors = [result for result in results if isinstance(result, BaseException)]
+        if errors:
+            if not isinstance(changes, BaseException):
+                for change in changes:
+                    change.discard()
+            raise errors[0]
+
+        self.transaction = Transaction(journal_path)
+        try:
+            paths = self.stage(part, dry_run, self.transaction, changes)
+        except BaseException:
+            self.transaction.discard()
+            raise
+
+        if not dry_run:
+            try:
+                with self.profiler.span("transaction.commit"):
+                    await loop.run_in_executor(None, self.transaction.commit)
+            except BaseException:
+                self.rollback()
+                raise
+
+            self.updater.refresh_index(self.changes)
+            if vcs is not None:
+                with self.profiler.span("vcs.add"):
+                    await vcs.add_path(*paths)
+
+        if self.config.commit and vcs is not None:
+            message = self.commit_message()
             self.logger.debug(f"COMMITTING w/ message: {message}")
-            self.vcs.commit(message, dry_run)
-        if self.config.tag and not dry_run:
+            with self.profiler.span("vcs.commit"):
+                await vcs.commit(message, dry_run)
+
+        self.transaction.finalize()
+
+        if self.config.tag and not dry_run and vcs is not None:
             self.logger.debug(f"GIT TAG: {self.new_version.get_tag()}")
-            self.vcs.tag(self.new_version.get_tag())
+            with self.profiler.span("vcs.tag"):
+                await vcs.tag(self.new_version.get_tag())
 
         return self.new_version
 
     def rollback(self):
-        pass
+        """
+        Restores all files touched by the last unfinished bump
+
+        This works from the journal on disk, so it also recovers from a bump
+        that crashed in another process. Returns False if there was nothing to
+        restore.
+        """
+        transaction = self.transaction
+        if transaction is None or not transaction.entries:
+            transaction = Transaction.load(journal_path_for(self.config))
+        if transaction is None:
+            return False
+
+        paths = [entry["path"] for entry in transaction.entries]
+        transaction.rollback()
+        if self.vcs is not None:
+            # the bump may already have staged its changes
+            self.vcs.add_path(*paths)
+
+        self.reload()
+        return True
+
+    def reload(self):
+        """
+        Reads the config again, discarding any bumped version
+        """
+        self.config = Configuration(self.config.file_path)
+        self.current_version = Version.from_config(self.config)
+        self.new_version = None
+
+    def tag_history(self):
+        """
+        Returns a `TagHistory` of all tags that match the configured `tag_name`
+        """
+        from .versioning import TagHistory
+
+        tags = self.vcs.tags(self.config.tag_name.partition("{")[0]) if self.vcs is not None else []
+        with self.profiler.span("tags.parse", tags=len(tags)):
+            return TagHistory.from_tags(
+                tags, self.config.parse, self.config.tag_name, self.config.part_table(), self.config.serialize,
+            )
 
     def dict(self):
         return {
@@ -60,7 +281,9 @@ class BumpClient:
         }
 
     def json(self):
+        import json
         return json.dumps(self.dict())
 
     def yaml(self):
+        import yaml
         return yaml.dump(self.dict())
@@ -1 +1,2 @@
 from .config import Configuration
+from .snapshot import ConfigSnapshot, FileOptions
@@ -1,7 +1,8 @@
 import os
-from configparser import ConfigParser
 
 from .exceptions import InvalidConfigPath, OptionNotFound
+from . import targets
+from .snapshot import ConfigSnapshot, load_cached, remove_cached, save_cached
 from ..logging import get_logger
 
 
@@ -27,6 +28,8 @@ DEFAULT = {
 
 
 def new_config_file(name=".bumpv.cfg", initial_version="0.1.0"):
+    from configparser import ConfigParser
+
     DEFAULT["bumpv"]["current_version"] = initial_version
     config = ConfigParser()
     config.read_dict(DEFAULT)
@@ -35,33 +38,56 @@ def new_config_file(name=".bumpv.cfg", initial_version="0.1.0"):
 
 
 class Configuration:
+    """
+    A config file, its options are resolved once into `snapshot`
+
+    With the `config_cache` option enabled the snapshot is cached next to the
+    config file and the INI file is only parsed again once it changes.
+    """
     def __init__(self, file_path=".bumpv.cfg", *args, **kwargs):
-        config = ConfigParser()
-        config.read_dict(DEFAULT)
-        if os.path.exists(file_path):
-            config.read(file_path)
-        else:
+        if not os.path.exists(file_path):
             raise InvalidConfigPath(f"no file found at: {file_path}")
 
-        self._config = config
+        self.__parser = None
         self.file_path = file_path
-
-        bumpv_section = self.get_section("bumpv")
-        self.current_version = bumpv_section.get("current_version")
-        self.commit = bumpv_section.getboolean("commit")
-        self.tag = bumpv_section.getboolean("tag")
-        self.tag_name = bumpv_section.get("tag_name")
-        self.parse = bumpv_section.get("parse")
-        self.serialize = bumpv_section.get("serialize").split("\n")
-        self.message = bumpv_section.get("message")
-
-        self.file_options = {}
-        for file in self.files():
-            section = self.get_file_section(file)
-            self.file_options[file] = {
-                "search": section.get("search", "{current_version}"),
-                "replace": section.get("replace", "{new_version}")
-            }
+        self.root = os.path.dirname(file_path)
+
+        snapshot = load_cached(file_path)
+        if snapshot is None:
+            snapshot = ConfigSnapshot.from_parser(self._config)
+            if snapshot.config_cache:
+                save_cached(file_path, snapshot)
+            else:
+                remove_cached(file_path)
+        self.snapshot = snapshot
+
+        self.current_version = snapshot.current_version
+        self.commit = snapshot.commit
+        self.tag = snapshot.tag
+        self.tag_name = snapshot.tag_name
+        self.parse = snapshot.parse
+        self.serialize = list(snapshot.serialize)
+        self.message = snapshot.message
+        self.workers = snapshot.workers
+        self.native_git = snapshot.native_git
+        self.index = snapshot.index
+        self.diff_context = snapshot.diff_context
+        self.file_options = snapshot.file_options
+        self.glob_cache = snapshot.glob_cache
+        self._targets = None
+        self._part_table = None
+
+    @property
+    def _config(self):
+        # only parsed when the snapshot wasn't cached or the config is changed
+        if self.__parser is None:
+            from configparser import ConfigParser
+
+            config = ConfigParser()
+            config.read_dict(DEFAULT)
+            config.read(self.file_path)
+            self.__parser = config
+        return self.__parser
 
     def __repr__(self):
         return f"<bumpv.Configuration: {self.file_path}>"
@@ -81,26 +107,82 @@ class Configuration:
             raise OptionNotFound(f"option '{option}'' not found in section '{key}'")
 
     def get_section_names(self, key):
-        names = []
-        for section in self._config.sections():
-            if section == "bumpv":
-                continue
-            _, section, name = section.split(":")
-            if section == key:
-                names.append(name)
-        return names
+        if key == "file":
+            return list(self.snapshot.files)
+        if key == "part":
+            return list(self.snapshot.parts)
+        return []
 
     def files(self):
-        return self.get_section_names("file")
+        return list(self.targets())
+
+    def targets(self):
+        """
+        Returns `{path: (FileOptions, ...)}` for every target file, with glob and directory sections expanded
+        """
+        if self._targets is None:
+            self.expand_files()
+        return self._targets
+
+    def expand_files(self, vcs=None, workers=None):
+        """
+        Expands glob and directory sections into the files they match
+
+        Files ignored by the `vcs` session are skipped. A file named by a
+        section of its own only gets that section's options, otherwise the
+        options of every pattern that matches it apply.
+        """
+        patterns = [path for path in self.snapshot.files if targets.is_target_pattern(self.root, path)]
+        expanded = {}
+        if patterns:
+            cache = targets.GlobCache.load(targets.glob_cache_path_for(self)) if self.glob_cache else None
+            expanded = targets.expand(self.root, patterns, workers or self.workers, cache, vcs)
+
+        found = {}
+        literal = set(self.snapshot.files) - set(patterns)
+        for path in self.snapshot.files:
+            options = self.file_options[path]
+            if path in literal:
+                found[path] = (options,)
+                continue
+            if not expanded[path]:
+                from ..files.exceptions import InvalidTargetFile
+                raise InvalidTargetFile(f"no files match '{path}' listed in config")
+            for match in expanded[path]:
+                if match in literal:
+                    continue
+                known = found.setdefault(match, ())
+                if options not in known:
+                    found[match] = known + (options,)
+        self._targets = found
+        return found
+
+    def resolve(self, path):
+        """
+        Returns `path` from a file section relative to the working directory
+
+        Paths in file sections are relative to the directory of the config file.
+        """
+        return os.path.join(self.root, path)
 
     def get_file_section(self, file_path):
         return self.get_section(f"{FILE_SECTION_PREFIX}{file_path}")
 
     def parts(self):
-        return self.get_section_names("part")
+        return self.snapshot.parts
 
     def get_part_section(self, part):
-        return self.get_section(f"{FILE_SECTION_PREFIX}{part}")
+        return self.get_section(f"{PART_SECTION_PREFIX}{part}")
+
+    def part_table(self):
+        """
+        Returns the `PartTable` of the built-in parts, the part sections and the groups of `parse`
+        """
+        if self._part_table is None:
+            from ..versioning import PartTable, compile_parse
+            names = compile_parse(self.parse).groupindex
+            self._part_table = PartTable.from_options(self.snapshot.part_options, names)
+        return self._part_table
 
     def set_value(self, key, option, value):
         self._config[key][option] = value
@@ -109,5 +191,17 @@ class Configuration:
         if out is None:
             out = self.file_path
 
-        with open(out, "w") as conf_file:
-            self._config.write(conf_file)
+        import shutil
+        from tempfile import NamedTemporaryFile
+
+        tmp = NamedTemporaryFile("w", dir=os.path.dirname(out) or ".", prefix=".bumpv-", delete=False)
+        try:
+            with tmp as conf_file:
+                self._config.write(conf_file)
+            if os.path.exists(out):
+                shutil.copymode(out, tmp.name)
+            os.replace(tmp.name, out)
+        except BaseException:
+            if os.path.exists(tmp.name):
+                os.unlink(tmp.name)
+            raise
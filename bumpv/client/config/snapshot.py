@@ -0,0 +1,197 @@
+import os
+import time
+from collections import namedtuple
+from types import MappingProxyType
+
+from ..logging import get_logger
+
+
+logger = get_logger()
+
+CACHE_SUFFIX = ".cache"
+CACHE_VERSION = 3
+
+# a config written this close to being cached might change again within the
+# same mtime tick, so its hash is checked until it's older than that
+RACY_NS = 2 * 10**9
+
+FileOptions = namedtuple("FileOptions", ["search", "replace"])
+
+
+def _section_names(sections, key):
+    names = []
+    for section in sections:
+        if section == "bumpv":
+            continue
+        _, kind, name = section.split(":", 2)
+        if kind == key:
+            names.append(name)
+    return tuple(names)
+
+
+class ConfigSnapshot:
+    """
+    The parsed options of a config file, resolved once and read-only
+
+    Unlike the `ConfigParser` behind `Configuration` this holds plain values
+    only, so it can be cached on disk and shared between threads.
+    """
+    __slots__ = (
+        "current_version",
+        "commit",
+        "tag",
+        "tag_name",
+        "parse",
+        "serialize",
+        "message",
+        "workers",
+        "native_git",
+        "index",
+        "diff_context",
+        "config_cache",
+        "glob_cache",
+        "files",
+        "file_options",
+        "parts",
+        "part_options",
+    )
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values[name])
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"<bumpv.ConfigSnapshot: {self.current_version}>"
+
+    @classmethod
+    def from_parser(cls, config):
+        # options other than those of `DEFAULT` are read with fallbacks, so
+        # they aren't written into every config file
+        section = config["bumpv"]
+        sections = config.sections()
+        files = _section_names(sections, "file")
+        parts = _section_names(sections, "part")
+        return cls.from_dict({
+            "current_version": section.get("current_version"),
+            "commit": section.getboolean("commit"),
+            "tag": section.getboolean("tag"),
+            "tag_name": section.get("tag_name"),
+            "parse": section.get("parse"),
+            # a multi-line value starts with an empty line
+            "serialize": [line for line in section.get("serialize").split("\n") if line.strip()],
+            "message": section.get("message"),
+            "workers": section.getint("workers", fallback=1),
+            "native_git": section.getboolean("native_git", fallback=False),
+            "index": section.getboolean("index", fallback=False),
+            "diff_context": section.getint("diff_context", fallback=3),
+            "config_cache": section.getboolean("config_cache", fallback=False),
+            "glob_cache": section.getboolean("glob_cache", fallback=False),
+            "files": files,
+            "file_options": {
+                path: {
+                    "search": config[f"bumpv:file:{path}"].get("search", "{current_version}"),
+                    "replace": config[f"bumpv:file:{path}"].get("replace", "{new_version}"),
+                }
+                for path in files
+            },
+            "parts": parts,
+            "part_options": {name: dict(config[f"bumpv:part:{name}"]) for name in parts},
+        })
+
+    @classmethod
+    def from_dict(cls, data):
+        values = dict(data)
+        values["serialize"] = tuple(data["serialize"])
+        values["files"] = tuple(data["files"])
+        values["file_options"] = MappingProxyType({
+            path: FileOptions(options["search"], options["replace"])
+            for path, options in data["file_options"].items()
+        })
+        values["parts"] = tuple(data["parts"])
+        values["part_options"] = MappingProxyType({
+            name: MappingProxyType(dict(options))
+            for name, options in data["part_options"].items()
+        })
+        return cls(**values)
+
+    def dict(self):
+        data = {name: getattr(self, name) for name in self.__slots__}
+        data["file_options"] = {path: options._asdict() for path, options in self.file_options.items()}
+        data["part_options"] = {name: dict(options) for name, options in self.part_options.items()}
+        return data
+
+
+def cache_path_for(file_path):
+    directory, name = os.path.split(file_path)
+    return os.path.join(directory, name + CACHE_SUFFIX)
+
+
+def _file_hash(content: bytes):
+    import hashlib
+    return hashlib.blake2b(content, digest_size=20).hexdigest()
+
+
+def load_cached(file_path):
+    """
+    Returns the cached snapshot of the config at `file_path`, or None
+
+    The cache is only used if the config has the recorded size and mtime, or
+    if its content hash still matches.
+    """
+    import json
+
+    try:
+        with open(cache_path_for(file_path)) as f:
+            data = json.load(f)
+        stat = os.stat(file_path)
+    except (OSError, ValueError):
+        return None
+
+    if data.get("version") != CACHE_VERSION or data.get("size") != stat.st_size:
+        return None
+    racy = data.get("mtime_ns", 0) + RACY_NS > data.get("recorded_ns", 0)
+    if data.get("mtime_ns") != stat.st_mtime_ns or racy:
+        with open(file_path, "rb") as f:
+            if _file_hash(f.read()) != data.get("hash"):
+                return None
+
+    try:
+        return ConfigSnapshot.from_dict(data["config"])
+    except (KeyError, TypeError):
+        logger.debug(f"Ignoring invalid config cache {cache_path_for(file_path)}")
+        return None
+
+
+def save_cached(file_path, snapshot: ConfigSnapshot):
+    import json
+    from ..files.transaction import _write_atomic
+
+    with open(file_path, "rb") as f:
+        content = f.read()
+        stat = os.fstat(f.fileno())
+
+    data = {
+        "version": CACHE_VERSION,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "recorded_ns": int(time.time() * 10**9),
+        "hash": _file_hash(content),
+        "config": snapshot.dict(),
+    }
+    try:
+        _write_atomic(cache_path_for(file_path), json.dumps(data).encode("utf-8"))
+    except OSError as err:
+        logger.debug(f"Could not write config cache: {err}")
+
+
+def remove_cached(file_path):
+    try:
+        os.unlink(cache_path_for(file_path))
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,297 @@
+"""
+Expands the glob and directory targets of file sections into file paths
+
+Patterns are matched one path segment at a time, so only directories that
+can contain a match are listed: literal segments are joined without listing
+anything, `*`-style segments list a single directory and `**` descends into
+all non-hidden directories below. Directories are listed with `os.scandir`,
+concurrently if more than one worker is configured.
+"""
+import os
+import time
+from fnmatch import fnmatchcase
+
+from ..logging import get_logger
+
+
+logger = get_logger()
+
+GLOB_CACHE_NAME = ".bumpv.globs"
+GLOB_CACHE_VERSION = 2
+IGNORE_FILE = ".gitignore"
+# never searched for targets or projects
+PRUNED_DIRECTORIES = {".git", ".hg", "node_modules", "__pycache__"}
+
+# directories changed this close to being recorded might change again within
+# the same mtime tick, so they are listed again until they're older than that
+RACY_NS = 2 * 10**9
+
+
+def has_magic(pattern: str) -> bool:
+    return any(char in pattern for char in "*?[")
+
+
+def is_target_pattern(root, path) -> bool:
+    """
+    Returns True if the file section `path` names more than one file
+    """
+    return has_magic(path) or path.endswith("/") or os.path.isdir(os.path.join(root, path))
+
+
+def _segments(pattern):
+    if not has_magic(pattern):
+        # a directory target stands for every file below it
+        pattern = pattern.rstrip("/") + "/**/*"
+    return [segment for segment in pattern.split("/") if segment not in ("", ".")]
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+def _visible(name, segment):
+    return not name.startswith(".") or segment.startswith(".")
+
+
+class _Walk:
+    """
+    The state of expanding a single pattern
+
+    `directories` records the mtime of every directory that was listed
+    (None for missing ones), along with the ignore files of all directories
+    on the way, so a cached expansion can be checked without listing
+    anything.
+    """
+    def __init__(self, root, pattern):
+        self.root = root
+        self.pattern = pattern
+        self.segments = _segments(pattern)
+        self.paths = set()
+        self.directories = {}
+
+    def step(self, state):
+        """
+        Matches one segment in one directory, returns the states to continue with
+        """
+        directory, index = state
+        segment = self.segments[index]
+        last = index == len(self.segments) - 1
+        full = os.path.join(self.root, directory)
+
+        if not has_magic(segment):
+            # the directory isn't listed, so only its ignore file and the
+            # joined path are recorded, other changes to it don't matter
+            ignore_file = os.path.join(directory, IGNORE_FILE)
+            self.directories[ignore_file] = _mtime(os.path.join(self.root, ignore_file))
+            path = os.path.join(directory, segment)
+            if last:
+                self.directories[path] = _mtime(os.path.join(self.root, path))
+                if os.path.isfile(os.path.join(self.root, path)):
+                    self.paths.add(path)
+                return []
+            return [(path, index + 1)]
+
+        self.directories[directory] = _mtime(full or ".")
+        try:
+            with os.scandir(full or ".") as entries:
+                entries = list(entries)
+        except (FileNotFoundError, NotADirectoryError):
+            return []
+
+        following = []
+        recursive = segment == "**"
+        if recursive and not last:
+            following.append((directory, index + 1))
+        for entry in entries:
+            path = os.path.join(directory, entry.name)
+            if entry.name == IGNORE_FILE:
+                self.directories[path] = _mtime(entry.path)
+            is_dir = entry.is_dir(follow_symlinks=False)
+            if recursive:
+                if is_dir:
+                    if not entry.name.startswith(".") and entry.name not in PRUNED_DIRECTORIES:
+                        following.append((path, index))
+                elif last and not entry.name.startswith(".") and entry.is_file():
+                    self.paths.add(path)
+            elif fnmatchcase(entry.name, segment) and _visible(entry.name, segment):
+                if not last:
+                    if is_dir and entry.name not in PRUNED_DIRECTORIES:
+                        following.append((path, index + 1))
+                elif entry.is_file():
+                    self.paths.add(path)
+        return following
+
+    def run(self, executor=None):
+        states = [("", 0)] if self.segments else []
+        while states:
+            if executor is None:
+                results = map(self.step, states)
+            else:
+                results = executor.map(self.step, states)
+            states = [state for following in results for state in following]
+        return self
+
+
+def _expand_uncached(root, patterns, workers):
+    if workers <= 1:
+        return {pattern: _Walk(root, pattern).run() for pattern in patterns}
+
+    from concurrent.futures import ThreadPoolExecutor
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return {pattern: _Walk(root, pattern).run(executor) for pattern in patterns}
+
+
+class GlobCache:
+    """
+    Expansions of glob and directory targets from a previous run
+
+    An expansion is reused as long as none of the directories (and ignore
+    files) recorded for it changed, which only takes a `stat` each. The
+    files the VCS ignored among them are kept too, along with the mtimes
+    of the ignore files outside of the root, so the VCS isn't asked again.
+    """
+    def __init__(self, path=GLOB_CACHE_NAME):
+        self.path = path
+        self.entries = {}
+        self._dirty = False
+
+    def __repr__(self):
+        return f"<bumpv.GlobCache: {self.path} ({len(self.entries)} patterns)>"
+
+    @classmethod
+    def load(cls, path=GLOB_CACHE_NAME):
+        import json
+
+        cache = cls(path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return cache
+        except ValueError:
+            logger.warn(f"Ignoring invalid glob cache {path}")
+            return cache
+
+        if data.get("version") == GLOB_CACHE_VERSION:
+            cache.entries = data["patterns"]
+        return cache
+
+    def lookup(self, root, pattern):
+        entry = self.entries.get(pattern)
+        if entry is None:
+            return None
+        recorded_ns = entry["recorded_ns"]
+        for directory, mtime in entry["directories"].items():
+            if _mtime(os.path.join(root, directory) or ".") != mtime:
+                return None
+            if mtime is not None and mtime + RACY_NS > recorded_ns:
+                return None
+        return entry["paths"]
+
+    def lookup_ignored(self, pattern, ignore_files: dict):
+        """
+        Returns the ignored paths of `pattern` if they were recorded with the same `ignore_files`
+        """
+        entry = self.entries.get(pattern)
+        if entry is None or entry.get("ignore_files") != ignore_files:
+            return None
+        return entry.get("ignored")
+
+    def record(self, pattern, walk: _Walk):
+        self.entries[pattern] = {
+            "recorded_ns": int(time.time() * 10**9),
+            "directories": walk.directories,
+            "paths": sorted(walk.paths),
+        }
+        self._dirty = True
+
+    def record_ignored(self, pattern, ignored, ignore_files: dict):
+        entry = self.entries[pattern]
+        entry["ignored"] = sorted(ignored)
+        entry["ignore_files"] = ignore_files
+        self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+
+        import json
+        from ..files.transaction import _write_atomic
+
+        data = json.dumps({"version": GLOB_CACHE_VERSION, "patterns": self.entries}, sort_keys=True)
+        try:
+            _write_atomic(self.path, data.encode("utf-8"))
+        except OSError as err:
+            logger.debug(f"Could not write glob cache: {err}")
+
+
+def glob_cache_path_for(config):
+    return os.path.join(os.path.dirname(config.file_path), GLOB_CACHE_NAME)
+
+
+def _ignore_stamps(root, vcs):
+    """
+    Returns `{path: mtime}` of the ignore files of `vcs` outside of `root`, or None if unknown
+    """
+    ignore_files = vcs.ignore_files(root or ".")
+    if ignore_files is None:
+        return None
+    stamps = {}
+    for path in ignore_files:
+        mtime = _mtime(path)
+        if mtime is not None and mtime + RACY_NS > time.time() * 10**9:
+            return None
+        stamps[path] = mtime
+    return stamps
+
+
+def expand(root, patterns, workers=1, cache: GlobCache = None, vcs=None):
+    """
+    Returns `{pattern: [paths]}` with the files matching every glob or directory pattern
+
+    Paths are relative to `root`, like the patterns themselves. Files the
+    `vcs` session reports as ignored are left out.
+    """
+    expanded = {}
+    missing = []
+    for pattern in patterns:
+        paths = cache.lookup(root, pattern) if cache is not None else None
+        if paths is None:
+            missing.append(pattern)
+        else:
+            expanded[pattern] = paths
+
+    walks = _expand_uncached(root, missing, workers)
+    for pattern, walk in walks.items():
+        if cache is not None:
+            cache.record(pattern, walk)
+        expanded[pattern] = sorted(walk.paths)
+
+    ignored = {}
+    if vcs is not None:
+        stamps = _ignore_stamps(root, vcs) if cache is not None else None
+        unchecked = []
+        for pattern in patterns:
+            known = cache.lookup_ignored(pattern, stamps) if stamps is not None else None
+            if known is None:
+                unchecked.append(pattern)
+            else:
+                ignored[pattern] = set(known)
+
+        candidates = {path for pattern in unchecked for path in expanded[pattern]}
+        found = vcs.ignored(*(os.path.join(root, path) for path in candidates))
+        found = {os.path.relpath(path, root or ".") for path in found}
+        for pattern in unchecked:
+            ignored[pattern] = found.intersection(expanded[pattern])
+            if stamps is not None:
+                cache.record_ignored(pattern, ignored[pattern], stamps)
+
+    if cache is not None:
+        cache.save()
+    return {
+        pattern: [path for path in expanded[pattern] if path not in ignored.get(pattern, ())]
+        for pattern in patterns
+    }
@@ -1,4 +1,5 @@
 from .config.exceptions import *
 from .files.exceptions import *
+from .monorepo.exceptions import *
 from .vcs.exceptions import *
 from .versioning.exceptions import *
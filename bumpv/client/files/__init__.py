@@ -1 +1,2 @@
+from .transaction import Transaction, journal_path_for
 from .updater import FileUpdater
@@ -0,0 +1,256 @@
+import io
+
+from . import stream
+
+
+DEFAULT_CONTEXT = 3
+
+
+def _format_range(start: int, length: int) -> str:
+    # same as difflib: 1-based start, the length is left out if it's 1
+    if length == 1:
+        return f"{start + 1}"
+    if length == 0:
+        return f"{start},0"
+    return f"{start + 1},{length}"
+
+
+def _region_start(src, offset: int, lines_back: int) -> int:
+    """
+    Returns the offset of the start of the line `lines_back` lines above `offset`
+    """
+    needed = lines_back + 1
+    position = offset
+    while position > 0:
+        start = max(position - stream.CHUNK_SIZE, 0)
+        src.seek(start)
+        buf = src.read(position - start)
+        idx = len(buf)
+        while needed:
+            idx = buf.rfind(b"\n", 0, idx)
+            if idx == -1:
+                break
+            needed -= 1
+        if not needed:
+            return start + idx + 1
+        position = start
+    return 0
+
+
+def _region_end(src, end: int, lines_after: int) -> int:
+    """
+    Returns the offset after the end of the line `lines_after` lines below `end`
+    """
+    needed = lines_after + 1
+    position = end
+    src.seek(position)
+    while True:
+        buf = src.read(stream.CHUNK_SIZE)
+        if not buf:
+            return position
+        idx = -1
+        while needed:
+            idx = buf.find(b"\n", idx + 1)
+            if idx == -1:
+                break
+            needed -= 1
+        if not needed:
+            return position + idx + 1
+        position += len(buf)
+
+
+def _pattern(match) -> int:
+    # matches of a single search don't record their pattern
+    return getattr(match, "pattern", 0)
+
+
+def _changed_spans(needles, replacements):
+    """
+    Returns `(start, end)` of the bytes of each needle that its replacement changes
+
+    Whole lines the needle and its replacement start with are left out, and
+    so is everything after the last changed byte, e.g. a trailing newline.
+    Hunks then get their context around the changed lines only, like difflib.
+    """
+    spans = []
+    for needle, replacement in zip(needles, replacements):
+        if needle == replacement:
+            spans.append((0, len(needle)))
+            continue
+        limit = min(len(needle), len(replacement))
+        prefix = 0
+        while prefix < limit and needle[prefix] == replacement[prefix]:
+            prefix += 1
+        suffix = 0
+        while suffix < limit - prefix and needle[-1 - suffix] == replacement[-1 - suffix]:
+            suffix += 1
+        spans.append((needle.rfind(b"\n", 0, prefix) + 1, len(needle) - suffix))
+    return tuple(spans)
+
+
+def _changed_lines_of(match, needles, spans):
+    """
+    Returns the line numbers of the first and last line changed by `match`
+    """
+    needle = needles[_pattern(match)]
+    start, end = spans[_pattern(match)]
+    first = match.lineno + needle.count(b"\n", 0, start)
+    return first, first + needle.count(b"\n", start, end)
+
+
+def _groups(matches, needles, spans, context: int):
+    """
+    Groups matches whose hunks would overlap, like difflib does
+    """
+    group = []
+    last_line = None
+    for match in matches:
+        first, last = _changed_lines_of(match, needles, spans)
+        if group and first - last_line - 1 > 2 * context:
+            yield group
+            group = []
+        group.append(match)
+        last_line = max(last_line or 0, last)
+    if group:
+        yield group
+
+
+def _split_lines(data: bytes):
+    if not data:
+        return []
+    if data.endswith(b"\n"):
+        data = data[:-1]
+    return [line.rstrip(b"\r").decode("utf-8", "replace") for line in data.split(b"\n")]
+
+
+def _changed_lines(old_lines, new_lines):
+    """
+    Yields the diff lines of a block, lines equal at its start or end as context
+    """
+    limit = min(len(old_lines), len(new_lines))
+    head = 0
+    while head < limit and old_lines[head] == new_lines[head]:
+        head += 1
+    tail = 0
+    while tail < limit - head and old_lines[-1 - tail] == new_lines[-1 - tail]:
+        tail += 1
+
+    yield from (" " + line for line in old_lines[:head])
+    yield from ("-" + line for line in old_lines[head:len(old_lines) - tail])
+    yield from ("+" + line for line in new_lines[head:len(new_lines) - tail])
+    yield from (" " + line for line in old_lines[len(old_lines) - tail:])
+
+
+def _hunk(src, group, needles, replacements, spans, context: int, line_delta: int):
+    """
+    Returns the lines of a single hunk and the number of lines it adds
+    """
+    first_changed, _ = _changed_lines_of(group[0], needles, spans)
+    first_line = max(first_changed - context, 0)
+    start = _region_start(src, group[0].offset + spans[_pattern(group[0])][0], first_changed - first_line)
+    end = _region_end(src, max(match.offset + spans[_pattern(match)][1] for match in group), context)
+    src.seek(start)
+    region = src.read(end - start)
+
+    line_starts = [0]
+    idx = region.find(b"\n")
+    while idx != -1:
+        line_starts.append(idx + 1)
+        idx = region.find(b"\n", idx + 1)
+    if line_starts[-1] != len(region):
+        line_starts.append(len(region))
+
+    # merge the lines changed by each match into blocks of changed lines
+    blocks = []
+    for match in group:
+        first, last = _changed_lines_of(match, needles, spans)
+        first -= first_line
+        last = min(last - first_line + 1, len(line_starts) - 1)
+        if blocks and first <= blocks[-1][1]:
+            blocks[-1][1] = max(blocks[-1][1], last)
+            blocks[-1][2].append(match)
+        else:
+            blocks.append([first, last, [match]])
+
+    body = []
+    old_length = new_length = 0
+    position = 0
+    for first, last, block_matches in blocks:
+        if first > position:
+            body.extend(" " + line for line in _split_lines(region[line_starts[position]:line_starts[first]]))
+        old = region[line_starts[first]:line_starts[last]]
+        new = bytearray()
+        cursor = line_starts[first]
+        for match in block_matches:
+            # the needle and its replacement are equal outside of their span
+            pattern = _pattern(match)
+            span_start, span_end = spans[pattern]
+            needle, replacement = needles[pattern], replacements[pattern]
+            new += region[cursor:match.offset - start + span_start]
+            new += replacement[span_start:len(replacement) - (len(needle) - span_end)]
+            cursor = match.offset - start + span_end
+        new += region[cursor:line_starts[last]]
+
+        old_lines = _split_lines(old)
+        new_lines = _split_lines(bytes(new))
+        body.extend(_changed_lines(old_lines, new_lines))
+        old_length += len(old_lines) - (last - first)
+        new_length += len(new_lines) - (last - first)
+        position = last
+    if position < len(line_starts) - 1:
+        body.extend(" " + line for line in _split_lines(region[line_starts[position]:]))
+
+    old_length += len(line_starts) - 1
+    new_length += len(line_starts) - 1
+    header = "@@ -{} +{} @@".format(
+        _format_range(first_line, old_length),
+        _format_range(first_line + line_delta, new_length),
+    )
+    return [header] + body, new_length - old_length
+
+
+def unified_diff(src, path: str, matches, needle, replacement, context: int = DEFAULT_CONTEXT):
+    """
+    Yields the lines of a unified diff of replacing `needle` at each of `matches`
+
+    `needle` and `replacement` may also be sequences, indexed by the
+    `pattern` of each match. Only the lines around the matches are read from
+    the seekable stream `src`, so the cost depends on the number of matches
+    and not the size of the file.
+    """
+    needles = (needle,) if isinstance(needle, bytes) else tuple(needle)
+    replacements = (replacement,) if isinstance(replacement, bytes) else tuple(replacement)
+    if not matches or needles == replacements:
+        return
+    yield "--- a/" + path
+    yield "+++ b/" + path
+    spans = _changed_spans(needles, replacements)
+    line_delta = 0
+    for group in _groups(matches, needles, spans, context):
+        lines, added = _hunk(src, group, needles, replacements, spans, context, line_delta)
+        line_delta += added
+        yield from lines
+
+
+class FileDiff:
+    """
+    The diff of a `FileChange`, only computed once it's formatted
+
+    Pass it as an argument to a logging call so nothing is read unless the
+    message is actually emitted.
+    """
+    def __init__(self, change, context: int = DEFAULT_CONTEXT):
+        self.change = change
+        self.context = context
+
+    def __str__(self):
+        change = self.change
+        with io.open(change.path, 'rb') as src:
+            return "\n".join(unified_diff(
+                src,
+                change.path,
+                change.matches,
+                [search.encode('utf-8') for search, _ in change.patterns],
+                [replace.encode('utf-8') for _, replace in change.patterns],
+                self.context,
+            ))
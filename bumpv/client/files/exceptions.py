@@ -1,2 +1,6 @@
 class InvalidTargetFile(Exception):
     pass
+
+
+class PendingTransactionError(Exception):
+    pass
@@ -0,0 +1,170 @@
+import os
+import threading
+import time
+
+from ..logging import get_logger
+
+
+logger = get_logger()
+
+INDEX_NAME = ".bumpv.index"
+INDEX_VERSION = 1
+
+# files modified this close to being recorded might change again within the
+# same mtime tick, so their content is verified once more before trusting it
+RACY_NS = 2 * 10**9
+
+
+def new_hasher():
+    import hashlib
+    return hashlib.blake2b(digest_size=20)
+
+
+def file_hash(path):
+    hasher = new_hasher()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1024 * 1024)
+            if not chunk:
+                return hasher.hexdigest()
+            hasher.update(chunk)
+
+
+def index_path_for(config):
+    return os.path.join(os.path.dirname(config.file_path), INDEX_NAME)
+
+
+class ContentIndex:
+    """
+    Remembers where the search text of each target file was found
+
+    Entries are keyed by path and record the file's size, mtime and content
+    hash along with the search text and the `(offset, lineno)` of all of its
+    occurrences. An entry is only used while the file is unchanged: if size
+    and mtime match, or the content hash still does after a mere touch or
+    if the file was recorded right after being written.
+
+    Once a bump has staged a file, the id the VCS gave its content is
+    recorded as `blob`. A file the VCS reports with the same staged id and
+    without changes in the working tree is known to be unchanged without
+    looking at it, even after a fresh checkout.
+    """
+    def __init__(self, path=INDEX_NAME):
+        self.path = path
+        self.root = os.path.dirname(path)
+        self.entries = {}
+        self._lock = threading.Lock()
+        self._dirty = False
+
+    def __repr__(self):
+        return f"<bumpv.ContentIndex: {self.path} ({len(self.entries)} files)>"
+
+    @classmethod
+    def load(cls, path=INDEX_NAME):
+        import json
+
+        index = cls(path)
+        try:
+            with open(path) as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return index
+        except ValueError:
+            logger.warn(f"Ignoring invalid index file {path}")
+            return index
+
+        if data.get("version") == INDEX_VERSION:
+            index.entries = data["files"]
+        return index
+
+    def _key(self, path):
+        return os.path.relpath(path, self.root or ".")
+
+    def lookup(self, path, search_for: str, unchanged=False):
+        """
+        Returns the recorded `(offset, lineno)` matches of `search_for` in `path`
+
+        Returns None if there is no entry, or the file or search changed. If
+        the file is known to be `unchanged`, its size, mtime and hash aren't
+        checked.
+        """
+        entry = self.entries.get(self._key(path))
+        if entry is None or entry["search"] != search_for:
+            return None
+
+        if not unchanged:
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                return None
+            if stat.st_size != entry["size"]:
+                return None
+            racy = entry["mtime_ns"] + RACY_NS > entry["recorded_ns"]
+            if stat.st_mtime_ns != entry["mtime_ns"] or racy:
+                if file_hash(path) != entry["hash"]:
+                    return None
+                with self._lock:
+                    entry["mtime_ns"] = stat.st_mtime_ns
+                    entry["recorded_ns"] = int(time.time() * 10**9)
+                    self._dirty = True
+
+        needle = search_for.encode("utf-8")
+        with open(path, "rb") as f:
+            for offset, _ in entry["matches"]:
+                f.seek(offset)
+                if f.read(len(needle)) != needle:
+                    return None
+        return [tuple(match) for match in entry["matches"]]
+
+    def record(self, path, search_for: str, matches, digest: str):
+        """
+        Records `matches` of `search_for` in the current content of `path`
+        """
+        stat = os.stat(path)
+        with self._lock:
+            self.entries[self._key(path)] = {
+                "size": stat.st_size,
+                "mtime_ns": stat.st_mtime_ns,
+                "recorded_ns": int(time.time() * 10**9),
+                "hash": digest,
+                "search": search_for,
+                "matches": [list(match) for match in matches],
+            }
+            self._dirty = True
+
+    def blobs(self, paths):
+        """
+        Returns `{path: blob}` for those of `paths` with a recorded content id
+        """
+        blobs = {}
+        for path in paths:
+            entry = self.entries.get(self._key(path))
+            if entry is not None and entry.get("blob"):
+                blobs[path] = entry["blob"]
+        return blobs
+
+    def record_blob(self, path, blob: str):
+        """
+        Records the id the VCS gave the current content of `path`
+        """
+        with self._lock:
+            entry = self.entries.get(self._key(path))
+            if entry is not None and entry.get("blob") != blob:
+                entry["blob"] = blob
+                self._dirty = True
+
+    def forget(self, path):
+        with self._lock:
+            if self.entries.pop(self._key(path), None) is not None:
+                self._dirty = True
+
+    def save(self):
+        if not self._dirty:
+            return
+
+        import json
+        from .transaction import _write_atomic
+
+        data = json.dumps({"version": INDEX_VERSION, "files": self.entries}, sort_keys=True)
+        _write_atomic(self.path, data.encode("utf-8"))
+        self._dirty = False
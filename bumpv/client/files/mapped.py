@@ -0,0 +1,86 @@
+import os
+from contextlib import contextmanager
+
+from .stream import CHUNK_SIZE, Match, _check_needle, _line_at
+
+
+# below this size reading the file in one chunk is cheaper than mapping it
+MMAP_THRESHOLD = 256 * 1024
+
+
+@contextmanager
+def mapped(src, threshold: int = MMAP_THRESHOLD):
+    """
+    Maps the file behind the binary stream `src` read-only
+
+    Yields None if the file is too small to be worth mapping or can't be
+    mapped at all (empty files, pipes), the caller then falls back to reading
+    `src` as a stream.
+    """
+    try:
+        size = os.fstat(src.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        size = 0
+    if size < max(threshold, 1):
+        yield None
+        return
+
+    # only files large enough to be mapped pay for the import
+    import mmap
+    try:
+        buf = mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        yield None
+        return
+    try:
+        yield buf
+    finally:
+        buf.close()
+
+
+def _count_lines(buf, start: int, end: int, chunk_size: int = CHUNK_SIZE) -> int:
+    # mmap has no count(), slicing it in chunks keeps the copies bounded
+    lines = 0
+    for position in range(start, end, chunk_size):
+        lines += buf[position:min(position + chunk_size, end)].count(b"\n")
+    return lines
+
+
+def find(buf, needle: bytes):
+    """
+    Returns the first `Match` of `needle` in the mapped file `buf`, or None
+
+    Only the line around the match is decoded.
+    """
+    _check_needle(needle)
+    idx = buf.find(needle)
+    if idx == -1:
+        return None
+    return Match(
+        offset=idx,
+        lineno=_count_lines(buf, 0, idx),
+        line=_line_at(buf, idx, idx + len(needle)),
+    )
+
+
+def find_all(buf, needle: bytes):
+    """
+    Returns a `Match` for every occurrence of `needle` in the mapped file `buf`
+    """
+    _check_needle(needle)
+    matches = []
+    start = 0
+    lineno = 0
+    counted = 0
+    while True:
+        idx = buf.find(needle, start)
+        if idx == -1:
+            return matches
+        lineno += _count_lines(buf, counted, idx)
+        counted = idx
+        matches.append(Match(
+            offset=idx,
+            lineno=lineno,
+            line=_line_at(buf, idx, idx + len(needle)),
+        ))
+        start = idx + len(needle)
@@ -0,0 +1,114 @@
+import re
+from collections import namedtuple
+
+from .mapped import _count_lines
+from .stream import CHUNK_SIZE, _check_needle, _line_at
+
+
+# like `stream.Match`, with the index of the pattern that matched
+PatternMatch = namedtuple("PatternMatch", ["offset", "lineno", "line", "pattern"])
+
+
+class Matcher:
+    """
+    Finds any of several search patterns in a single pass
+
+    All patterns are compiled into one alternation, longest first, so at
+    any position the longest pattern wins and matches never overlap. Every
+    match records the index of its pattern in `needles`. A pattern that is
+    part of a longer one is also counted where the longer one matched.
+    """
+    def __init__(self, needles):
+        needles = list(needles)
+        for needle in needles:
+            _check_needle(needle)
+        if len(set(needles)) != len(needles):
+            raise ValueError("search patterns must be unique")
+        self.needles = needles
+        self.longest = max(len(needle) for needle in needles)
+        self._index = {needle: index for index, needle in enumerate(needles)}
+        # `(index, occurrences)` of the other patterns found inside each pattern
+        self._contained = [
+            [(index, needle.count(other)) for index, other in enumerate(needles) if other != needle and other in needle]
+            for needle in needles
+        ]
+        self._regex = re.compile(b"|".join(
+            re.escape(needle) for needle in sorted(needles, key=len, reverse=True)
+        ))
+
+    def __repr__(self):
+        return f"<bumpv.Matcher: {len(self.needles)} patterns>"
+
+    def counts(self, matches):
+        """
+        Returns the number of matches of each pattern, including those inside matches of longer patterns
+        """
+        counts = [0] * len(self.needles)
+        contained = self._contained
+        for match in matches:
+            counts[match.pattern] += 1
+            for index, occurrences in contained[match.pattern]:
+                counts[index] += occurrences
+        return counts
+
+    def find_all(self, buf):
+        """
+        Returns a `PatternMatch` for every match in `buf`, bytes or a memory map
+        """
+        matches = []
+        lineno = 0
+        counted = 0
+        for found in self._regex.finditer(buf):
+            idx = found.start()
+            lineno += _count_lines(buf, counted, idx)
+            counted = idx
+            matches.append(PatternMatch(idx, lineno, _line_at(buf, idx, found.end()), self._index[found.group()]))
+        return matches
+
+    def replace(self, src, dst, replacements, chunk_size: int = CHUNK_SIZE):
+        """
+        Copies `src` to `dst` replacing each match with the replacement of its pattern
+
+        Works like `stream.replace`: `dst` may be None to only collect the
+        matches. Matches starting within the last `longest - 1` bytes of the
+        buffer are left for the next chunk, since a longer pattern might
+        match there once more data is read.
+        """
+        overlap = self.longest - 1
+        search = self._regex.search
+        index = self._index
+        buf = b""
+        base = 0
+        lineno = 0
+        matches = []
+        write = dst.write if dst is not None else (lambda data: None)
+
+        while True:
+            chunk = src.read(chunk_size)
+            buf += chunk
+            limit = len(buf) if not chunk else len(buf) - overlap
+
+            start = 0
+            counted = 0
+            while True:
+                found = search(buf, start)
+                if found is None or found.start() >= limit:
+                    break
+                idx = found.start()
+                lineno += buf.count(b"\n", counted, idx)
+                counted = idx
+                pattern = index[found.group()]
+                matches.append(PatternMatch(base + idx, lineno, _line_at(buf, idx, found.end()), pattern))
+                write(buf[start:idx])
+                write(replacements[pattern])
+                start = found.end()
+
+            if not chunk:
+                write(buf[start:])
+                return matches
+
+            keep_from = max(start, limit)
+            write(buf[start:keep_from])
+            lineno += buf.count(b"\n", counted, keep_from)
+            base += keep_from
+            buf = buf[keep_from:]
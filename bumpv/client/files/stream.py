@@ -0,0 +1,202 @@
+from collections import namedtuple
+
+
+CHUNK_SIZE = 64 * 1024
+
+Match = namedtuple("Match", ["offset", "lineno", "line"])
+
+
+def _check_needle(needle: bytes):
+    if not needle:
+        raise ValueError("search pattern must not be empty")
+
+
+def _line_at(buf: bytes, start: int, end: int) -> str:
+    line_start = buf.rfind(b"\n", 0, start) + 1
+    line_end = buf.find(b"\n", end)
+    if line_end == -1:
+        line_end = len(buf)
+    return buf[line_start:line_end].decode("utf-8", "replace").rstrip()
+
+
+def find(src, needle: bytes, chunk_size: int = CHUNK_SIZE):
+    """
+    Returns the first `Match` of `needle` in the binary stream `src`, or None.
+
+    Only `chunk_size + len(needle)` bytes are held in memory at any time, the
+    last `len(needle) - 1` bytes of every chunk are carried over so matches
+    crossing a chunk boundary are still found.
+    """
+    _check_needle(needle)
+    overlap = len(needle) - 1
+    buf = b""
+    base = 0
+    lineno = 0
+
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return None
+        buf += chunk
+
+        idx = buf.find(needle)
+        if idx != -1:
+            return Match(
+                offset=base + idx,
+                lineno=lineno + buf.count(b"\n", 0, idx),
+                line=_line_at(buf, idx, idx + len(needle)),
+            )
+
+        drop = max(len(buf) - overlap, 0)
+        lineno += buf.count(b"\n", 0, drop)
+        base += drop
+        buf = buf[drop:]
+
+
+def replace(src, dst, needle: bytes, replacement: bytes, chunk_size: int = CHUNK_SIZE):
+    """
+    Copies `src` to `dst` replacing every occurrence of `needle` with `replacement`.
+
+    `dst` may be None in which case nothing is written and only the matches are
+    collected. Returns a `Match` for every occurrence of `needle` in `src`.
+    """
+    _check_needle(needle)
+    overlap = len(needle) - 1
+    buf = b""
+    base = 0
+    lineno = 0
+    matches = []
+    write = dst.write if dst is not None else (lambda data: None)
+
+    while True:
+        chunk = src.read(chunk_size)
+        buf += chunk
+
+        start = 0
+        counted = 0
+        while True:
+            idx = buf.find(needle, start)
+            if idx == -1:
+                break
+            lineno += buf.count(b"\n", counted, idx)
+            counted = idx
+            matches.append(Match(
+                offset=base + idx,
+                lineno=lineno,
+                line=_line_at(buf, idx, idx + len(needle)),
+            ))
+            write(buf[start:idx])
+            write(replacement)
+            start = idx + len(needle)
+
+        if not chunk:
+            write(buf[start:])
+            return matches
+
+        keep_from = max(start, len(buf) - overlap)
+        write(buf[start:keep_from])
+        lineno += buf.count(b"\n", counted, keep_from)
+        base += keep_from
+        buf = buf[keep_from:]
+
+
+def line_around(src, offset: int, length: int, window: int = 1024) -> str:
+    """
+    Returns the line of a match at `offset` in the seekable stream `src`
+    """
+    start = max(offset - window, 0)
+    src.seek(start)
+    buf = src.read(offset - start + length + window)
+    return _line_at(buf, offset - start, offset - start + length)
+
+
+def splice(src, dst, offsets, length: int, replacement: bytes, chunk_size: int = CHUNK_SIZE):
+    """
+    Copies `src` to `dst` replacing `length` bytes at each of the known `offsets`
+
+    Unlike `replace` this doesn't search at all, the offsets must be sorted
+    and must not overlap.
+    """
+    position = 0
+    for offset in offsets:
+        remaining = offset - position
+        while remaining > 0:
+            chunk = src.read(min(chunk_size, remaining))
+            if not chunk:
+                raise ValueError(f"offset {offset} is beyond the end of the file")
+            dst.write(chunk)
+            remaining -= len(chunk)
+        src.read(length)
+        dst.write(replacement)
+        position = offset + length
+
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return
+        dst.write(chunk)
+
+
+class Scanner:
+    """
+    Finds all occurrences of `needle` in data that is fed in pieces
+
+    Matches are recorded as `(offset, lineno)` in `matches`.
+    """
+    def __init__(self, needle: bytes):
+        _check_needle(needle)
+        self.needle = needle
+        self.matches = []
+        self._overlap = len(needle) - 1
+        self._buf = b""
+        self._base = 0
+        self._lineno = 0
+
+    def feed(self, data: bytes):
+        buf = self._buf + data
+        needle = self.needle
+        start = 0
+        counted = 0
+        while True:
+            idx = buf.find(needle, start)
+            if idx == -1:
+                break
+            self._lineno += buf.count(b"\n", counted, idx)
+            counted = idx
+            self.matches.append((self._base + idx, self._lineno))
+            start = idx + len(needle)
+
+        keep_from = max(start, len(buf) - self._overlap)
+        self._lineno += buf.count(b"\n", counted, keep_from)
+        self._base += keep_from
+        self._buf = buf[keep_from:]
+
+
+class HashingReader:
+    """
+    Wraps a binary stream, feeding everything read from it into `hasher`
+    """
+    def __init__(self, src, hasher):
+        self.src = src
+        self.hasher = hasher
+
+    def read(self, size=-1):
+        data = self.src.read(size)
+        self.hasher.update(data)
+        return data
+
+
+class ScanningWriter:
+    """
+    Wraps a binary stream, hashing and scanning everything written to it
+    """
+    def __init__(self, dst, hasher, scanner: Scanner = None):
+        self.dst = dst
+        self.hasher = hasher
+        self.scanner = scanner
+
+    def write(self, data: bytes):
+        self.dst.write(data)
+        self.hasher.update(data)
+        if self.scanner is not None:
+            self.scanner.feed(data)
@@ -0,0 +1,156 @@
+import os
+
+from .exceptions import PendingTransactionError
+from ..logging import get_logger
+
+
+logger = get_logger()
+
+JOURNAL_NAME = ".bumpv.journal"
+
+
+def _write_atomic(path, data: bytes):
+    from tempfile import NamedTemporaryFile
+    tmp = NamedTemporaryFile('wb', dir=os.path.dirname(path) or ".", prefix=".bumpv-", delete=False)
+    try:
+        with tmp:
+            tmp.write(data)
+            tmp.flush()
+            os.fsync(tmp.fileno())
+        os.replace(tmp.name, path)
+    except BaseException:
+        if os.path.exists(tmp.name):
+            os.unlink(tmp.name)
+        raise
+
+
+def _fsync(path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def journal_path_for(config):
+    return os.path.join(os.path.dirname(config.file_path), JOURNAL_NAME)
+
+
+def _backup_path(path):
+    head, tail = os.path.split(path)
+    return os.path.join(head, f".{tail}.bumpv-backup")
+
+
+class Transaction:
+    """
+    Applies a set of staged files together, with a journal to undo them
+
+    Every entry pairs a target path with a staged file in the same directory.
+    On commit, the journal is written first, then every target is preserved as
+    a backup and the staged files are moved over the targets. Until `finalize`
+    is called, `rollback` (also from a fresh process, via `load`) restores all
+    targets from their backups.
+    """
+    def __init__(self, journal_path=JOURNAL_NAME):
+        self.journal_path = os.path.abspath(journal_path)
+        self.entries = []
+
+    def __repr__(self):
+        return f"<bumpv.Transaction: {self.journal_path} ({len(self.entries)} files)>"
+
+    @classmethod
+    def load(cls, journal_path=JOURNAL_NAME):
+        """
+        Returns the transaction recorded in `journal_path`, or None if there is none
+        """
+        import json
+        try:
+            with open(journal_path) as journal:
+                entries = json.load(journal)["entries"]
+        except FileNotFoundError:
+            return None
+
+        transaction = cls(journal_path)
+        transaction.entries = entries
+        return transaction
+
+    @classmethod
+    def assert_none_pending(cls, journal_path=JOURNAL_NAME):
+        if os.path.exists(journal_path):
+            raise PendingTransactionError(
+                f"found journal of an unfinished bump at '{journal_path}', use 'bumpv rollback' to restore the files"
+            )
+
+    def stage(self, path, staged):
+        path = os.path.abspath(path)
+        self.entries.append({
+            "path": path,
+            "staged": os.path.abspath(staged),
+            "backup": _backup_path(path),
+        })
+
+    def stage_config(self, config):
+        from tempfile import NamedTemporaryFile
+        tmp = NamedTemporaryFile('w', dir=os.path.dirname(config.file_path) or ".", prefix=".bumpv-", delete=False)
+        tmp.close()
+        try:
+            config.write(tmp.name)
+        except BaseException:
+            os.unlink(tmp.name)
+            raise
+        self.stage(config.file_path, tmp.name)
+
+    def discard(self):
+        """
+        Removes all staged files without touching any target
+        """
+        for entry in self.entries:
+            if os.path.exists(entry["staged"]):
+                os.unlink(entry["staged"])
+        self.entries = []
+
+    def commit(self):
+        import json
+        import shutil
+
+        # the staged contents must be on disk before the journal says they replace the targets
+        for entry in self.entries:
+            _fsync(entry["staged"])
+        _write_atomic(self.journal_path, json.dumps({"entries": self.entries}, indent=2).encode("utf-8"))
+
+        for entry in self.entries:
+            try:
+                os.link(entry["path"], entry["backup"])
+            except OSError:
+                shutil.copy2(entry["path"], entry["backup"])
+
+        for entry in self.entries:
+            shutil.copymode(entry["path"], entry["staged"])
+            os.replace(entry["staged"], entry["path"])
+            logger.debug("Replaced %s", entry["path"])
+
+    def rollback(self):
+        """
+        Restores every target from its backup and removes the journal
+        """
+        for entry in self.entries:
+            if os.path.exists(entry["backup"]):
+                os.replace(entry["backup"], entry["path"])
+                logger.info("Restored %s", entry["path"])
+            if os.path.exists(entry["staged"]):
+                os.unlink(entry["staged"])
+        self._remove_journal()
+
+    def finalize(self):
+        """
+        Makes the committed changes permanent by dropping backups and the journal
+        """
+        for entry in self.entries:
+            if os.path.exists(entry["backup"]):
+                os.unlink(entry["backup"])
+        self._remove_journal()
+
+    def _remove_journal(self):
+        if os.path.exists(self.journal_path):
+            os.unlink(self.journal_path)
+        self.entries = []
@@ -1,8 +1,16 @@
 import io
-from difflib import unified_diff
+import logging
+import os
 
+from . import mapped, stream
+from .diff import FileDiff
+from .matcher import Matcher
 from .exceptions import InvalidTargetFile
+from .index import ContentIndex, index_path_for, new_hasher
+from .transaction import Transaction, journal_path_for
 from ..logging import get_logger
+from ..profiling import NULL_PROFILER
+from ..vcs.exceptions import VCSCommandError
 
 from typing import TYPE_CHECKING
 from ..config import Configuration
@@ -12,96 +20,459 @@ from ..versioning import Version
 logger = get_logger()
 
 
+class FileChange:
+    """
+    The outcome of rewriting a single file, staged but not yet applied
+    """
+    def __init__(self, path, search_for, replace_with, matches, staged=None, index_entry=None, patterns=None):
+        self.path = path
+        self.search_for = search_for
+        self.replace_with = replace_with
+        self.matches = matches
+        self.staged = staged
+        self.index_entry = index_entry
+        # `(search, replace)` of every pattern, `match.pattern` indexes into it
+        self.patterns = patterns or [(search_for, replace_with)]
+
+    def first_matches(self):
+        """
+        Returns `(search, match)` with the first match of every pattern
+        """
+        first = {}
+        for match in self.matches:
+            first.setdefault(getattr(match, "pattern", 0), match)
+        return [(self.patterns[pattern][0], match) for pattern, match in sorted(first.items())]
+
+    @property
+    def changes_content(self):
+        return any(search != replace for search, replace in self.patterns)
+
+    def commit(self):
+        if self.staged is not None:
+            import shutil
+            shutil.copymode(self.path, self.staged)
+            os.replace(self.staged, self.path)
+            self.staged = None
+
+    def discard(self):
+        if self.staged is not None:
+            os.unlink(self.staged)
+            self.staged = None
+
+
 class FileUpdater:
-    def __init__(self, config: Configuration, current_version: Version, new_version: Version):
+    def __init__(self, config: Configuration, current_version: Version, new_version: Version, workers=None,
+                 profiler=NULL_PROFILER, vcs=None):
         self.config = config
-        self.paths = config.files()
+        self.profiler = profiler
+        self.vcs = vcs
+        self.paths = list(config.files())
         self.current_version = current_version
         self.new_version = new_version
+        self.workers = workers or config.workers
         self.context = {
             "current_version": current_version.serialize(),
             "new_version": new_version.serialize(),
         }
+        self.index = ContentIndex.load(index_path_for(config)) if config.index else None
+        self.patterns = {path: self._format_patterns(options) for path, options in config.targets().items()}
+        self.search_for = {path: patterns[0][0] for path, patterns in self.patterns.items()}
+        self.replace_with = {path: patterns[0][1] for path, patterns in self.patterns.items()}
+        self.unchanged = self._unchanged_paths()
+
+    def _unchanged_paths(self):
+        """
+        Returns the target paths the VCS reports with the content recorded in the index
+
+        A file qualifies if its staged content has the id recorded by the last
+        bump and the working tree doesn't differ from it. Such files skip all
+        checks of their index entry, even after a fresh checkout.
+        """
+        if self.index is None or self.vcs is None:
+            return set()
+        recorded = self.index.blobs(self.config.resolve(path) for path in self.paths)
+        if not recorded:
+            return set()
+
+        with self.profiler.span("index.vcs"):
+            absolute = [os.path.abspath(path) for path in recorded]
+            try:
+                staged = self.vcs.file_blobs(*absolute)
+                modified = self.vcs.modified_paths(*absolute) if staged else set()
+            except VCSCommandError as err:
+                logger.debug(f"Could not check target files with the VCS: {err.message}")
+                return set()
+
+        unchanged = set()
+        for path, blob in recorded.items():
+            real = os.path.realpath(path)
+            if staged.get(real) == blob and real not in modified:
+                unchanged.add(path)
+        self.profiler.count("files.unchanged", len(unchanged))
+        return unchanged
+
+    def _format_patterns(self, options):
+        """
+        Returns `(search, replace)` for every distinct search of a file's options
+        """
+        patterns = {}
+        for option in options:
+            patterns.setdefault(option.search.format(**self.context), option.replace.format(**self.context))
+        return list(patterns.items())
+
+    def _search_for(self, path):
+        return self.search_for[path]
+
+    def _matcher(self, path):
+        """
+        Returns a `Matcher` for all patterns of `path`, or None if it only has one
+        """
+        patterns = self.patterns[path]
+        if len(patterns) == 1:
+            return None
+        return Matcher([search.encode('utf-8') for search, _ in patterns])
+
+    def _next_search_for(self, path):
+        """
+        Returns what the next bump will search for in `path`, if it's known yet
+        """
+        try:
+            options = self.config.targets()[path]
+        except KeyError:
+            return None
+        if len(options) > 1:
+            return None
+        # the context of the next bump, as far as it's known now
+        return options[0].search.format(**dict(self.context, current_version=self.context["new_version"]))
+
+    def _replace_with(self, path):
+        return self.replace_with[path]
+
+    def _map(self, func, paths):
+        """
+        Applies `func` to every path, concurrently if more than one worker is configured
+
+        Results are returned in the order of `paths`. If any call fails, the
+        error of the first failing path is raised once all calls are done.
+        """
+        results = []
+        try:
+            if self.workers <= 1 or len(paths) <= 1:
+                for path in paths:
+                    results.append(func(path))
+                return results
+
+            from concurrent.futures import ThreadPoolExecutor
+            with ThreadPoolExecutor(max_workers=self.workers) as executor:
+                futures = [executor.submit(func, path) for path in paths]
+
+            error = None
+            for future in futures:
+                try:
+                    results.append(future.result())
+                except Exception as err:
+                    if error is None:
+                        error = err
+            if error is not None:
+                raise error
+            return results
+        except Exception:
+            for result in results:
+                if isinstance(result, FileChange):
+                    result.discard()
+            raise
+
+    def _not_found(self, path, search_for):
+        return InvalidTargetFile(f"Did not find '{search_for}' in file {path}")
 
     def _validate(self):
         """
         Checks that all files listed in the config have matching text to replace
         """
-        for path in self.paths:
-            options = self.config.get_file_section(path)
-            serialized_version = options["search"].format(**self.context)
-            if not self._contains(path):
-                raise InvalidTargetFile(
-                    f"Did not find '{self.current_version}' or '{serialized_version}' in file {path}"
-                )
+        for path, missing in zip(self.paths, self._map(self._missing, self.paths)):
+            if missing is not None:
+                raise self._not_found(self.config.resolve(path), missing)
         return True
 
-    def _contains(self, path):
+    def _missing(self, path):
+        """
+        Returns a search text of `path` that isn't found in it, or None
+        """
+        if self._matcher(path) is None:
+            return None if self._contains(path) else self._search_for(path)
+
+        matches = self._find_all(path)
+        for (search_for, _), count in zip(self.patterns[path], self._matcher(path).counts(matches)):
+            if not count:
+                return search_for
+        for search_for, match in FileChange(path, None, None, matches, patterns=self.patterns[path]).first_matches():
+            self._log_found(self.config.resolve(path), search_for, match)
+        return None
+
+    def _find_all(self, path):
+        """
+        Returns the matches of all patterns of `path`, found in a single pass
+        """
+        matcher = self._matcher(path)
         try:
-            with io.open(path, 'rb') as f:
-                options = self.config.get_file_section(path)
-                serialized_version = options["search"].format(**self.context)
-                search_lines = serialized_version.splitlines()
-                lookbehind = []
-
-                for lineno, line in enumerate(f.readlines()):
-                    lookbehind.append(line.decode('utf-8').rstrip("\n"))
-
-                    if len(lookbehind) > len(search_lines):
-                        lookbehind = lookbehind[1:]
-
-                    if (search_lines[0] in lookbehind[0] and
-                       search_lines[-1] in lookbehind[-1] and
-                       search_lines[1:-1] == lookbehind[1:-1]):
-                        logger.info("Found '{}' in {} at line {}: {}".format(
-                            serialized_version, path, lineno - (len(lookbehind) - 1), line.decode('utf-8').rstrip()))
-                        return True
+            with io.open(self.config.resolve(path), 'rb') as f:
+                self.profiler.count("files.scanned")
+                with mapped.mapped(f) as buf:
+                    if buf is not None:
+                        return matcher.find_all(buf)
+                return matcher.replace(f, None, [b""] * len(matcher.needles))
+        except FileNotFoundError:
+            raise InvalidTargetFile(f"file listed in config not found: '{self.config.resolve(path)}'")
+
+    def _find(self, path):
+        serialized_version = self._search_for(path)
+        needle = serialized_version.encode('utf-8')
+        try:
+            with io.open(self.config.resolve(path), 'rb') as f:
+                known = self._lookup(self.config.resolve(path), serialized_version)
+                if known is not None:
+                    self.profiler.count("index.hits")
+                    return self._known_matches(f, known[:1], needle)[0] if known else None
+                self.profiler.count("files.scanned")
+                with mapped.mapped(f) as buf:
+                    if buf is not None:
+                        return mapped.find(buf, needle)
+                return stream.find(f, needle)
+        except FileNotFoundError:
+            raise InvalidTargetFile(f"file listed in config not found: '{self.config.resolve(path)}'")
+
+    def _log_found(self, path, search_for, match):
+        logger.info("Found '%s' in %s at line %s: %s", search_for, path, match.lineno, match.line)
+
+    def _contains(self, path):
+        match = self._find(path)
+        if match is None:
             return False
+
+        self._log_found(self.config.resolve(path), self._search_for(path), match)
+        return True
+
+    def _lookup(self, path, search_for):
+        if self.index is None:
+            return None
+        return self.index.lookup(path, search_for, path in self.unchanged)
+
+    def _known_matches(self, src, known, needle):
+        return [
+            stream.Match(offset, lineno, stream.line_around(src, offset, len(needle)))
+            for offset, lineno in known
+        ]
+
+    def _rewrite(self, path, src, dst, search_for, replacement):
+        """
+        Copies `src` to `dst` with `search_for` replaced, returns the matches
+
+        Occurrences recorded in the index are spliced in directly without
+        searching the file. Otherwise the file is scanned and the index updated.
+        Without `dst` large files are searched through a memory map.
+        """
+        needle = search_for.encode('utf-8')
+        known = self._lookup(path, search_for)
+        if known is not None:
+            self.profiler.count("index.hits")
+            if dst is not None:
+                stream.splice(src, dst, [offset for offset, _ in known], len(needle), replacement)
+                self.profiler.count("bytes.read", src.tell())
+            return self._known_matches(src, known, needle)
+
+        self.profiler.count("files.scanned")
+        if dst is None:
+            with mapped.mapped(src) as buf:
+                if buf is not None:
+                    matches = mapped.find_all(buf, needle)
+                    if self.index is not None:
+                        hasher = new_hasher()
+                        hasher.update(buf)
+                        self.index.record(path, search_for, [match[:2] for match in matches], hasher.hexdigest())
+                    self.profiler.count("bytes.read", len(buf))
+                    return matches
+
+        if self.index is None:
+            matches = stream.replace(src, dst, needle, replacement)
+        else:
+            reader = stream.HashingReader(src, new_hasher())
+            matches = stream.replace(reader, dst, needle, replacement)
+            self.index.record(path, search_for, [match[:2] for match in matches], reader.hasher.hexdigest())
+        self.profiler.count("bytes.read", src.tell())
+        return matches
+
+    def _rewrite_many(self, src, dst, matcher: Matcher, replacements):
+        """
+        Copies `src` to `dst` replacing the matches of all patterns in a single pass
+
+        Without `dst` large files are searched through a memory map.
+        """
+        self.profiler.count("files.scanned")
+        if dst is None:
+            with mapped.mapped(src) as buf:
+                if buf is not None:
+                    self.profiler.count("bytes.read", len(buf))
+                    return matcher.find_all(buf)
+
+        matches = matcher.replace(src, dst, replacements)
+        self.profiler.count("bytes.read", src.tell())
+        return matches
+
+    def _prepare(self, path, dry_run=False):
+        """
+        Rewrites `path` in a single pass into a temporary file next to it
+
+        The temporary file is only moved over `path` once the returned
+        `FileChange` is committed. During a dry run nothing is written at all.
+        With the index enabled, the rewritten content is scanned for what the
+        next bump will search for while it's written.
+        """
+        search_for = self._search_for(path)
+        replace_with = self._replace_with(path)
+        replacement = replace_with.encode('utf-8')
+        next_search = self._next_search_for(path) if self.index is not None else None
+        matcher = self._matcher(path)
+        patterns = self.patterns[path]
+        path = self.config.resolve(path)
+        index_entry = None
+
+        def rewrite(src, dst):
+            if matcher is not None:
+                return self._rewrite_many(src, dst, matcher, [replace.encode('utf-8') for _, replace in patterns])
+            return self._rewrite(path, src, dst, search_for, replacement)
+
+        try:
+            with self.profiler.span("files.rewrite", path=path), io.open(path, 'rb') as src:
+                if dry_run:
+                    matches = rewrite(src, None)
+                    staged = None
+                else:
+                    from tempfile import NamedTemporaryFile
+                    tmp = NamedTemporaryFile('wb', dir=os.path.dirname(path) or ".", prefix=".bumpv-", delete=False)
+                    staged = tmp.name
+                    try:
+                        with tmp:
+                            if next_search:
+                                scanner = stream.Scanner(next_search.encode('utf-8'))
+                                dst = stream.ScanningWriter(tmp, new_hasher(), scanner)
+                            else:
+                                dst = tmp
+                            matches = rewrite(src, dst)
+                            self.profiler.count("bytes.written", tmp.tell())
+                    except BaseException:
+                        os.unlink(staged)
+                        raise
+                    if next_search:
+                        index_entry = (next_search, scanner.matches, dst.hasher.hexdigest())
         except FileNotFoundError:
             raise InvalidTargetFile(f"file listed in config not found: '{path}'")
 
+        self.profiler.count("matches.found", len(matches))
+        change = FileChange(path, search_for, replace_with, matches, staged, index_entry, patterns)
+        counts = matcher.counts(matches) if matcher is not None else [len(matches)]
+        for (search, _), count in zip(patterns, counts):
+            if not count:
+                change.discard()
+                raise self._not_found(path, search)
+        return change
+
+    def _log_diff(self, change):
+        with self.profiler.span("files.diff", path=change.path):
+            logger.info("%s", FileDiff(change, self.config.diff_context))
+
     def _replace(self, path, dry_run=False):
-        with io.open(path, 'rb') as f:
-            file_content_before = f.read().decode('utf-8')
-
-        options = self.config.get_file_section(path)
-        search_for = options["search"].format(**self.context)
-        replace_with = options["replace"].format(**self.context)
-
-        file_content_after = file_content_before.replace(search_for, replace_with)
-
-        if file_content_before == file_content_after:
-            # TODO expose this to be configurable
-            file_content_after = file_content_before.replace(
-                self.current_version.original,
-                replace_with,
-            )
-
-        if file_content_before != file_content_after:
-            logger.info("{} file {}:".format(
-                "Would change" if dry_run else "Changing",
-                path,
-            ))
-            logger.info("\n".join(list(unified_diff(
-                file_content_before.splitlines(),
-                file_content_after.splitlines(),
-                lineterm="",
-                fromfile="a/"+path,
-                tofile="b/"+path
-            ))))
+        change = self._prepare(path, dry_run)
+        self._log_change(change, dry_run)
+        change.commit()
+
+    def _log_change(self, change, dry_run=False):
+        if change.changes_content:
+            logger.info("%s file %s:", "Would change" if dry_run else "Changing", change.path)
+            if logger.isEnabledFor(logging.INFO):
+                self._log_diff(change)
         else:
-            logger.info("{} file {}".format(
-                "Would not change" if dry_run else "Not changing",
-                path,
-            ))
-        if not dry_run:
-            with io.open(path, 'wb') as f:
-                f.write(file_content_after.encode('utf-8'))
-
-    def replace(self, dry_run=False):
-        if self._validate():
-            for path in self.paths:
-                    self._replace(path, dry_run)
+            logger.info("%s file %s", "Would not change" if dry_run else "Not changing", change.path)
+
+    def prepare(self, dry_run=False):
+        """
+        Searches and stages all configured files, possibly in parallel
+
+        Nothing is logged or written to the target files yet, see `apply`.
+        A dry run reads the index but never saves it.
+        """
+        return self._map(lambda path: self._prepare(path, dry_run), self.paths)
+
+    def replace(self, dry_run=False, transaction: Transaction = None):
+        """
+        Validates and rewrites all configured files
+
+        All files are searched and staged first, possibly in parallel, and only
+        written once every file was found to contain the text to replace.
+        """
+        return self.apply(self.prepare(dry_run), dry_run, transaction)
+
+    def apply(self, changes, dry_run=False, transaction: Transaction = None):
+        """
+        Logs and writes the changes returned by `prepare`
+
+        If a `transaction` is given the staged files are added to it and left
+        for the caller to commit, otherwise they are committed right away.
+        """
+        for change in changes:
+            for search_for, match in change.first_matches():
+                self._log_found(change.path, search_for, match)
+        for change in changes:
+            self._log_change(change, dry_run)
+        if dry_run:
+            return changes
+
+        owned = transaction is None
+        if owned:
+            transaction = Transaction(journal_path_for(self.config))
+        for change in changes:
+            transaction.stage(change.path, change.staged)
+            change.staged = None
+
+        if owned:
+            try:
+                transaction.commit()
+            except BaseException:
+                transaction.rollback()
+                raise
+            transaction.finalize()
+            self.refresh_index(changes)
+        return changes
+
+    def refresh_index(self, changes):
+        """
+        Records the occurrences found while rewriting, once the files are written
+        """
+        if self.index is None:
+            return
+        with self.profiler.span("index.refresh"):
+            self._refresh_index(changes)
+
+    def _refresh_index(self, changes):
+        for change in changes:
+            if change.index_entry is None:
+                self.index.forget(change.path)
+            else:
+                self.index.record(change.path, *change.index_entry)
+        self._record_blobs([change.path for change in changes if change.index_entry is not None])
+        self.index.save()
+
+    def _record_blobs(self, paths):
+        if self.vcs is None or not paths:
+            return
+        try:
+            ids = self.vcs.content_ids(*(os.path.abspath(path) for path in paths))
+        except VCSCommandError as err:
+            logger.debug(f"Could not record content ids: {err.message}")
+            return
+        for path in paths:
+            blob = ids.get(os.path.realpath(path))
+            if blob is not None:
+                self.index.record_blob(path, blob)
 
     def __str__(self):
         return self.paths
@@ -1 +1 @@
-from .logging import get_logger_list, get_logger
+from .logging import JsonLinesFormatter, configure_logging, get_logger_list, get_logger, stop_logging
@@ -4,33 +4,148 @@ import sys
 
 _logger = None
 _logger_list = None
+_listener = None
 
+# arguments of these types can't change before a queued record is formatted
+PLAIN_TYPES = (str, int, float, bool, type(None))
 
-def get_logger(level: int = 0):
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    Formats each record as a single line of JSON
+    """
+    def __init__(self):
+        import json
+
+        super().__init__()
+        self._dumps = json.dumps
+
+    def format(self, record):
+        entry = {
+            "time": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return self._dumps(entry)
+
+
+class _StreamHandler(logging.StreamHandler):
+    # the listener flushes once the queue runs empty, not after every record
+    def emit(self, record):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+def _get_logger():
     global _logger
-    logger_list = get_logger_list()
     if _logger is None:
         _logger = logging.getLogger("bumpv.logger")
+    return _logger
+
+
+def get_logger(level: int = None):
+    """
+    Returns the bumpv logger, setting its level from the verbosity `level`
+
+    Without a `level` the current one is kept, so modules can call this at
+    import time.
+    """
+    logger = _get_logger()
+    logger_list = get_logger_list()
     log_formatter = logging.Formatter('%(message)s')
 
-    if len(_logger.handlers) == 0:
+    if len(logger.handlers) == 0:
         ch = logging.StreamHandler(sys.stderr)
         ch.setFormatter(log_formatter)
-        _logger.addHandler(ch)
+        logger.addHandler(ch)
 
     if len(logger_list.handlers) == 0:
         ch2 = logging.StreamHandler(sys.stdout)
         ch2.setFormatter(log_formatter)
         logger_list.addHandler(ch2)
 
-    log_level = {
-        0: logging.WARNING,
-        1: logging.INFO,
-        2: logging.DEBUG,
-    }.get(level, logging.DEBUG)
+    if level is not None:
+        log_level = {
+            0: logging.WARNING,
+            1: logging.INFO,
+            2: logging.DEBUG,
+        }.get(level, logging.DEBUG)
+        logger.setLevel(log_level)
+    return logger
 
-    _logger.setLevel(log_level)
-    return _logger
+
+def configure_logging(json_lines: bool = False, queued: bool = False, stream=None):
+    """
+    Replaces the handler of the bumpv logger
+
+    With `json_lines` every record is written as a line of JSON. With
+    `queued` records are put on a queue and written by a `QueueListener`
+    thread, which flushes whenever the queue runs empty. The listener is
+    stopped at exit, or by `stop_logging`.
+    """
+    global _listener
+    logger = _get_logger()
+    stop_logging()
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+
+    stream = stream if stream is not None else sys.stderr
+    handler = _StreamHandler(stream) if queued else logging.StreamHandler(stream)
+    handler.setFormatter(JsonLinesFormatter() if json_lines else logging.Formatter('%(message)s'))
+    if queued:
+        import atexit
+        import queue
+        # logging.handlers pulls in socket, pickle and more, only load it for the queued mode
+        from logging.handlers import QueueHandler, QueueListener
+
+        class _QueueHandler(QueueHandler):
+            """
+            Hands records to the listener, formatting only those that can't wait
+
+            A record whose arguments are plain values is formatted by the listener.
+            Other arguments, like a `FileDiff`, may read state that changes once
+            the call returns, so these records are formatted right away.
+            """
+            def prepare(self, record):
+                args = record.args
+                if isinstance(args, dict):
+                    args = args.values()
+                if record.exc_info is None and all(type(arg) in PLAIN_TYPES for arg in args or ()):
+                    return record
+                return super().prepare(record)
+
+        class _Listener(QueueListener):
+            def handle(self, record):
+                super().handle(record)
+                if self.queue.empty():
+                    for handler in self.handlers:
+                        handler.flush()
+
+        records = queue.SimpleQueue()
+        _listener = _Listener(records, handler)
+        _listener.start()
+        atexit.register(stop_logging)
+        handler = _QueueHandler(records)
+    logger.addHandler(handler)
+    return logger
+
+
+def stop_logging():
+    """
+    Writes all queued records and stops the listener thread, if there is one
+    """
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    for handler in listener.handlers:
+        handler.flush()
 
 
 def get_logger_list():
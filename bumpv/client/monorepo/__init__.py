@@ -0,0 +1 @@
+from .monorepo import MonorepoClient, discover_projects
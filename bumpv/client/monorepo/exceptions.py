@@ -0,0 +1,2 @@
+class NoProjectsFound(Exception):
+    pass
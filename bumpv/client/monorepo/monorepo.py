@@ -0,0 +1,217 @@
+import os
+
+from .exceptions import NoProjectsFound
+from ..client import BumpClient
+from ..config import Configuration
+from ..config.targets import PRUNED_DIRECTORIES
+from ..files import Transaction
+from ..files.transaction import JOURNAL_NAME
+from ..logging import get_logger
+from ..profiling import NULL_PROFILER
+from ..vcs import get_vcs
+from ..vcs.exceptions import DuplicateTagError
+
+
+logger = get_logger()
+
+CONFIG_NAME = ".bumpv.cfg"
+
+
+def discover_projects(root=".", config_name=CONFIG_NAME):
+    """
+    Returns `{project name: config path}` for every config file below `root`
+
+    The project name is the directory of the config relative to `root`, "."
+    for a config in `root` itself. Hidden directories are not searched.
+    """
+    projects = {}
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        with os.scandir(directory) as entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if not entry.name.startswith(".") and entry.name not in PRUNED_DIRECTORIES:
+                        stack.append(entry.path)
+                elif entry.name == config_name:
+                    projects[os.path.relpath(directory, root)] = os.path.normpath(entry.path)
+    return dict(sorted(projects.items()))
+
+
+class MonorepoClient:
+    """
+    Bumps several projects, each with its own config, in one go
+
+    All projects share a single VCS session. Their file changes are staged
+    concurrently and applied as one transaction, followed by a single commit
+    and one tag per project.
+    """
+    def __init__(self, root=".", projects=None, verbosity=0, allow_dirty=False, workers=None, profiler=None):
+        self.logger = get_logger(verbosity)
+        self.root = root
+        self.workers = workers
+        self.profiler = profiler if profiler is not None else NULL_PROFILER
+
+        with self.profiler.span("projects.discover"):
+            configs = discover_projects(root)
+        if projects:
+            missing = [name for name in projects if name not in configs]
+            if missing:
+                raise NoProjectsFound(f"no {CONFIG_NAME} found for: {', '.join(missing)}")
+            configs = {name: configs[name] for name in configs if name in projects}
+        if not configs:
+            raise NoProjectsFound(f"no {CONFIG_NAME} found below '{root}'")
+
+        with self.profiler.span("config.load"):
+            configs = {name: Configuration(path) for name, path in configs.items()}
+        native = any(config.native_git for config in configs.values())
+        with self.profiler.span("vcs.discover"):
+            self.vcs = get_vcs(allow_dirty, native=native, profiler=self.profiler)
+        self.clients = {
+            name: BumpClient(config, verbosity, allow_dirty, workers, vcs=self.vcs, profiler=self.profiler)
+            for name, config in configs.items()
+        }
+        self.transaction = None
+
+    def __repr__(self):
+        return f"<bumpv.MonorepoClient: {self.root} ({len(self.clients)} projects)>"
+
+    def _prepare_all(self, part, dry_run):
+        """
+        Returns the prepared changes of every project, or discards all of them if any project fails
+        """
+        clients = list(self.clients.values())
+        changes = []
+        if not self.workers or self.workers <= 1:
+            try:
+                for client in clients:
+                    changes.append(client.prepare(part, dry_run))
+            except BaseException:
+                self._discard(changes)
+                raise
+            return changes
+
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(client.prepare, part, dry_run) for client in clients]
+
+        error = None
+        for future in futures:
+            try:
+                changes.append(future.result())
+            except Exception as err:
+                changes.append([])
+                error = error or err
+        if error is not None:
+            self._discard(changes)
+            raise error
+        return changes
+
+    @staticmethod
+    def _discard(changes):
+        for change in (change for project_changes in changes for change in project_changes):
+            change.discard()
+
+    def _stage_all(self, part, dry_run):
+        """
+        Prepares all projects concurrently, then stages them in project order
+        """
+        paths = []
+        for client, changes in zip(self.clients.values(), self._prepare_all(part, dry_run)):
+            paths.extend(client.stage(part, dry_run, self.transaction, changes))
+        return paths
+
+    def tags(self):
+        tags = {}
+        for name, client in self.clients.items():
+            if client.config.tag:
+                tags.setdefault(client.new_version.get_tag(), []).append(name)
+
+        duplicates = {tag: names for tag, names in tags.items() if len(names) > 1}
+        if duplicates:
+            raise DuplicateTagError("several projects would create the same tag: " + ", ".join(
+                f"{tag} ({', '.join(names)})" for tag, names in duplicates.items()
+            ))
+        return list(tags)
+
+    def commit_message(self):
+        if len(self.clients) == 1:
+            return next(iter(self.clients.values())).commit_message()
+
+        lines = [f"Bump versions of {len(self.clients)} projects", ""]
+        for name, client in self.clients.items():
+            lines.append(f"{name}: {client.commit_message()}")
+        return "\n".join(lines)
+
+    def bump(self, part, dry_run=False):
+        with self.profiler.span("bump", part=part, dry_run=dry_run):
+            return self._bump(part, dry_run)
+
+    def _bump(self, part, dry_run=False):
+        journal_path = os.path.join(self.root, JOURNAL_NAME)
+        Transaction.assert_none_pending(journal_path)
+
+        self.transaction = Transaction(journal_path)
+        try:
+            paths = self._stage_all(part, dry_run)
+            tags = self.tags()
+        except BaseException:
+            self.transaction.discard()
+            raise
+
+        if not dry_run:
+            try:
+                with self.profiler.span("transaction.commit"):
+                    self.transaction.commit()
+            except BaseException:
+                self.rollback()
+                raise
+
+            for client in self.clients.values():
+                client.updater.refresh_index(client.changes)
+            if self.vcs is not None:
+                with self.profiler.span("vcs.add"):
+                    self.vcs.add_path(*paths)
+
+        if self.vcs is not None and any(client.config.commit for client in self.clients.values()):
+            message = self.commit_message()
+            self.logger.debug(f"COMMITTING w/ message: {message}")
+            with self.profiler.span("vcs.commit"):
+                self.vcs.commit(message, dry_run)
+
+        self.transaction.finalize()
+
+        if not dry_run and self.vcs is not None:
+            for tag in tags:
+                self.logger.debug(f"GIT TAG: {tag}")
+                with self.profiler.span("vcs.tag"):
+                    self.vcs.tag(tag)
+
+        return {name: client.new_version for name, client in self.clients.items()}
+
+    def rollback(self):
+        transaction = self.transaction
+        if transaction is None or not transaction.entries:
+            transaction = Transaction.load(os.path.join(self.root, JOURNAL_NAME))
+        if transaction is None:
+            return False
+
+        paths = [entry["path"] for entry in transaction.entries]
+        transaction.rollback()
+        if self.vcs is not None:
+            self.vcs.add_path(*paths)
+
+        for client in self.clients.values():
+            client.reload()
+        return True
+
+    def dict(self):
+        return {"projects": {name: client.dict() for name, client in self.clients.items()}}
+
+    def json(self):
+        import json
+        return json.dumps(self.dict())
+
+    def yaml(self):
+        import yaml
+        return yaml.dump(self.dict())
@@ -0,0 +1 @@
+from .profiling import NullProfiler, Profiler, NULL_PROFILER
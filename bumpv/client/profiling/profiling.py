@@ -0,0 +1,87 @@
+import threading
+import time
+from contextlib import contextmanager
+
+
+class NullProfiler:
+    """
+    Accepts spans and counters and throws them away
+
+    This is the profiler used unless one is passed to `BumpClient`. Custom
+    profilers implement the same two methods.
+    """
+    @contextmanager
+    def span(self, name, **attrs):
+        yield
+
+    def count(self, name, value=1):
+        pass
+
+
+NULL_PROFILER = NullProfiler()
+
+
+class Profiler(NullProfiler):
+    """
+    Records timing spans and counters of a bump
+
+    Span start times are seconds relative to the creation of the profiler. If
+    a `callback` is given it's called as `callback("span", name, duration,
+    attrs)` whenever a span ends and as `callback("count", name, value, {})`
+    whenever a counter is incremented.
+    """
+    def __init__(self, callback=None):
+        self.callback = callback
+        self.spans = []
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._origin = time.perf_counter()
+
+    def __repr__(self):
+        return f"<bumpv.Profiler: {len(self.spans)} spans>"
+
+    @contextmanager
+    def span(self, name, **attrs):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            duration = time.perf_counter() - start
+            record = dict(attrs, name=name, start=start - self._origin, duration=duration)
+            with self._lock:
+                self.spans.append(record)
+            if self.callback is not None:
+                self.callback("span", name, duration, attrs)
+
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        if self.callback is not None:
+            self.callback("count", name, value, {})
+
+    def totals(self):
+        """
+        Returns the summed duration of all spans by name
+        """
+        totals = {}
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0.0) + span["duration"]
+        return totals
+
+    def dict(self):
+        """
+        Returns `{"spans": [...], "totals": {...}, "counters": {...}}`
+
+        Every span is a dict of its attributes with `name`, `start` and
+        `duration`, sorted by start. Spans nest by time only, e.g. a
+        `subprocess` span falls within the `vcs.add` span that ran it.
+        """
+        return {
+            "spans": sorted(self.spans, key=lambda span: span["start"]),
+            "totals": self.totals(),
+            "counters": dict(self.counters),
+        }
+
+    def json(self):
+        import json
+        return json.dumps(self.dict(), indent=2, sort_keys=True)
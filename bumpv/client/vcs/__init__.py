@@ -1 +1,11 @@
-from .vcs import get_vcs, WorkingDirectoryIsDirtyException
+from .vcs import get_vcs, check_dirty, BaseVCS, Git, Mercurial, WorkingDirectoryIsDirtyException
+
+# the asyncio backend is only imported when it's used, asyncio is slow to import
+_ASYNC_NAMES = ("AsyncVCS", "discover_async", "get_vcs_async")
+
+
+def __getattr__(name):
+    if name in _ASYNC_NAMES:
+        from . import aio
+        return getattr(aio, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,159 @@
+"""
+Runs the commands of a VCS session as asyncio subprocesses
+
+An `AsyncVCS` wraps a regular `Git` or `Mercurial` session and shares its
+caches, so results computed asynchronously are seen by code that uses the
+wrapped session directly and vice versa.
+"""
+import asyncio
+import os
+
+from .exceptions import VCSCommandError, WorkingDirectoryIsDirtyException
+from .vcs import VCS, BaseVCS, _parse_describe, _parse_status
+from ..logging import get_logger
+from ..profiling import NULL_PROFILER
+
+
+logger = get_logger()
+
+
+async def _exec(command, cwd=None, input: bytes = None, profiler=NULL_PROFILER):
+    """
+    Runs `command`, returns `(returncode, stdout, stderr)`
+    """
+    profiler.count("subprocesses")
+    with profiler.span("subprocess", command=" ".join(command[:2])):
+        process = await asyncio.create_subprocess_exec(
+            *command,
+            cwd=cwd,
+            stdin=asyncio.subprocess.PIPE if input is not None else asyncio.subprocess.DEVNULL,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+        )
+        stdout, stderr = await process.communicate(input)
+    return process.returncode, stdout, stderr
+
+
+class AsyncVCS:
+    """
+    The asynchronous counterpart of a `BaseVCS` session, available as `sync`
+    """
+    def __init__(self, sync: BaseVCS):
+        self.sync = sync
+
+    def __repr__(self):
+        return f"<bumpv.AsyncVCS: {self.sync!r}>"
+
+    @classmethod
+    async def discover(cls, vcs, cwd=None, profiler=NULL_PROFILER):
+        """
+        Returns a session of the `vcs` class for the repository containing `cwd`, or None
+        """
+        try:
+            returncode, stdout, _ = await _exec(vcs._TEST_USABLE_COMMAND, cwd, profiler=profiler)
+        except FileNotFoundError:
+            return None
+        if returncode != 0:
+            return None
+        sync = vcs._from_discovery(stdout.decode().splitlines(), cwd)
+        sync.profiler = profiler
+        return cls(sync)
+
+    async def _run(self, command, input: bytes = None):
+        returncode, stdout, stderr = await _exec(command, self.sync.cwd, input, self.sync.profiler)
+        if returncode != 0:
+            raise VCSCommandError((stderr or stdout or b"").decode(), command)
+        return stdout
+
+    async def _in_thread(self, func, *args):
+        return await asyncio.get_running_loop().run_in_executor(None, func, *args)
+
+    async def status(self):
+        sync = self.sync
+        if sync._status is None and getattr(sync, "_STATUS_COMMAND", None):
+            sync._status = _parse_status(await self._run(sync._STATUS_COMMAND))
+        return sync.status()
+
+    async def assert_nondirty(self):
+        if self.sync.native:
+            # reading the git directory is file I/O, not a subprocess
+            return await self._in_thread(self.sync.assert_nondirty)
+        await self.status()
+        self.sync.assert_nondirty()
+
+    async def check_dirty(self, allow_dirty=False):
+        try:
+            await self.assert_nondirty()
+        except WorkingDirectoryIsDirtyException as e:
+            if not allow_dirty:
+                logger.warn(f"{e.message}\n\nUse --allow-dirty to override this if you know what you're doing.")
+                raise
+
+    async def latest_tag_info(self):
+        sync = self.sync
+        command = getattr(sync, "_DESCRIBE_COMMAND", None)
+        if sync._latest_tag_info is not None or command is None or sync.native:
+            return await self._in_thread(sync.latest_tag_info)
+
+        try:
+            # git-describe doesn't update the git-index, so we do that
+            await self._run(["git", "update-index", "--refresh"])
+        except VCSCommandError:
+            pass
+        try:
+            output = await self._run(command)
+        except VCSCommandError as err:
+            logger.warn(f"Error when running git describe: {err.message}")
+            return {}
+        sync._latest_tag_info = _parse_describe(output)
+        return sync._latest_tag_info
+
+    async def tags(self, prefix=""):
+        return await self._in_thread(self.sync.tags, prefix)
+
+    async def add_path(self, *paths):
+        if not paths or self.sync._ADD_COMMAND is None:
+            return
+        await self._run(self.sync._ADD_COMMAND + list(paths))
+        self.sync._invalidate()
+
+    async def commit(self, message: str, dry_run=False):
+        if dry_run:
+            return self.sync.commit(message, dry_run)
+
+        from tempfile import NamedTemporaryFile
+        with NamedTemporaryFile('wb', delete=False) as commit_file:
+            commit_file.write(message.encode('utf-8'))
+        try:
+            await self._run(self.sync._COMMIT_COMMAND + [commit_file.name])
+        finally:
+            os.unlink(commit_file.name)
+            self.sync._invalidate()
+
+    async def tag(self, name):
+        if self.sync._TAG_COMMAND is None:
+            return
+        await self._run(self.sync._TAG_COMMAND + [name])
+        self.sync._invalidate()
+
+
+async def discover_async(cwd=None, profiler=NULL_PROFILER):
+    """
+    Returns an `AsyncVCS` for the first usable VCS without checking its status
+
+    All backends are probed concurrently.
+    """
+    sessions = await asyncio.gather(*(AsyncVCS.discover(vcs, cwd, profiler) for vcs in VCS))
+    return next((session for session in sessions if session is not None), None)
+
+
+async def get_vcs_async(allow_dirty: bool = False, cwd=None, native: bool = False, profiler=NULL_PROFILER):
+    """
+    Returns an `AsyncVCS` for the first usable VCS, like `get_vcs`
+    """
+    session = await discover_async(cwd, profiler)
+    if session is not None:
+        session.sync.native = native
+        if not allow_dirty:
+            await session.check_dirty()
+    return session
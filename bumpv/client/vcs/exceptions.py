@@ -7,3 +7,15 @@ class VCSCommandError(Exception):
     def __init__(self, message, command):
         self.message = message
         self.command = command
+
+
+class UnsupportedRepositoryError(Exception):
+    """
+    Raised when the native git reader can't answer without running git
+    """
+    def __init__(self, message):
+        self.message = message
+
+
+class DuplicateTagError(Exception):
+    pass
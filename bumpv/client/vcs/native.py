@@ -0,0 +1,607 @@
+"""
+Read-only access to a git repository without spawning git
+
+Only what `Git.latest_tag_info`, `Git.tags` and `Git.assert_nondirty` need
+is implemented: resolving refs, reading commits and tags from loose objects
+and pack files, and comparing the index against HEAD and the working tree. Whenever the
+repository uses something that isn't understood here, or the answer would
+need more than cheap metadata, `UnsupportedRepositoryError` is raised and
+the caller falls back to running git.
+"""
+import os
+import struct
+import zlib
+from bisect import bisect_left
+
+from .exceptions import UnsupportedRepositoryError
+
+
+OBJECT_TYPES = {1: b"commit", 2: b"tree", 3: b"blob", 4: b"tag"}
+OFS_DELTA = 6
+REF_DELTA = 7
+
+GITLINK_MODE = 0o160000
+
+# errors reading a repository this module doesn't understand may raise
+NATIVE_ERRORS = (UnsupportedRepositoryError, OSError, ValueError, IndexError, KeyError, struct.error, zlib.error)
+
+
+def _apply_delta(base: bytes, delta: bytes) -> bytes:
+    def varint(pos):
+        value = shift = 0
+        while True:
+            byte = delta[pos]
+            pos += 1
+            value |= (byte & 0x7f) << shift
+            shift += 7
+            if not byte & 0x80:
+                return value, pos
+
+    _, pos = varint(0)
+    result_size, pos = varint(pos)
+    result = bytearray()
+
+    while pos < len(delta):
+        opcode = delta[pos]
+        pos += 1
+        if opcode & 0x80:
+            offset = size = 0
+            for i in range(4):
+                if opcode & (1 << i):
+                    offset |= delta[pos] << (8 * i)
+                    pos += 1
+            for i in range(3):
+                if opcode & (1 << (4 + i)):
+                    size |= delta[pos] << (8 * i)
+                    pos += 1
+            result += base[offset:offset + (size or 0x10000)]
+        elif opcode:
+            result += delta[pos:pos + opcode]
+            pos += opcode
+        else:
+            raise UnsupportedRepositoryError("invalid delta opcode")
+
+    if len(result) != result_size:
+        raise UnsupportedRepositoryError("delta produced an object of the wrong size")
+    return bytes(result)
+
+
+def _common_dir(git_dir):
+    try:
+        with open(os.path.join(git_dir, "commondir")) as f:
+            return os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except FileNotFoundError:
+        return git_dir
+
+
+class _Pack:
+    def __init__(self, idx_path):
+        with open(idx_path, "rb") as f:
+            data = f.read()
+        if data[:8] != b"\xfftOc\x00\x00\x00\x02":
+            raise UnsupportedRepositoryError(f"unsupported pack index: {idx_path}")
+
+        self.fanout = struct.unpack_from(">256I", data, 8)
+        count = self.fanout[255]
+        names_start = 8 + 256 * 4
+        self.names = [data[names_start + 20 * i:names_start + 20 * (i + 1)] for i in range(count)]
+        offsets_start = names_start + 24 * count
+        large_start = offsets_start + 4 * count
+        self.offsets = []
+        for offset in struct.unpack_from(f">{count}I", data, offsets_start):
+            if offset & 0x80000000:
+                offset = struct.unpack_from(">Q", data, large_start + 8 * (offset & 0x7fffffff))[0]
+            self.offsets.append(offset)
+        self.pack_path = idx_path[:-len(".idx")] + ".pack"
+        self._file = None
+
+    def open(self):
+        if self._file is None:
+            self._file = open(self.pack_path, "rb")
+        return self._file
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def offset_of(self, sha: bytes):
+        lo = self.fanout[sha[0] - 1] if sha[0] else 0
+        hi = self.fanout[sha[0]]
+        index = bisect_left(self.names, sha, lo, hi)
+        if index < hi and self.names[index] == sha:
+            return self.offsets[index]
+        return None
+
+
+class Repository:
+    """
+    A git directory, read through the file system only
+    """
+    def __init__(self, git_dir):
+        self.git_dir = git_dir
+        self.common_dir = _common_dir(git_dir)
+
+        self.objects_dir = os.path.join(self.common_dir, "objects")
+        if os.path.exists(os.path.join(self.objects_dir, "info", "alternates")):
+            raise UnsupportedRepositoryError("repositories with alternates are not supported")
+        self._packs = None
+        self._packed_refs = None
+        self._fully_peeled = False
+
+    def __repr__(self):
+        return f"<bumpv.native.Repository: {self.git_dir}>"
+
+    def close(self):
+        for pack in self._packs or []:
+            pack.close()
+
+    # refs
+
+    def packed_refs(self):
+        """
+        Returns `{ref: (sha, peeled sha or None)}` from the packed-refs file
+        """
+        if self._packed_refs is None:
+            refs = {}
+            last = None
+            try:
+                with open(os.path.join(self.common_dir, "packed-refs"), "rb") as f:
+                    for line in f:
+                        line = line.rstrip(b"\n")
+                        if line.startswith(b"# pack-refs with:"):
+                            self._fully_peeled = b" fully-peeled" in line
+                            continue
+                        if not line or line.startswith(b"#"):
+                            continue
+                        if line.startswith(b"^"):
+                            refs[last] = (refs[last][0], line[1:].decode())
+                            continue
+                        sha, name = line.split(b" ", 1)
+                        last = name.decode()
+                        refs[last] = (sha.decode(), None)
+            except FileNotFoundError:
+                pass
+            self._packed_refs = refs
+        return self._packed_refs
+
+    def resolve(self, ref="HEAD", depth=0):
+        if depth > 5:
+            raise UnsupportedRepositoryError(f"too many symbolic refs resolving {ref}")
+
+        base_dir = self.git_dir if ref == "HEAD" else self.common_dir
+        try:
+            with open(os.path.join(base_dir, ref), "rb") as f:
+                content = f.read().strip().decode()
+        except (FileNotFoundError, IsADirectoryError):
+            if ref in self.packed_refs():
+                return self.packed_refs()[ref][0]
+            return None
+
+        if content.startswith("ref: "):
+            return self.resolve(content[len("ref: "):], depth + 1)
+        return content
+
+    def tags(self, prefix=""):
+        """
+        Returns `{tag name: sha of the ref}` for all tags starting with `prefix`
+        """
+        tags = {
+            ref[len("refs/tags/"):]: sha
+            for ref, (sha, _) in self.packed_refs().items()
+            if ref.startswith("refs/tags/" + prefix)
+        }
+
+        tags_dir = os.path.join(self.common_dir, "refs", "tags")
+        stack = [("", tags_dir)]
+        while stack:
+            name_prefix, directory = stack.pop()
+            try:
+                entries = list(os.scandir(directory))
+            except FileNotFoundError:
+                continue
+            for entry in entries:
+                name = name_prefix + entry.name
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append((name + "/", entry.path))
+                elif name.startswith(prefix):
+                    with open(entry.path, "rb") as f:
+                        tags[name] = f.read().strip().decode()
+        return tags
+
+    def peel(self, tag_name, sha):
+        """
+        Returns the commit a tag points to, following annotated tags
+        """
+        packed_sha, peeled = self.packed_refs().get("refs/tags/" + tag_name, (None, None))
+        if packed_sha == sha:
+            if peeled is not None:
+                return peeled
+            if self._fully_peeled:
+                # without a peeled line the ref doesn't point to a tag object
+                return sha
+
+        for _ in range(10):
+            object_type, data = self.read_object(sha)
+            if object_type == b"commit":
+                return sha
+            if object_type != b"tag":
+                return None
+            sha = data.split(b"\n", 1)[0][len(b"object "):].decode()
+        raise UnsupportedRepositoryError(f"tag {tag_name} is nested too deeply")
+
+    # objects
+
+    def packs(self):
+        if self._packs is None:
+            pack_dir = os.path.join(self.objects_dir, "pack")
+            try:
+                names = sorted(os.listdir(pack_dir))
+            except FileNotFoundError:
+                names = []
+            self._packs = [_Pack(os.path.join(pack_dir, name)) for name in names if name.endswith(".idx")]
+        return self._packs
+
+    def read_object(self, sha: str):
+        """
+        Returns `(type, content)` of an object
+        """
+        path = os.path.join(self.objects_dir, sha[:2], sha[2:])
+        try:
+            with open(path, "rb") as f:
+                raw = zlib.decompress(f.read())
+        except FileNotFoundError:
+            pass
+        else:
+            header, _, content = raw.partition(b"\0")
+            return header.split(b" ", 1)[0], content
+
+        binary_sha = bytes.fromhex(sha)
+        for pack in self.packs():
+            offset = pack.offset_of(binary_sha)
+            if offset is not None:
+                return self._read_packed(pack.open(), offset)
+        raise UnsupportedRepositoryError(f"object {sha} not found")
+
+    def _read_packed(self, f, offset, depth=0):
+        if depth > 50:
+            raise UnsupportedRepositoryError("delta chain too long")
+
+        f.seek(offset)
+        byte = f.read(1)[0]
+        object_type = (byte >> 4) & 0x7
+        while byte & 0x80:
+            byte = f.read(1)[0]
+
+        if object_type == OFS_DELTA:
+            byte = f.read(1)[0]
+            base_offset = byte & 0x7f
+            while byte & 0x80:
+                byte = f.read(1)[0]
+                base_offset = ((base_offset + 1) << 7) | (byte & 0x7f)
+            delta = self._inflate(f)
+            base_type, base = self._read_packed(f, offset - base_offset, depth + 1)
+            return base_type, _apply_delta(base, delta)
+
+        if object_type == REF_DELTA:
+            base_sha = f.read(20).hex()
+            delta = self._inflate(f)
+            base_type, base = self.read_object(base_sha)
+            return base_type, _apply_delta(base, delta)
+
+        if object_type not in OBJECT_TYPES:
+            raise UnsupportedRepositoryError(f"unknown pack object type {object_type}")
+        return OBJECT_TYPES[object_type], self._inflate(f)
+
+    @staticmethod
+    def _inflate(f):
+        decompressor = zlib.decompressobj()
+        chunks = []
+        while not decompressor.eof:
+            data = f.read(4096)
+            if not data:
+                raise UnsupportedRepositoryError("truncated pack file")
+            chunks.append(decompressor.decompress(data))
+        return b"".join(chunks)
+
+    def commit_info(self, sha):
+        """
+        Returns `(tree sha, [parent shas])` of a commit
+        """
+        object_type, data = self.read_object(sha)
+        if object_type != b"commit":
+            raise UnsupportedRepositoryError(f"{sha} is not a commit")
+
+        tree = None
+        parents = []
+        for line in data.split(b"\n\n", 1)[0].split(b"\n"):
+            if line.startswith(b"tree "):
+                tree = line[5:].decode()
+            elif line.startswith(b"parent "):
+                parents.append(line[7:].decode())
+        return tree, parents
+
+
+def _index_cache_tree(data, pos, end):
+    path, _, rest = data[pos:end].partition(b"\0")
+    if path:
+        return None
+    header, _, rest = rest.partition(b"\n")
+    entry_count = int(header.split(b" ")[0])
+    if entry_count < 0:
+        return None
+    return rest[:20].hex()
+
+
+# attributes that make the working tree content differ from the blob
+CONVERSION_ATTRIBUTES = {"text", "eol", "filter", "ident", "working-tree-encoding"}
+
+
+def _xdg_config():
+    return os.environ.get("XDG_CONFIG_HOME") or os.path.expanduser(os.path.join("~", ".config"))
+
+
+def _config_paths(git_dir, common_dir):
+    paths = [os.path.join(common_dir, "config"), os.path.join(git_dir, "config.worktree")]
+    if os.environ.get("GIT_CONFIG_GLOBAL"):
+        paths.append(os.environ["GIT_CONFIG_GLOBAL"])
+    else:
+        paths.extend([os.path.join(_xdg_config(), "git", "config"), os.path.expanduser(os.path.join("~", ".gitconfig"))])
+    paths.append(os.environ.get("GIT_CONFIG_SYSTEM") or "/etc/gitconfig")
+    return paths
+
+
+def _read_config(paths):
+    """
+    Returns `{(section, key): value}` of the git config files at `paths`, later files win
+    """
+    options = {}
+    for path in paths:
+        try:
+            with open(path, encoding="utf-8", errors="surrogateescape") as f:
+                lines = f.read().splitlines()
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        section = ""
+        for line in lines:
+            line = line.strip()
+            if not line or line[0] in "#;":
+                continue
+            if line.startswith("["):
+                section = line[1:line.index("]")].split()[0].lower()
+                line = line[line.index("]") + 1:].strip()
+                if not line:
+                    continue
+            key, _, value = line.partition("=")
+            options[(section, key.strip().lower())] = value.strip().strip('"') or "true"
+    return options
+
+
+def _assert_no_conversion(repository, root, names):
+    """
+    Raises `UnsupportedRepositoryError` if files may be converted between the index and the working tree
+
+    With `core.autocrlf`, filters or conversion attributes a clean file can
+    differ from its blob in size, so comparing sizes doesn't tell if it's dirty.
+    """
+    if os.environ.get("GIT_CONFIG_PARAMETERS") or os.environ.get("GIT_CONFIG_COUNT"):
+        raise UnsupportedRepositoryError("config given in the environment is not supported")
+
+    options = _read_config(_config_paths(repository.git_dir, repository.common_dir))
+    for section, key in options:
+        if section in ("include", "includeif"):
+            raise UnsupportedRepositoryError("included config files are not supported")
+        if section == "filter":
+            raise UnsupportedRepositoryError("repositories with filters are not supported")
+    if options.get(("core", "autocrlf"), "false").lower() not in ("false", "no", "off", "0"):
+        raise UnsupportedRepositoryError("core.autocrlf is not supported")
+
+    attributes_files = [os.path.join(repository.common_dir, "info", "attributes")]
+    if ("core", "attributesfile") in options:
+        attributes_files.append(os.path.expanduser(options[("core", "attributesfile")]))
+    else:
+        attributes_files.append(os.path.join(_xdg_config(), "git", "attributes"))
+    attributes_files.extend(
+        os.path.join(root, name) for name in names if name == ".gitattributes" or name.endswith("/.gitattributes")
+    )
+
+    for path in attributes_files:
+        try:
+            with open(path, encoding="utf-8", errors="surrogateescape") as f:
+                lines = f.read().splitlines()
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        for line in lines:
+            fields = line.split()
+            if not fields or fields[0].startswith("#"):
+                continue
+            for attribute in fields[1:]:
+                if attribute[0] in "-!":
+                    continue
+                if attribute.partition("=")[0] in CONVERSION_ATTRIBUTES:
+                    raise UnsupportedRepositoryError(f"conversion attributes in {path} are not supported")
+
+
+def is_dirty(repository: Repository, root: str, head_tree: str) -> bool:
+    """
+    Returns whether tracked files differ from HEAD, like `git describe --dirty`
+
+    The staged state is taken from the cache tree stored in the index, the
+    working tree is compared by file size and modification time. If either
+    can't answer reliably, e.g. because files are converted on checkout,
+    `UnsupportedRepositoryError` is raised.
+    """
+    index_path = os.path.join(repository.git_dir, "index")
+    try:
+        with open(index_path, "rb") as f:
+            data = f.read()
+        index_mtime_ns = os.stat(index_path).st_mtime_ns
+    except FileNotFoundError:
+        raise UnsupportedRepositoryError("no index found")
+
+    signature, version, count = struct.unpack_from(">4sII", data, 0)
+    if signature != b"DIRC" or version not in (2, 3):
+        raise UnsupportedRepositoryError(f"unsupported index version {version}")
+
+    entries = []
+    pos = 12
+    for _ in range(count):
+        (mtime_s, mtime_ns, mode, size, flags) = (
+            struct.unpack_from(">II", data, pos + 8) +
+            struct.unpack_from(">I", data, pos + 24) +
+            struct.unpack_from(">I", data, pos + 36) +
+            struct.unpack_from(">H", data, pos + 60)
+        )
+        entry_start = pos
+        pos += 62
+        if flags & 0x4000:
+            extended = struct.unpack_from(">H", data, pos)[0]
+            if extended & 0x6000:
+                raise UnsupportedRepositoryError("skip-worktree and intent-to-add entries are not supported")
+            pos += 2
+        if flags & 0x3000:
+            # unmerged entries are always dirty
+            return True
+        name_end = data.index(b"\0", pos)
+        name = data[pos:name_end].decode("utf-8", "surrogateescape")
+        pos = entry_start + ((name_end - entry_start) // 8 + 1) * 8
+        entries.append((name, mode, size, mtime_s * 10 ** 9 + mtime_ns))
+
+    _assert_no_conversion(repository, root, [name for name, *_ in entries])
+
+    cache_tree = None
+    while pos + 8 <= len(data) - 20:
+        signature, size = struct.unpack_from(">4sI", data, pos)
+        if signature == b"TREE":
+            cache_tree = _index_cache_tree(data, pos + 8, pos + 8 + size)
+        elif signature in (b"link", b"sdir"):
+            raise UnsupportedRepositoryError("split and sparse indexes are not supported")
+        pos += 8 + size
+
+    if cache_tree is None:
+        raise UnsupportedRepositoryError("index has no valid cache tree")
+    if cache_tree != head_tree:
+        return True
+
+    for name, mode, size, mtime in entries:
+        if mode == GITLINK_MODE:
+            continue
+        try:
+            stat = os.lstat(os.path.join(root, name))
+        except FileNotFoundError:
+            return True
+        if stat.st_size != size:
+            return True
+        if stat.st_mtime_ns != mtime or mtime >= index_mtime_ns:
+            raise UnsupportedRepositoryError(f"{name} needs a content comparison")
+    return False
+
+
+def describe(git_dir, root, prefix="v", dirty=True) -> dict:
+    """
+    Returns the same information as `git describe --tags --long --dirty --match=v*`
+
+    The result has the shape of `Git.latest_tag_info`: an empty dict if no
+    tag was found. Only linear history between HEAD and the tag is supported.
+    """
+    repository = Repository(git_dir)
+    try:
+        return _describe(repository, root, prefix, dirty)
+    finally:
+        repository.close()
+
+
+def _describe(repository, root, prefix, dirty):
+    head = repository.resolve("HEAD")
+    if head is None:
+        return {}
+
+    tagged = {}
+    for name, sha in repository.tags(prefix).items():
+        commit = repository.peel(name, sha)
+        if commit is None:
+            continue
+        if commit in tagged:
+            raise UnsupportedRepositoryError(f"more than one tag points to {commit}")
+        tagged[commit] = name
+
+    info = {}
+    head_tree = None
+    commit = head
+    distance = 0
+    while True:
+        tree, parents = repository.commit_info(commit)
+        if head_tree is None:
+            head_tree = tree
+        if commit in tagged:
+            break
+        if not parents:
+            return {}
+        if len(parents) > 1:
+            raise UnsupportedRepositoryError("describing across merges is not supported")
+        commit = parents[0]
+        distance += 1
+
+    if dirty and is_dirty(repository, root, head_tree):
+        info["dirty"] = True
+
+    info["commit_sha"] = head
+    info["distance_to_latest_tag"] = distance
+    info["current_version"] = tagged[commit].lstrip("v")
+    return info
+
+
+def list_tags(git_dir, prefix="") -> list:
+    """
+    Returns the names of all tags starting with `prefix`, like `git tag --list`
+    """
+    repository = Repository(git_dir)
+    try:
+        return sorted(repository.tags(prefix))
+    finally:
+        repository.close()
+
+
+def is_clean(git_dir, root) -> bool:
+    """
+    Returns True if tracked files are known to match HEAD, False if unknown or dirty
+    """
+    repository = Repository(git_dir)
+    try:
+        head = repository.resolve("HEAD")
+        if head is None:
+            return False
+        tree, _ = repository.commit_info(head)
+        return not is_dirty(repository, root, tree)
+    finally:
+        repository.close()
+
+
+def ignore_files(git_dir, top, directory) -> list:
+    """
+    Returns the files outside of `directory` whose patterns decide what git ignores below it
+
+    These are `info/exclude`, the global excludes file and the `.gitignore`
+    files of the directories from `top` down to the parent of `directory`.
+    """
+    if os.environ.get("GIT_CONFIG_PARAMETERS") or os.environ.get("GIT_CONFIG_COUNT"):
+        raise UnsupportedRepositoryError("config given in the environment is not supported")
+    common_dir = _common_dir(git_dir)
+    options = _read_config(_config_paths(git_dir, common_dir))
+    if any(section in ("include", "includeif") for section, _ in options):
+        raise UnsupportedRepositoryError("included config files are not supported")
+
+    paths = [os.path.join(common_dir, "info", "exclude")]
+    if ("core", "excludesfile") in options:
+        paths.append(os.path.expanduser(options[("core", "excludesfile")]))
+    else:
+        paths.append(os.path.join(_xdg_config(), "git", "ignore"))
+
+    top = os.path.realpath(top)
+    directory = os.path.realpath(directory)
+    if os.path.commonpath([top, directory]) != top:
+        raise UnsupportedRepositoryError(f"{directory} is outside of {top}")
+    while directory != top:
+        directory = os.path.dirname(directory)
+        paths.append(os.path.join(directory, ".gitignore"))
+    return paths
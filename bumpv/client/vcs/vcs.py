@@ -1,168 +1,396 @@
 import os
-import subprocess
-from tempfile import NamedTemporaryFile
 
 from .exceptions import WorkingDirectoryIsDirtyException, VCSCommandError
 from ..logging import get_logger
+from ..profiling import NULL_PROFILER
 
 
 logger = get_logger()
 
 
+def _parse_status(output: bytes):
+    """
+    Returns the lines of a status command for tracked files
+    """
+    return [line.strip().decode() for line in output.splitlines() if not line.strip().startswith(b"??")]
+
+
+def _parse_describe(output: bytes):
+    """
+    Returns the latest tag info from the output of `git describe --long`
+    """
+    describe_out = output.decode().split("-")
+    info = {}
+
+    if describe_out[-1].strip() == "dirty":
+        info["dirty"] = True
+        describe_out.pop()
+
+    info["commit_sha"] = describe_out.pop().strip().lstrip("g")
+    info["distance_to_latest_tag"] = int(describe_out.pop())
+    info["current_version"] = "-".join(describe_out).lstrip("v")
+    return info
+
+
 class BaseVCS(object):
+    """
+    A session with a single repository
+
+    Repository discovery happens once in `discover`, results that don't change
+    during a bump (like the working directory status) are computed on first
+    use and reused until the session itself modifies the repository.
+    """
     _TEST_USABLE_COMMAND = []
     _COMMIT_COMMAND = []
+    _ADD_COMMAND = None
+    _TAG_COMMAND = None
+
+    def __init__(self, root=None, cwd=None, native=False):
+        self.root = root
+        self.cwd = cwd
+        self.native = native
+        self.profiler = NULL_PROFILER
+        self._status = None
+        self._latest_tag_info = None
+        self._tags = {}
+
+    def __repr__(self):
+        return f"<bumpv.{type(self).__name__}: {self.root}>"
+
+    def _run(self, command, **kwargs):
+        import subprocess
+        self.profiler.count("subprocesses")
+        try:
+            with self.profiler.span("subprocess", command=" ".join(command[:2])):
+                return subprocess.check_output(command, cwd=self.cwd, stderr=subprocess.PIPE, **kwargs)
+        except subprocess.CalledProcessError as err:
+            raise VCSCommandError((err.stderr or err.output or b"").decode(), command)
+
+    def _invalidate(self):
+        self._status = None
+        self._latest_tag_info = None
+        self._tags = {}
+
+    def refresh(self):
+        """
+        Forgets all cached results, for sessions that outlive a single bump
+        """
+        self._invalidate()
 
     @classmethod
-    def commit(cls, message: str, dry_run=False):
+    def discover(cls, cwd=None, profiler=NULL_PROFILER):
+        """
+        Returns a session for the repository containing `cwd`, or None
+        """
+        import subprocess
+        profiler.count("subprocesses")
+        try:
+            with profiler.span("subprocess", command=" ".join(cls._TEST_USABLE_COMMAND[:2])):
+                output = subprocess.check_output(
+                    cls._TEST_USABLE_COMMAND,
+                    cwd=cwd,
+                    stderr=subprocess.PIPE,
+                )
+        except subprocess.CalledProcessError:
+            return None
+        except OSError as e:
+            if e.errno == 2:
+                # mercurial is not installed then, ok.
+                return None
+            raise
+        return cls._from_discovery(output.decode().splitlines(), cwd)
+
+    @classmethod
+    def _from_discovery(cls, lines, cwd):
+        return cls(root=lines[-1] if lines else None, cwd=cwd)
+
+    @classmethod
+    def is_usable(cls):
+        return cls.discover() is not None
+
+    def commit(self, message: str, dry_run=False):
         if not dry_run:
+            from tempfile import NamedTemporaryFile
             with NamedTemporaryFile('wb', delete=False) as commit_file:
                 commit_file.write(message.encode('utf-8'))
 
-            command = cls._COMMIT_COMMAND + [commit_file.name]
+            command = self._COMMIT_COMMAND + [commit_file.name]
             try:
-                subprocess.check_output(
-                    command,
-                    stderr=subprocess.PIPE,
-                )
-            except subprocess.CalledProcessError as err:
-                raise VCSCommandError(err.output.decode(), command)
+                self._run(command)
             finally:
                 os.unlink(commit_file.name)
+                self._invalidate()
         else:
             logger.info(f"Not doing commit during dry run. Commit message would be:\n\n\t{message}")
 
-    @classmethod
-    def is_usable(cls):
-        try:
-            return subprocess.call(
-                cls._TEST_USABLE_COMMAND,
-                stderr=subprocess.PIPE,
-                stdout=subprocess.PIPE
-            ) == 0
-        except OSError as e:
-            if e.errno == 2:
-                # mercurial is not installed then, ok.
-                return False
-            raise
+    def status(self):
+        return []
 
-    @classmethod
-    def assert_nondirty(cls):
+    def assert_nondirty(self):
         pass
 
-    @classmethod
-    def latest_tag_info(cls):
-        pass
+    def latest_tag_info(self):
+        return {}
 
-    @classmethod
-    def add_path(cls, path):
+    def tags(self, prefix=""):
+        """
+        Returns the names of all tags starting with `prefix`, loaded with a single command
+        """
+        if prefix not in self._tags:
+            self._tags[prefix] = [name for name in self._list_tags(prefix) if name.startswith(prefix)]
+        return self._tags[prefix]
+
+    def _list_tags(self, prefix):
+        return []
+
+    def ignored(self, *paths):
+        """
+        Returns those of `paths` that the VCS ignores
+        """
+        return set()
+
+    def ignore_files(self, directory):
+        """
+        Returns the files outside of `directory` that decide what `ignored` reports below it
+
+        Returns None if that can't be told without asking the VCS.
+        """
+        return []
+
+    def content_ids(self, *paths):
+        """
+        Returns `{real path: content id}` of the current content of `paths`
+
+        Ids are comparable with those of `file_blobs`, an empty dict means
+        the VCS can't tell.
+        """
+        return {}
+
+    def file_blobs(self, *paths):
+        """
+        Returns `{real path: content id}` of the staged content of tracked `paths`
+        """
+        return {}
+
+    def modified_paths(self, *paths):
+        """
+        Returns the real paths of those of `paths` whose content differs from the staged one
+        """
+        return set()
+
+    def add_path(self, *paths):
         pass
 
-    @classmethod
-    def tag(cls, name):
+    def tag(self, name):
         pass
 
 
 class Git(BaseVCS):
-    _TEST_USABLE_COMMAND = ["git", "rev-parse", "--git-dir"]
+    _TEST_USABLE_COMMAND = ["git", "rev-parse", "--git-dir", "--show-toplevel"]
     _COMMIT_COMMAND = ["git", "commit", "-F"]
+    _STATUS_COMMAND = ["git", "status", "--porcelain"]
+    _DESCRIBE_COMMAND = ["git", "describe", "--dirty", "--tags", "--long", "--abbrev=40", "--match=v*"]
+    _ADD_COMMAND = ["git", "add", "--update"]
+    _TAG_COMMAND = ["git", "tag"]
+
+    def __init__(self, root=None, cwd=None, native=False, git_dir=None):
+        super().__init__(root, cwd, native)
+        self.git_dir = git_dir
 
     @classmethod
-    def assert_nondirty(cls):
-        lines = [
-            line.strip().decode() for line in
-            subprocess.check_output(["git", "status", "--porcelain"]).splitlines()
-            if not line.strip().startswith(b"??")
-        ]
+    def _from_discovery(cls, lines, cwd):
+        git_dir = os.path.join(cwd or "", lines[0])
+        root = lines[1] if len(lines) > 1 else None
+        return cls(root=root, cwd=cwd, git_dir=os.path.abspath(git_dir))
+
+    def status(self):
+        """
+        Returns the lines of `git status --porcelain` for tracked files
+        """
+        if self._status is None:
+            self._status = _parse_status(self._run(self._STATUS_COMMAND))
+        return self._status
+
+    def assert_nondirty(self):
+        if self.native and self._status is None:
+            from . import native
+            try:
+                if native.is_clean(self.git_dir, self.root):
+                    return
+            except native.NATIVE_ERRORS as err:
+                logger.debug(f"Native git status check not possible: {err}")
+
+        lines = self.status()
 
         if lines:
             raise WorkingDirectoryIsDirtyException("Git working directory is not clean:\n{}".format("\n".join(lines)))
 
-    @classmethod
-    def latest_tag_info(cls):
+    def latest_tag_info(self):
+        if self._latest_tag_info is not None:
+            return self._latest_tag_info
+
+        if self.native:
+            from . import native
+            try:
+                self._latest_tag_info = native.describe(self.git_dir, self.root)
+                return self._latest_tag_info
+            except native.NATIVE_ERRORS as err:
+                logger.debug(f"Native git describe not possible, running git: {err}")
+
         try:
             # git-describe doesn't update the git-index, so we do that
-            subprocess.check_output(["git", "update-index", "--refresh"])
+            self._run(["git", "update-index", "--refresh"])
+        except VCSCommandError:
+            # files that need an update leave the working directory dirty
+            pass
 
+        try:
             # get info about the latest tag in git
-            describe_out = subprocess.check_output([
-                "git",
-                "describe",
-                "--dirty",
-                "--tags",
-                "--long",
-                "--abbrev=40",
-                "--match=v*",
-            ], stderr=subprocess.STDOUT
-            ).decode().split("-")
-        except subprocess.CalledProcessError as err:
-            logger.warn(f"Error when running git describe: {err.output}")
+            describe_out = self._run(self._DESCRIBE_COMMAND)
+        except VCSCommandError as err:
+            logger.warn(f"Error when running git describe: {err.message}")
             return {}
 
-        info = {}
+        self._latest_tag_info = _parse_describe(describe_out)
+        return self._latest_tag_info
 
-        if describe_out[-1].strip() == "dirty":
-            info["dirty"] = True
-            describe_out.pop()
-
-        info["commit_sha"] = describe_out.pop().lstrip("g")
-        info["distance_to_latest_tag"] = int(describe_out.pop())
-        info["current_version"] = "-".join(describe_out).lstrip("v")
-
-        return info
+    def _list_tags(self, prefix):
+        if self.native:
+            from . import native
+            try:
+                return native.list_tags(self.git_dir, prefix)
+            except native.NATIVE_ERRORS as err:
+                logger.debug(f"Native git tag listing not possible, running git: {err}")
+
+        return self._run(["git", "tag", "--list", prefix + "*"]).decode().splitlines()
+
+    def ignored(self, *paths):
+        if not paths:
+            return set()
+
+        import subprocess
+        command = ["git", "check-ignore", "--stdin", "-z"]
+        self.profiler.count("subprocesses")
+        with self.profiler.span("subprocess", command=" ".join(command[:2])):
+            result = subprocess.run(
+                command, cwd=self.cwd, input="\0".join(paths).encode(), stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+        # exits with 1 if no path is ignored
+        if result.returncode not in (0, 1):
+            raise VCSCommandError(result.stderr.decode(), command)
+        return {path for path in result.stdout.decode().split("\0") if path}
+
+    def ignore_files(self, directory):
+        if self.root is None:
+            return None
+        from . import native
+        try:
+            return native.ignore_files(self.git_dir, self.root, directory)
+        except native.NATIVE_ERRORS as err:
+            logger.debug(f"Can't tell which files decide what git ignores: {err}")
+            return None
 
-    @classmethod
-    def add_path(cls, *paths):
-        command = ["git", "add", "--update"]
-        command.extend(paths)
-        subprocess.check_output(command)
+    def content_ids(self, *paths):
+        if not paths:
+            return {}
+        base = self.cwd or os.getcwd()
+        output = self._run(["git", "hash-object", "--"] + list(paths))
+        return {os.path.realpath(os.path.join(base, path)): blob for path, blob in zip(paths, output.decode().split())}
 
-    @classmethod
-    def tag(cls, name):
-        subprocess.check_output(["git", "tag", name])
+    def file_blobs(self, *paths):
+        if not paths:
+            return {}
+        # paths are printed relative to the working directory of git
+        base = self.cwd or os.getcwd()
+        blobs = {}
+        for entry in self._run(["git", "ls-files", "--stage", "-z", "--"] + list(paths)).split(b"\0"):
+            if not entry:
+                continue
+            info, path = entry.decode().split("\t", 1)
+            _, blob, stage = info.split()
+            if stage == "0":
+                blobs[os.path.realpath(os.path.join(base, path))] = blob
+        return blobs
+
+    def modified_paths(self, *paths):
+        if not paths:
+            return set()
+        # paths are printed relative to the top of the repository
+        output = self._run(["git", "diff", "--name-only", "-z", "--"] + list(paths))
+        return {os.path.realpath(os.path.join(self.root, path)) for path in output.decode().split("\0") if path}
+
+    def add_path(self, *paths):
+        if not paths:
+            return
+        self._run(self._ADD_COMMAND + list(paths))
+        self._invalidate()
+
+    def tag(self, name):
+        self._run(self._TAG_COMMAND + [name])
+        self._invalidate()
 
 
 class Mercurial(BaseVCS):
     _TEST_USABLE_COMMAND = ["hg", "root"]
     _COMMIT_COMMAND = ["hg", "commit", "--logfile"]
+    _STATUS_COMMAND = ["hg", "status", "-mard"]
+    _TAG_COMMAND = ["hg", "tag"]
 
-    @classmethod
-    def assert_nondirty(cls):
-        lines = [
-            line.strip() for line in
-            subprocess.check_output(
-                ["hg", "status", "-mard"]).splitlines()
-            if not line.strip().startswith(b"??")
-        ]
+    def status(self):
+        if self._status is None:
+            self._status = _parse_status(self._run(self._STATUS_COMMAND))
+        return self._status
+
+    def assert_nondirty(self):
+        lines = self.status()
 
         if lines:
             raise WorkingDirectoryIsDirtyException(
                 "Mercurial working directory is not clean:\n{}".format(
-                    b"\n".join(lines)))
+                    "\n".join(lines)))
 
-    @classmethod
-    def latest_tag_info(cls):
+    def latest_tag_info(self):
         return {}
 
-    @classmethod
-    def add_path(cls, path):
+    def _list_tags(self, prefix):
+        return [name for name in self._run(["hg", "tags", "--quiet"]).decode().splitlines() if name != "tip"]
+
+    def add_path(self, *paths):
         pass
 
-    @classmethod
-    def tag(cls, name):
-        subprocess.check_output(["hg", "tag", name])
+    def tag(self, name):
+        self._run(self._TAG_COMMAND + [name])
+        self._invalidate()
 
 
 VCS = [Git, Mercurial]
 
 
-def get_vcs(allow_dirty: bool = False) -> [Git, Mercurial]:
+def get_vcs(allow_dirty: bool = False, cwd=None, native: bool = False, profiler=NULL_PROFILER) -> BaseVCS:
+    """
+    Returns a session for the first usable VCS, `native` enables reading git
+    metadata directly instead of running git where possible
+
+    The working directory is checked unless `allow_dirty`, which would
+    ignore the result anyway.
+    """
     for vcs in VCS:
-        if vcs.is_usable():
-            try:
-                vcs.assert_nondirty()
-            except WorkingDirectoryIsDirtyException as e:
-                if not allow_dirty:
-                    logger.warn(f"{e.message}\n\nUse --allow-dirty to override this if you know what you're doing.")
-                    raise
-            return vcs
+        session = vcs.discover(cwd, profiler)
+        if session is not None:
+            session.native = native
+            session.profiler = profiler
+            if not allow_dirty:
+                check_dirty(session)
+            return session
+
+
+def check_dirty(session: BaseVCS, allow_dirty: bool = False):
+    """
+    Raises `WorkingDirectoryIsDirtyException` if the working directory of `session` isn't clean
+    """
+    try:
+        session.assert_nondirty()
+    except WorkingDirectoryIsDirtyException as e:
+        if not allow_dirty:
+            logger.warn(f"{e.message}\n\nUse --allow-dirty to override this if you know what you're doing.")
+            raise
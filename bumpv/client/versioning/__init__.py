@@ -1 +1,6 @@
-from .version import Version
+from .formats import SerializeFormat, compile_parse, compile_serialize
+from .history import TagHistory
+from .parts import PartTable
+from .plan import PlanEntry, plan, plan_json_lines
+from .version import Version, sort_key
+from .versionset import VersionSet, parse_many
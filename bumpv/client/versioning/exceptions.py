@@ -1,6 +1,16 @@
 class UnknownVersionPartError(Exception):
-    def __init__(self, part_name):
-        self.message = f"part name must be one of: ['major', 'minor', 'patch'] got: {part_name}"
+    def __init__(self, part_name, part_names=("major", "minor", "patch")):
+        super().__init__(part_name, part_names)
+        self.message = f"part name must be one of: {list(part_names)} got: {part_name}"
+
+    def __str__(self):
+        return self.message
+
+
+class InvalidPartValueError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message
 
 
 class VersionStringParseError(Exception):
@@ -0,0 +1,61 @@
+import re
+from functools import lru_cache
+
+
+CACHE_SIZE = 256
+
+TEMPLATE_VARIABLE_PATTERN = re.compile(r"{(\w+)}")
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_parse(parse: str):
+    return re.compile(parse, re.VERBOSE)
+
+
+class SerializeFormat:
+    """
+    A `serialize` template with the names of the parts it uses extracted once
+    """
+    __slots__ = ("template", "fields")
+
+    def __init__(self, template: str):
+        self.template = template
+        self.fields = tuple(TEMPLATE_VARIABLE_PATTERN.findall(template))
+
+    def __repr__(self):
+        return f"<bumpv.SerializeFormat: {self.template}>"
+
+    def __eq__(self, other):
+        if not isinstance(other, SerializeFormat):
+            return NotImplemented
+        return self.template == other.template
+
+    def __hash__(self):
+        return hash(self.template)
+
+    def format(self, values: dict) -> str:
+        return self.template.format(**values)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_serialize(template: str) -> SerializeFormat:
+    return SerializeFormat(template)
+
+
+@lru_cache(maxsize=CACHE_SIZE)
+def compile_serialize_formats(templates: tuple) -> tuple:
+    return tuple(
+        template if isinstance(template, SerializeFormat) else compile_serialize(template)
+        for template in templates
+    )
+
+
+def as_serialize_formats(templates) -> tuple:
+    """
+    Returns the compiled formats for a single template or a sequence of templates
+    """
+    if isinstance(templates, (str, SerializeFormat)):
+        templates = (templates,)
+    elif not isinstance(templates, tuple):
+        templates = tuple(templates)
+    return compile_serialize_formats(templates)
@@ -0,0 +1,200 @@
+from bisect import bisect_left, bisect_right
+
+from .exceptions import InvalidPartValueError
+from .version import Version
+from .versionset import VersionSet
+
+
+LINE_PARTS = ("major", "minor")
+
+
+def _tag_affixes(tag_name: str):
+    """
+    Returns the text before and after `{new_version}` in a `tag_name` template
+    """
+    prefix, marker, suffix = tag_name.partition("{new_version}")
+    if not marker:
+        raise ValueError(f"tag_name '{tag_name}' doesn't contain {{new_version}}")
+    return prefix, suffix
+
+
+def _strip_tag(tag: str, prefix: str, suffix: str):
+    if not tag.startswith(prefix) or not tag.endswith(suffix) or len(tag) < len(prefix) + len(suffix):
+        return None
+    return tag[len(prefix):len(tag) - len(suffix)]
+
+
+def _line_key(version: Version, part: str) -> tuple:
+    return (version.major,) if part == "major" else (version.major, version.minor)
+
+
+class TagHistory:
+    """
+    The tags of a repository that parse as versions, sorted by version
+
+    Tags are matched against the `tag_name` template, the remaining version
+    strings are parsed in bulk with the configured `parse` pattern. All
+    queries bisect the sorted version keys, so they take logarithmic time
+    in the number of tags (plus the size of the result).
+    """
+    def __init__(self, versions, tags):
+        self.versions = versions
+        self.tags = tags
+        self.keys = [version.key for version in versions]
+        self.invalid = []
+        self._tag_set = None
+
+    @classmethod
+    def from_tags(cls, tags, parse: str, tag_name: str = "v{new_version}", part_table=None, serialize_formats=None):
+        prefix, suffix = _tag_affixes(tag_name)
+        by_string = {}
+        invalid = []
+        for tag in tags:
+            string = _strip_tag(tag, prefix, suffix)
+            if string is None:
+                invalid.append(tag)
+            else:
+                by_string.setdefault(string, tag)
+
+        version_set = VersionSet.from_strings(by_string, parse, strict=False)
+        order = version_set.argsort(part_table=part_table)
+        versions = []
+        names = []
+        for index in order:
+            versions.append(version_set.version(
+                index, serialize_formats=serialize_formats, tag_name=tag_name, part_table=part_table,
+            ))
+            names.append(by_string[version_set.strings[index]])
+
+        history = cls(versions, names)
+        history.invalid = invalid + [by_string[string] for string in version_set.invalid]
+        return history
+
+    def __repr__(self):
+        return f"<bumpv.TagHistory: {len(self)} tags>"
+
+    def __len__(self):
+        return len(self.versions)
+
+    def __iter__(self):
+        return iter(zip(self.tags, self.versions))
+
+    def __contains__(self, version):
+        return self.tag_of(version) is not None
+
+    def _slice(self, start, stop):
+        return list(zip(self.tags[start:stop], self.versions[start:stop]))
+
+    def tag_of(self, version: Version):
+        """
+        Returns the tag of `version`, or None if it wasn't tagged
+        """
+        index = bisect_left(self.keys, version.key)
+        if index < len(self.keys) and self.keys[index] == version.key:
+            return self.tags[index]
+        return None
+
+    def latest(self):
+        """
+        Returns `(tag, version)` of the highest version, or None
+        """
+        if not self.versions:
+            return None
+        return self.tags[-1], self.versions[-1]
+
+    def _bounds(self, low, high, inclusive=True):
+        if low is None:
+            start = 0
+        elif inclusive:
+            start = bisect_left(self.keys, low.key)
+        else:
+            start = bisect_right(self.keys, low.key)
+        if high is None:
+            stop = len(self.keys)
+        elif inclusive:
+            stop = bisect_right(self.keys, high.key)
+        else:
+            stop = bisect_left(self.keys, high.key)
+        return start, max(start, stop)
+
+    def between(self, low: Version = None, high: Version = None, inclusive=True):
+        """
+        Returns `(tag, version)` for every version from `low` to `high`, in order
+
+        Either bound may be None for an open range.
+        """
+        return self._slice(*self._bounds(low, high, inclusive))
+
+    def after(self, version: Version):
+        """
+        Returns `(tag, version)` of the first version above `version`, or None
+        """
+        index = bisect_right(self.keys, version.key)
+        if index == len(self.keys):
+            return None
+        return self.tags[index], self.versions[index]
+
+    def before(self, version: Version):
+        """
+        Returns `(tag, version)` of the last version below `version`, or None
+        """
+        index = bisect_left(self.keys, version.key)
+        if index == 0:
+            return None
+        return self.tags[index - 1], self.versions[index - 1]
+
+    def latest_in_line(self, major: int, minor: int = None):
+        """
+        Returns `(tag, version)` of the highest version of a major or minor line, or None
+        """
+        line = (major,) if minor is None else (major, minor)
+        upper = line[:-1] + (line[-1] + 1,)
+        index = bisect_left(self.keys, upper) - 1
+        if index < 0 or self.keys[index][:len(line)] != line:
+            return None
+        return self.tags[index], self.versions[index]
+
+    def latest_per_line(self, part: str = "minor", low: Version = None, high: Version = None):
+        """
+        Returns `(tag, version)` of the highest version of every major or minor line
+
+        Only versions from `low` to `high` are considered. Walks down from
+        the highest version, jumping to the previous line with a bisection,
+        so it takes logarithmic time per line.
+        """
+        if part not in LINE_PARTS:
+            raise ValueError(f"lines are made of {' or '.join(LINE_PARTS)}, not {part}")
+        start, stop = self._bounds(low, high)
+        latest = []
+        index = stop - 1
+        while index >= start:
+            latest.append((self.tags[index], self.versions[index]))
+            index = bisect_left(self.keys, _line_key(self.versions[index], part), start, index) - 1
+        latest.reverse()
+        return latest
+
+    def next_version(self, part: str, version: Version = None):
+        """
+        Returns the version a bump of `part` would create from `version`
+
+        Without `version`, the latest tagged version is bumped. The bumped
+        version is bumped again while it or its tag already exists, so the
+        result is never an existing tag. If a bump doesn't change the tag,
+        e.g. of a part the serialization leaves out, `InvalidPartValueError`
+        is raised.
+        """
+        if version is None:
+            latest = self.latest()
+            if latest is None:
+                return None
+            version = latest[1]
+        if self._tag_set is None:
+            self._tag_set = set(self.tags)
+        tag = version.get_tag()
+        version = version.bump(part)
+        while version in self or version.get_tag() in self._tag_set:
+            if version.get_tag() == tag:
+                raise InvalidPartValueError(f"bumping '{part}' doesn't change the tag '{tag}'")
+            tag = version.get_tag()
+            version = version.bump(part)
+        return version
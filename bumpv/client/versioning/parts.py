@@ -0,0 +1,215 @@
+"""
+Compiles the definitions of version parts into a table of bump functions
+
+A part is defined by the options of its `[bumpv:part:<name>]` section:
+
+- `values`: the sequence of values the part steps through, otherwise the
+  part is a number counting up from 0
+- `optional_value`: the value that is left out of the version, a missing
+  part has this value (default: the first of `values`)
+- `first_value`: the value the part is reset to (default: the first of
+  `values`, or 0)
+- `resets`: the parts that are reset to their first value when this part
+  is bumped, along with the parts those reset
+- `date`: a `strftime` format, bumping sets the part to the current date
+
+`major`, `minor` and `patch` are always defined, `release` only when it is
+a group of the `parse` pattern or has a section. A section of the same name
+overrides their options. `major`, `minor` and `patch` reset `release`, so a
+final version can start a new pre-release. Other groups of the `parse`
+pattern are numbers unless they have a section.
+"""
+import time
+from functools import lru_cache
+
+from .exceptions import InvalidPartValueError, UnknownVersionPartError
+
+
+BUILTIN_PARTS = {
+    "major": {"resets": "minor patch"},
+    "minor": {"resets": "patch"},
+    "patch": {},
+}
+RELEASE_PART = {"values": "alpha beta rc final", "optional_value": "final", "first_value": "alpha"}
+
+
+def _first_value(name, options):
+    """
+    Returns a function that returns the value `name` is reset to
+    """
+    if "date" in options:
+        date_format = options["date"]
+        return lambda: time.strftime(date_format)
+    if "values" in options:
+        values = options["values"].split()
+        first = options.get("first_value", values[0])
+        if first == options.get("optional_value", values[0]):
+            first = None
+    else:
+        first = options.get("first_value", "0")
+    return lambda: first
+
+
+def _step(name, options):
+    """
+    Returns a function that returns the value following a value of `name`
+    """
+    if "date" in options:
+        date_format = options["date"]
+        return lambda value: time.strftime(date_format)
+
+    if "values" in options:
+        values = options["values"].split()
+        following = dict(zip(values, values[1:]))
+        optional = options.get("optional_value", values[0])
+
+        def step(value):
+            if value is None:
+                value = optional
+            try:
+                value = following[value]
+            except KeyError:
+                if value == values[-1]:
+                    raise InvalidPartValueError(f"'{name}' is already at its last value '{value}'")
+                raise InvalidPartValueError(f"'{value}' is not one of the values of '{name}': {values}")
+            return None if value == optional else value
+        return step
+
+    first = options.get("first_value", "0")
+
+    def step(value):
+        try:
+            return int(first if value is None else value) + 1
+        except ValueError:
+            raise InvalidPartValueError(f"'{value}' is not a number, can't bump '{name}'")
+    return step
+
+
+def _order(options):
+    """
+    Returns `{value: rank}` of the `values` of a part, a missing value ranks as the optional value
+    """
+    values = options["values"].split()
+    order = {value: rank for rank, value in enumerate(values)}
+    order[None] = order.get(options.get("optional_value", values[0]), len(values))
+    return order
+
+
+# positions of the parts `Version` keeps in slots of their own
+_BUILTIN_INDEX = {"major": 0, "minor": 1, "patch": 2, "release": 3}
+
+
+def _resets(name, definitions):
+    """
+    Returns the names of the parts reset by bumping `name`, including the parts those reset
+    """
+    resets = {}
+    stack = definitions[name].get("resets", "").split()[::-1]
+    while stack:
+        reset = stack.pop()
+        if reset not in definitions:
+            raise UnknownVersionPartError(reset, tuple(definitions))
+        if reset != name and reset not in resets:
+            resets[reset] = None
+            stack.extend(definitions[reset].get("resets", "").split()[::-1])
+    return list(resets)
+
+
+def _compile(name, options, definitions):
+    step = _step(name, options)
+    resets = [(reset, _first_value(reset, definitions[reset])) for reset in _resets(name, definitions)]
+
+    if name in _BUILTIN_INDEX and all(reset in _BUILTIN_INDEX for reset, _ in resets):
+        # the common case doesn't need a dict of all values
+        index = _BUILTIN_INDEX[name]
+        reset_indexes = [(_BUILTIN_INDEX[reset], first) for reset, first in resets]
+
+        def bump_builtin(version):
+            values = [version._major, version._minor, version._patch, version._release]
+            values[index] = step(values[index])
+            for reset_index, first in reset_indexes:
+                values[reset_index] = first()
+            return version._evolve_builtin(values)
+        return bump_builtin
+
+    def bump(version):
+        values = version._values()
+        values[name] = step(values.get(name))
+        for reset, first in resets:
+            values[reset] = first()
+        return version._evolve(values)
+    return bump
+
+
+class PartTable:
+    """
+    The bump function of every part, compiled once from their definitions
+
+    `functions` maps each part name to a function that takes a `Version`
+    and returns it bumped, so a bump is a single dict lookup. `orders` maps
+    each part with `values` to the rank of each value, which versions sort
+    by. Tables are shared between all configs with the same part sections,
+    see `PartTable.from_options`.
+    """
+    __slots__ = ("definitions", "names", "functions", "orders")
+
+    def __init__(self, definitions):
+        self.definitions = definitions
+        self.names = tuple(definitions)
+        self.functions = {name: _compile(name, options, definitions) for name, options in definitions.items()}
+        self.orders = {name: _order(options) for name, options in definitions.items() if "values" in options}
+
+    def __repr__(self):
+        return f"<bumpv.PartTable: {', '.join(self.names)}>"
+
+    def __reduce__(self):
+        return (_from_frozen, (_freeze(self.definitions),))
+
+    def __contains__(self, name):
+        return name in self.functions
+
+    def __iter__(self):
+        return iter(self.names)
+
+    @classmethod
+    def from_options(cls, part_options, names=()):
+        """
+        Returns the table of the built-in parts with the `{name: {option: value}}` of part sections
+
+        Parts in `names` without a section of their own are plain numbers,
+        except for `release`.
+        """
+        definitions = {name: dict(options) for name, options in BUILTIN_PARTS.items()}
+        if "release" in names or "release" in part_options:
+            definitions["release"] = dict(RELEASE_PART)
+            for name in ("major", "minor", "patch"):
+                definitions[name]["resets"] = " ".join(definitions[name].get("resets", "").split() + ["release"])
+        for name in names:
+            definitions.setdefault(name, {})
+        for name, options in part_options.items():
+            definition = definitions.setdefault(name, {})
+            if "values" in options:
+                # the defaults of a built-in part only fit its own values
+                definition.pop("optional_value", None)
+                definition.pop("first_value", None)
+            definition.update(options)
+        return _from_frozen(_freeze(definitions))
+
+    def bump(self, version, part):
+        try:
+            function = self.functions[part]
+        except KeyError:
+            raise UnknownVersionPartError(part, self.names) from None
+        return function(version)
+
+
+def _freeze(definitions):
+    return tuple((name, tuple(sorted(options.items()))) for name, options in definitions.items())
+
+
+@lru_cache(maxsize=64)
+def _from_frozen(frozen):
+    return PartTable({name: dict(options) for name, options in frozen})
+
+
+DEFAULT_PART_TABLE = PartTable.from_options({})
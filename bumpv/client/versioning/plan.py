@@ -0,0 +1,146 @@
+"""
+Computes the next versions and tags of many packages, possibly in a process pool
+
+Packages are read lazily in chunks and each chunk is planned in a worker
+process, with at most a few chunks in flight, so the results can be
+streamed in input order without holding all of them in memory.
+"""
+import os
+from collections import deque, namedtuple
+from itertools import islice
+
+from .exceptions import (
+    IncompleteVersionRepresentationException, InvalidPartValueError, MissingValueForSerializationException,
+    UnknownVersionPartError, VersionStringParseError,
+)
+from .parts import DEFAULT_PART_TABLE
+from .version import Version, _parse
+
+
+DEFAULT_PARTS = ("major", "minor", "patch")
+DEFAULT_PARSE = r"(?P<major>\d+)\.(?P<minor>\d+)\.(?P<patch>\d+)"
+CHUNK_SIZE = 2000
+
+PlanEntry = namedtuple("PlanEntry", ["package", "part", "current", "new", "tag", "error"], defaults=(None,))
+
+# errors of a single package or part, they are planned as entries with an `error`
+PLAN_ERRORS = (
+    VersionStringParseError, InvalidPartValueError, UnknownVersionPartError,
+    MissingValueForSerializationException, IncompleteVersionRepresentationException,
+)
+
+
+def _message(err):
+    return getattr(err, "message", None) or str(err)
+
+
+def _encode(entry):
+    fields = entry._asdict()
+    if entry.error is None:
+        del fields["error"]
+    return fields
+
+
+def _plan_chunk(chunk, parts, parse, version_kwargs, encode):
+    """
+    Returns the entries of every part for every `(package, version)` of `chunk`
+
+    Versions may be given as strings, those are parsed with `parse`. A
+    version or part that can't be planned gives entries with an `error`
+    instead of the new version. With `encode` the entries are returned as
+    JSON lines instead.
+    """
+    if encode:
+        import json
+
+    planned = []
+    for package, version in chunk:
+        try:
+            if isinstance(version, str):
+                if parse is None:
+                    raise VersionStringParseError(f"no parse pattern for version string '{version}'")
+                version = Version(**_parse(version, parse), **version_kwargs)
+            current = version.serialize(version.serialize_formats)
+        except PLAN_ERRORS as err:
+            entries = [PlanEntry(package, part, str(version), None, None, _message(err)) for part in parts]
+        else:
+            entries = []
+            for part in parts:
+                try:
+                    new = version.bump(part)
+                    new_version = new.serialize(new.serialize_formats)
+                    entries.append(PlanEntry(package, part, current, new_version, new.get_tag()))
+                except PLAN_ERRORS as err:
+                    entries.append(PlanEntry(package, part, current, None, None, _message(err)))
+        if encode:
+            entries = [json.dumps(_encode(entry)) for entry in entries]
+        planned.extend(entries)
+    return planned
+
+
+def _check_parts(parts, parse, version_kwargs):
+    """
+    Raises `UnknownVersionPartError` for parts the versions parsed with `parse` don't define
+    """
+    if parse is None:
+        # every version brings its own table
+        return
+    part_table = version_kwargs.get("part_table") or DEFAULT_PART_TABLE
+    for part in parts:
+        if part not in part_table:
+            raise UnknownVersionPartError(part, part_table.names)
+
+
+def _plan(packages, parts, workers, chunk_size, parse, version_kwargs, encode):
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    packages = iter(packages)
+    chunks = iter(lambda: list(islice(packages, chunk_size)), [])
+    if workers <= 1:
+        for chunk in chunks:
+            yield from _plan_chunk(chunk, parts, parse, version_kwargs, encode)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for chunk in chunks:
+            pending.append(executor.submit(_plan_chunk, chunk, parts, parse, version_kwargs, encode))
+            if len(pending) >= 2 * workers:
+                yield from pending.popleft().result()
+        while pending:
+            yield from pending.popleft().result()
+
+
+def plan(packages, parts=DEFAULT_PARTS, workers=None, chunk_size=CHUNK_SIZE, parse=DEFAULT_PARSE, **version_kwargs):
+    """
+    Lazily yields a `PlanEntry` for every part of every `(package, version)`
+
+    `version` is a `Version` or a string parsed with `parse`, additional
+    keyword arguments like `serialize_formats` and `tag_name` are passed on
+    to every parsed `Version`. Entries are yielded in input order. `workers`
+    defaults to the number of CPUs, with a single worker nothing is sent to
+    other processes.
+
+    Parts missing from the `part_table` of parsed versions raise
+    `UnknownVersionPartError` right away. With `parse=None` only `Version`
+    objects are planned, each with its own table. A version that can't be
+    parsed or a part that can't be bumped gives an entry with an `error`
+    message, and planning goes on.
+    """
+    parts = tuple(parts)
+    _check_parts(parts, parse, version_kwargs)
+    return _plan(packages, parts, workers, chunk_size, parse, version_kwargs, False)
+
+
+def plan_json_lines(packages, parts=DEFAULT_PARTS, workers=None, chunk_size=CHUNK_SIZE, parse=DEFAULT_PARSE,
+                    **version_kwargs):
+    """
+    Like `plan`, but yields each entry as a line of JSON, encoded in the workers
+
+    The `error` key is only present in the lines of entries that have one.
+    """
+    parts = tuple(parts)
+    _check_parts(parts, parse, version_kwargs)
+    return _plan(packages, parts, workers, chunk_size, parse, version_kwargs, True)
@@ -1,13 +1,20 @@
 import re
+from functools import lru_cache
+from operator import attrgetter
 
 from .exceptions import (
     UnknownVersionPartError,
     VersionStringParseError,
 )
+from .formats import (
+    as_serialize_formats,
+    compile_parse,
+)
+from .parts import DEFAULT_PART_TABLE
 
 
 def _parse(version_string: str, parse: str) -> dict:
-    parse_regex = re.compile(parse, re.VERBOSE)
+    parse_regex = compile_parse(parse)
     match = parse_regex.search(version_string)
     if not match:
         raise VersionStringParseError(f"unable to parse version string '{version_string}' with pattern '{parse}'")
@@ -15,27 +22,154 @@ def _parse(version_string: str, parse: str) -> dict:
 
 
 REPR_SERIALIZE_TEMPLATE = "major={major} minor={minor} patch={patch} release={release}"
-TEMPLATE_VARIABLE_PATTERN = re.compile(r"{(\w+)}")
+DEFAULT_SERIALIZE_FORMATS = ("{major}.{minor}.{patch}",)
+PART_NAMES = ("major", "minor", "patch", "release")
+
+
+_PIECES = re.compile(r"\d+|\D+").findall
+
+
+@lru_cache(maxsize=1024)
+def _natural_key(value: str) -> tuple:
+    # runs of digits compare as numbers, so rc10 sorts after rc9 and 10 after 9
+    return tuple((0, int(piece), "") if piece.isdigit() else (1, 0, piece) for piece in _PIECES(value))
+
+
+def _make_key(major: int, minor: int, patch: int, release: str, order: dict = None) -> tuple:
+    # `order` ranks the `values` of a defined release part, otherwise a version
+    # without release sorts after all of its pre-releases
+    if order is not None and release in order:
+        return (major, minor, patch, 0, order[release], ())
+    return (major, minor, patch, 1, release is None, _natural_key(release) if release else ())
+
+
+def _extra_key(value, order: dict = None) -> tuple:
+    # a missing value sorts first, then values in the order of `values`, then numbers and other text
+    if order is not None and value in order:
+        return (1, order[value], ())
+    if value is None:
+        return (0, 0, ())
+    return (2, 0, _natural_key(value))
+
+
+def _restore(major, minor, patch, release, original, templates, tag_name, part_table, parts):
+    return Version(
+        major, minor, patch, release, original, templates, tag_name, part_table=part_table, **dict(parts)
+    )
+
+
+# key function to sort versions, e.g. `sorted(versions, key=sort_key)`
+sort_key = attrgetter("_key")
 
 
 class Version:
+    """
+    An immutable version value
+
+    Versions compare, sort and hash by their parts only, a version without a
+    `release` sorts after the same version with any `release`. Values of a
+    part with `values` sort in that order, others compare runs of digits as
+    numbers. For sorting large lists, `sort_key` returns the precomputed
+    comparison key.
+
+    Values of parts besides `major`, `minor`, `patch` and `release`, e.g.
+    from additional groups of a `parse` pattern, are passed as keyword
+    arguments and kept as strings. `part_table` defines how each part is
+    bumped and ordered.
+    """
+    __slots__ = (
+        "_major",
+        "_minor",
+        "_patch",
+        "_release",
+        "_parts",
+        "_key",
+        "_serialized",
+        "tag_name",
+        "_original",
+        "serialize_formats",
+        "part_table",
+    )
+
     UnknownVersionPartError = UnknownVersionPartError
     VersionStringParseError = VersionStringParseError
 
-    def __init__(self, major: int, minor: int, patch: int,
-                 release: str = None, original=None, serialize_formats=None, tag_name="v{new_version}"):
-        self._major = int(major)
-        self._minor = int(minor)
-        self._patch = int(patch)
-        self._release = release
-        self.tag_name = tag_name
-        if original is None:
-            self.original = self
-        else:
-            self.original = original
+    sort_key = staticmethod(sort_key)
 
+    def __init__(self, major: int, minor: int, patch: int,
+                 release: str = None, original=None, serialize_formats=None, tag_name="v{new_version}",
+                 part_table=None, **parts):
         if serialize_formats is None:
-            self.serialize_formats = ["{major}.{minor}.{patch}"]
+            serialize_formats = DEFAULT_SERIALIZE_FORMATS
+        if part_table is None:
+            part_table = DEFAULT_PART_TABLE
+
+        init = object.__setattr__
+        init(self, "_major", int(major))
+        init(self, "_minor", int(minor))
+        init(self, "_patch", int(patch))
+        init(self, "_release", release)
+        orders = part_table.orders
+        key = _make_key(self._major, self._minor, self._patch, release, orders.get("release"))
+        if parts:
+            parts = tuple(sorted((name, None if value is None else str(value)) for name, value in parts.items()))
+            key += tuple(_extra_key(value, orders.get(name)) for name, value in parts)
+        init(self, "_parts", tuple(parts))
+        init(self, "_key", key)
+        # created by the first `serialize`, most bumped versions are serialized once or never
+        init(self, "_serialized", None)
+        init(self, "tag_name", tag_name)
+        # None stands for the version itself, which would be a reference cycle
+        init(self, "_original", original)
+        init(self, "serialize_formats", as_serialize_formats(serialize_formats))
+        init(self, "part_table", part_table)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable, can't set '{name}'")
+
+    def __delattr__(self, name):
+        raise AttributeError(f"{type(self).__name__} is immutable, can't delete '{name}'")
+
+    def __reduce__(self):
+        original = self._original
+        templates = tuple(serialize_format.template for serialize_format in self.serialize_formats)
+        return (_restore, (
+            self._major, self._minor, self._patch, self._release, original, templates, self.tag_name,
+            self.part_table, self._parts,
+        ))
+
+    def __eq__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key == other._key
+
+    def __ne__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key != other._key
+
+    def __lt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key < other._key
+
+    def __le__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key <= other._key
+
+    def __gt__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key > other._key
+
+    def __ge__(self, other):
+        if not isinstance(other, Version):
+            return NotImplemented
+        return self._key >= other._key
+
+    def __hash__(self):
+        return hash(self._key)
 
     @classmethod
     def from_config(cls, config):
@@ -45,36 +179,60 @@ class Version:
         tag_name = config.tag_name
 
         match = _parse(version_string, parse)
-        return Version(serialize_formats=serialize_formats, tag_name=tag_name, **match)
+        return Version(serialize_formats=serialize_formats, tag_name=tag_name, part_table=config.part_table(), **match)
 
     @classmethod
     def from_version_string(cls, version_string, parse):
         match = _parse(version_string, parse)
         return Version(**match)
 
+    @classmethod
+    def parse_many(cls, version_strings, parse, strict=True, **kwargs):
+        """
+        Lazily parses many version strings with `parse` compiled only once
+
+        With `strict=False` strings that can't be parsed are skipped instead of
+        raising `VersionStringParseError`. See also `VersionSet.from_strings`.
+        """
+        from .versionset import parse_many
+        return parse_many(version_strings, parse, strict, **kwargs)
+
     def __getitem__(self, key):
-        try:
-            return getattr(self, key)
-        except AttributeError as err:
-            raise KeyError(err)
+        values = self._values()
+        if key not in values:
+            raise KeyError(key)
+        return values[key]
 
     def __iter__(self):
-        return iter({
+        return iter(PART_NAMES + tuple(name for name, _ in self._parts))
+
+    def _values(self) -> dict:
+        values = {
             "major": self._major,
             "minor": self._minor,
             "patch": self._patch,
             "release": self._release,
-        })
+        }
+        if self._parts:
+            values.update(self._parts)
+        return values
 
     def _pattern_matches_values(self, pattern):
-        vars = TEMPLATE_VARIABLE_PATTERN.findall(pattern)
-        for var in vars:
-            if getattr(self, var) is None:
+        return self._format_matches_values(as_serialize_formats(pattern)[0], self._values())
+
+    def _format_matches_values(self, serialize_format, values):
+        for var in serialize_format.fields:
+            if values.get(var) is None:
                 return False
         return True
-    
+
     def __repr__(self):
-        return f"<bumpv.Version: {self.serialize(REPR_SERIALIZE_TEMPLATE)}>"
+        parts = REPR_SERIALIZE_TEMPLATE.format(
+            major=self._major, minor=self._minor, patch=self._patch, release=self._release,
+        )
+        for name, value in self._parts:
+            parts += f" {name}={value}"
+        return f"<bumpv.Version: {parts}>"
 
     @property
     def major(self):
@@ -92,43 +250,75 @@ class Version:
     def release(self):
         return self._release
 
+    @property
+    def key(self):
+        return self._key
+
+    @property
+    def original(self):
+        return self if self._original is None else self._original
+
     def serialize(self, patterns=None):
         if patterns is None:
-            patterns = ["{major}.{minor}.{patch}"]
+            patterns = self.serialize_formats
 
-        for pattern in patterns:
-            if self._pattern_matches_values(pattern):
-                return pattern.format(**{
-                    "major": self._major,
-                    "minor": self._minor,
-                    "patch": self._patch,
-                    "release": self._release,
-                })
+        formats = as_serialize_formats(patterns)
+        serialized_by_formats = self._serialized
+        if serialized_by_formats is None:
+            serialized_by_formats = {}
+            object.__setattr__(self, "_serialized", serialized_by_formats)
+        elif formats in serialized_by_formats:
+            return serialized_by_formats[formats]
+
+        values = self._values()
+        serialized = None
+        for serialize_format in formats:
+            if self._format_matches_values(serialize_format, values):
+                serialized = serialize_format.format(values)
+                break
+
+        serialized_by_formats[formats] = serialized
+        return serialized
+
+    def _evolve(self, values: dict):
+        """
+        Returns a version with the part `values`, keeping all other options
+        """
+        pop = values.pop
+        return Version(
+            pop("major"), pop("minor"), pop("patch"), pop("release"), None,
+            self.serialize_formats, self.tag_name, self.part_table, **values
+        )
+
+    def _evolve_builtin(self, values: list):
+        """
+        Like `_evolve` with `[major, minor, patch, release]`, other parts are kept
+        """
+        if self._parts:
+            return Version(*values, None, self.serialize_formats, self.tag_name, self.part_table, **dict(self._parts))
+        return Version(*values, None, self.serialize_formats, self.tag_name, self.part_table)
 
     def bump_major(self):
-        new_major = self._major + 1
-        return Version(new_major, 0, 0, release=self._release)
+        return self.bump("major")
 
     def bump_minor(self):
-        new_minor = self._minor + 1
-        return Version(self._major, new_minor, 0, release=self._release)
+        return self.bump("minor")
 
     def bump_patch(self):
-        new_patch = self._patch + 1
-        return Version(self._major, self._minor, new_patch, release=self._release)
+        return self.bump("patch")
 
     def bump_release(self):
-        raise NotImplemented
+        return self.bump("release")
 
     def bump(self, part_name):
-        if part_name == "major":
-            return self.bump_major()
-        elif part_name == "minor":
-            return self.bump_minor()
-        elif part_name == "patch":
-            return self.bump_patch()
-        else:
-            raise UnknownVersionPartError(part_name)
+        """
+        Returns the version with `part_name` bumped as defined by `part_table`
+        """
+        try:
+            function = self.part_table.functions[part_name]
+        except KeyError:
+            raise UnknownVersionPartError(part_name, self.part_table.names) from None
+        return function(self)
 
     def get_tag(self, tag_format=None, serialize_formats=None):
         if tag_format is None:
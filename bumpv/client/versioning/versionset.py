@@ -0,0 +1,166 @@
+from array import array
+from itertools import repeat
+
+from .exceptions import VersionStringParseError
+from .formats import compile_parse
+from .parts import DEFAULT_PART_TABLE
+from .version import PART_NAMES, Version, _extra_key, _make_key
+
+
+def _extra_names(parse: str):
+    """
+    Returns the names of the groups of `parse` besides `major`, `minor`, `patch` and `release`
+    """
+    return tuple(name for name in compile_parse(parse).groupindex if name not in PART_NAMES)
+
+
+def _columns(strings, parse: str, strict: bool = True, invalid: list = None):
+    """
+    Yields `(string, major, minor, patch, release, extra)` for each parsable string
+
+    `extra` holds the values of the groups of `_extra_names`. The pattern is
+    compiled once for the whole batch. Strings that don't match raise
+    `VersionStringParseError` in strict mode, otherwise they are skipped and
+    appended to `invalid` if given.
+    """
+    regex = compile_parse(parse)
+    search = regex.search
+    has_release = "release" in regex.groupindex
+    extra_names = _extra_names(parse)
+
+    for string in strings:
+        match = search(string)
+        try:
+            if not match:
+                raise ValueError
+            major, minor, patch = int(match["major"]), int(match["minor"]), int(match["patch"])
+        except (ValueError, TypeError, IndexError):
+            if strict:
+                raise VersionStringParseError(f"unable to parse version string '{string}' with pattern '{parse}'")
+            if invalid is not None:
+                invalid.append(string)
+            continue
+        extra = tuple(map(match.__getitem__, extra_names)) if extra_names else ()
+        yield string, major, minor, patch, match["release"] if has_release else None, extra
+
+
+def parse_many(strings, parse: str, strict: bool = True, **kwargs):
+    """
+    Lazily parses an iterable of version strings into `Version` instances
+
+    Additional keyword arguments, like `serialize_formats` and `tag_name`, are
+    passed on to every `Version`.
+    """
+    extra_names = _extra_names(parse)
+    for _, major, minor, patch, release, extra in _columns(strings, parse, strict):
+        yield Version(major, minor, patch, release, **kwargs, **dict(zip(extra_names, extra)))
+
+
+class VersionSet:
+    """
+    A columnar collection of parsed versions
+
+    The numeric parts are kept in parallel arrays (`major`, `minor`, `patch`)
+    next to the `release` values and the original `strings`, so that large
+    sets can be filtered and sorted without creating a `Version` per entry.
+    Values of the other groups of the `parse` pattern are kept in one list
+    per group in `extra`. Strings that could not be parsed in non-strict
+    mode are kept in `invalid`.
+    """
+    def __init__(self, extra_names=()):
+        self.major = array("q")
+        self.minor = array("q")
+        self.patch = array("q")
+        self.release = []
+        self.extra = {name: [] for name in extra_names}
+        self.strings = []
+        self.invalid = []
+
+    @classmethod
+    def from_strings(cls, strings, parse: str, strict: bool = True):
+        version_set = cls(_extra_names(parse))
+        append_major = version_set.major.append
+        append_minor = version_set.minor.append
+        append_patch = version_set.patch.append
+        append_release = version_set.release.append
+        append_string = version_set.strings.append
+        append_extra = [column.append for column in version_set.extra.values()]
+
+        for string, major, minor, patch, release, extra in _columns(strings, parse, strict, version_set.invalid):
+            append_string(string)
+            append_major(major)
+            append_minor(minor)
+            append_patch(patch)
+            append_release(release)
+            for append, value in zip(append_extra, extra):
+                append(value)
+        return version_set
+
+    def __repr__(self):
+        return f"<bumpv.VersionSet: {len(self)} versions>"
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __getitem__(self, index):
+        return self.version(index)
+
+    def version(self, index, **kwargs):
+        """
+        Returns the `Version` at `index`, additional keyword arguments are passed on to it
+        """
+        extra = {name: column[index] for name, column in self.extra.items()}
+        return Version(self.major[index], self.minor[index], self.patch[index], self.release[index], **kwargs, **extra)
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def keys(self, part_table=None):
+        """
+        Returns the sort keys of all versions, see `Version.key`
+
+        Parts with `values` in `part_table` sort in the order of their values.
+        """
+        orders = (part_table or DEFAULT_PART_TABLE).orders
+        keys = list(map(_make_key, self.major, self.minor, self.patch, self.release, repeat(orders.get("release"))))
+        for name in sorted(self.extra):
+            # like `Version`, extra parts are compared by name
+            order = orders.get(name)
+            keys = [key + (_extra_key(value, order),) for key, value in zip(keys, self.extra[name])]
+        return keys
+
+    def argsort(self, reverse=False, part_table=None):
+        """
+        Returns the indices of the versions in ascending (or descending) order
+        """
+        keys = self.keys(part_table)
+        return sorted(range(len(keys)), key=keys.__getitem__, reverse=reverse)
+
+    def where(self, major=None, minor=None, patch=None, release=None):
+        """
+        Returns the indices of all versions with the given part values
+        """
+        indices = range(len(self))
+        for column, value in ((self.major, major), (self.minor, minor), (self.patch, patch)):
+            if value is not None:
+                indices = [index for index in indices if column[index] == value]
+        if release is not None:
+            indices = [index for index in indices if self.release[index] == release]
+        return list(indices)
+
+    def take(self, indices):
+        """
+        Returns a new set with the versions at `indices`, in that order
+        """
+        version_set = VersionSet(self.extra)
+        version_set.major = array("q", (self.major[index] for index in indices))
+        version_set.minor = array("q", (self.minor[index] for index in indices))
+        version_set.patch = array("q", (self.patch[index] for index in indices))
+        version_set.release = [self.release[index] for index in indices]
+        version_set.extra = {name: [column[index] for index in indices] for name, column in self.extra.items()}
+        version_set.strings = [self.strings[index] for index in indices]
+        return version_set
+
+    def sorted(self, reverse=False, part_table=None):
+        return self.take(self.argsort(reverse, part_table))
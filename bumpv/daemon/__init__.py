@@ -0,0 +1,2 @@
+from .daemon import Server, Workspace, default_socket_path, forward
+from .exceptions import DaemonError
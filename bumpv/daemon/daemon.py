@@ -0,0 +1,275 @@
+import os
+import threading
+
+from .exceptions import DaemonError
+from ..client import BumpClient, Configuration
+from ..client import exceptions
+from ..client.logging import get_logger
+from ..client.vcs import check_dirty, get_vcs
+from ..client.versioning import Version
+
+
+logger = get_logger()
+
+CONFIG_NAME = ".bumpv.cfg"
+SOCKET_ENV = "BUMPV_SOCKET"
+SOCKET_NAME = "bumpv.sock"
+PROTOCOL_VERSION = 1
+
+# raised by a bump because of the workspace rather than the daemon
+CLIENT_ERRORS = (
+    exceptions.InvalidConfigPath,
+    exceptions.InvalidTargetFile,
+    exceptions.PendingTransactionError,
+    exceptions.WorkingDirectoryIsDirtyException,
+    exceptions.InvalidPartValueError,
+    exceptions.UnknownVersionPartError,
+    exceptions.VersionStringParseError,
+)
+
+
+def default_socket_path():
+    """
+    Returns the socket path from `$BUMPV_SOCKET`, or one private to the user
+    """
+    path = os.environ.get(SOCKET_ENV)
+    if path:
+        return path
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, SOCKET_NAME)
+    # like `tempfile.gettempdir()`, without importing it on every start
+    return os.path.join(os.environ.get("TMPDIR", "/tmp"), f"bumpv-{os.getuid()}.sock")
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return st.st_mtime_ns, st.st_size, st.st_ino
+
+
+class Workspace:
+    """
+    The config, current version and VCS session of one project, kept between requests
+
+    The config and version are loaded again once the config file changes,
+    the VCS session is discovered again once its repository changes. The
+    working directory status is checked on every bump, since any tracked
+    file may have changed.
+    """
+    def __init__(self, config_path, verbosity=0):
+        self.config_path = config_path
+        self.verbosity = verbosity
+        self.lock = threading.Lock()
+        self.config = None
+        self.version = None
+        self.vcs = None
+        self._config_stamp = None
+        self._vcs_stamp = None
+
+    def __repr__(self):
+        return f"<bumpv.Workspace: {self.config_path}>"
+
+    def _vcs_watched(self):
+        git_dir = getattr(self.vcs, "git_dir", None)
+        if git_dir is not None:
+            return [os.path.join(git_dir, name) for name in ("HEAD", "index", "packed-refs")]
+        if self.vcs is not None and self.vcs.root:
+            return [os.path.join(self.vcs.root, ".hg", "dirstate")]
+        return []
+
+    def _vcs_stamp_now(self):
+        return tuple(_stat(path) for path in self._vcs_watched())
+
+    def load(self):
+        """
+        Loads whatever changed on disk since the last request
+        """
+        config_stamp = _stat(self.config_path)
+        if config_stamp is None:
+            raise exceptions.InvalidConfigPath(f"no file found at: {self.config_path}")
+        if config_stamp != self._config_stamp:
+            logger.debug(f"Loading config: {self.config_path}")
+            self.config = Configuration(self.config_path)
+            self.version = Version.from_config(self.config)
+            self._config_stamp = config_stamp
+
+        if self.vcs is None or self._vcs_stamp_now() != self._vcs_stamp:
+            logger.debug(f"Discovering VCS for: {self.config.root}")
+            self.vcs = get_vcs(True, cwd=self.config.root, native=self.config.native_git)
+            self._vcs_stamp = self._vcs_stamp_now()
+        else:
+            self.vcs.refresh()
+        return self
+
+    def current(self):
+        with self.lock:
+            return self.load().config.current_version
+
+    def bump(self, part, dry_run=False, allow_dirty=False):
+        with self.lock:
+            self.load()
+            if self.vcs is not None:
+                check_dirty(self.vcs, allow_dirty)
+
+            client = BumpClient(self.config, self.verbosity, allow_dirty, vcs=self.vcs)
+            try:
+                client.bump(part, dry_run)
+            except exceptions.VCSCommandError as err:
+                err.rolled_back = client.rollback()
+                raise
+            finally:
+                if not dry_run:
+                    # a bump rewrites the config, even one that failed halfway
+                    self._config_stamp = None
+            return client.dict()
+
+
+class Server:
+    """
+    Answers `current` and `bump` requests for any number of workspaces over a unix socket
+
+    Each connection carries a single request and its response, both JSON
+    objects on a line of their own.
+    """
+    def __init__(self, socket_path=None, verbosity=0):
+        self.socket_path = socket_path or default_socket_path()
+        self.verbosity = verbosity
+        self.workspaces = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    def __repr__(self):
+        return f"<bumpv.Server: {self.socket_path}>"
+
+    def workspace(self, cwd, config=CONFIG_NAME):
+        config_path = os.path.realpath(os.path.join(cwd, config))
+        with self._lock:
+            workspace = self.workspaces.get(config_path)
+            if workspace is None:
+                workspace = self.workspaces[config_path] = Workspace(config_path, self.verbosity)
+            return workspace
+
+    def handle(self, request):
+        """
+        Returns the response to a single decoded request
+
+        Any error is answered with `{"ok": false, "error": <exception name>,
+        "message": ...}`, the request is never left without a response.
+        """
+        command = request.get("command")
+        try:
+            if command == "ping":
+                return {"ok": True, "result": PROTOCOL_VERSION}
+            if "cwd" not in request:
+                raise DaemonError("request is missing 'cwd'")
+            workspace = self.workspace(request["cwd"], request.get("config", CONFIG_NAME))
+            if command == "current":
+                return {"ok": True, "result": workspace.current()}
+            if command == "bump":
+                result = workspace.bump(
+                    request["part"], bool(request.get("dry_run")), bool(request.get("allow_dirty")),
+                )
+                return {"ok": True, "result": result}
+            raise DaemonError(f"unknown command: {command}")
+        except exceptions.VCSCommandError as err:
+            return {
+                "ok": False, "error": type(err).__name__, "message": err.message, "command": err.command,
+                "rolled_back": getattr(err, "rolled_back", False),
+            }
+        except CLIENT_ERRORS + (DaemonError, KeyError) as err:
+            message = getattr(err, "message", None) or str(err)
+            return {"ok": False, "error": type(err).__name__, "message": message}
+        except Exception as err:
+            # the client must not run the request again, a bump may have been applied in part
+            logger.error("Error handling a %s request", command, exc_info=True)
+            return {"ok": False, "error": type(err).__name__, "message": f"{type(err).__name__}: {err}"}
+
+    def serve_forever(self):
+        import socketserver
+
+        server = self
+
+        class Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                import json
+
+                line = self.rfile.readline()
+                if not line:
+                    return
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("not a JSON object")
+                except ValueError as err:
+                    response = {"ok": False, "error": "DaemonError", "message": f"invalid request: {err}"}
+                else:
+                    # answers every request, even one that failed unexpectedly
+                    response = server.handle(request)
+                self.wfile.write(json.dumps(response, default=str).encode() + b"\n")
+
+        class UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+            daemon_threads = True
+
+        self._remove_stale_socket()
+        self._server = UnixServer(self.socket_path, Handler)
+        os.chmod(self.socket_path, 0o600)
+        logger.info(f"Listening on {self.socket_path}")
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+
+    def _remove_stale_socket(self):
+        if not os.path.exists(self.socket_path):
+            return
+        if forward({"command": "ping"}, self.socket_path) is not None:
+            raise DaemonError(f"a daemon is already listening on {self.socket_path}")
+        os.unlink(self.socket_path)
+
+
+def forward(request, socket_path=None, timeout=None):
+    """
+    Sends `request` to a running daemon and returns its response
+
+    Returns None if no daemon can be connected to at `socket_path`, so the
+    caller can do the work itself. Once the request is sent it may have been
+    handled, so any failure after that raises `DaemonError` instead.
+    """
+    socket_path = socket_path or default_socket_path()
+    if not os.path.exists(socket_path):
+        return None
+
+    import json
+    import socket
+
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return None
+        try:
+            sock.sendall(json.dumps(request).encode() + b"\n")
+            with sock.makefile("rb") as response:
+                line = response.readline()
+        except OSError as err:
+            raise DaemonError(f"lost connection to daemon at {socket_path}: {err}")
+    finally:
+        sock.close()
+
+    if not line:
+        raise DaemonError(f"no response from daemon at {socket_path}")
+    try:
+        return json.loads(line)
+    except ValueError as err:
+        raise DaemonError(f"invalid response from daemon at {socket_path}: {err}")
@@ -0,0 +1,4 @@
+class DaemonError(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+        self.message = message